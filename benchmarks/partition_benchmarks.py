@@ -0,0 +1,89 @@
+""" Benchmarks of optimizing the partitions of a block in worker processes.
+
+    Builds a synthesized design of independent register-to-register
+    datapaths (Kogge-Stone adders and tree multipliers, each with inputs of
+    its own, as logic reading the same Input or register after synthesis is
+    in the same partition) and, for each number
+    of processes given, times ``optimize(processes=...)`` on a fresh copy:
+
+    * seconds: the time taken by optimize
+    * nets: the number of nets left afterwards
+
+    With processes=1 the whole block is optimized in this process; otherwise
+    each partition is optimized on its own, so common subexpressions shared
+    by two partitions are kept and the result can have more nets.  The
+    speedup depends on the number of cores, which is reported with the
+    results:
+
+        python benchmarks/partition_benchmarks.py
+        python benchmarks/partition_benchmarks.py --copies 32 --processes 1 2 4 8
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyrtl  # noqa: E402
+from pyrtl.rtllib import adders, multipliers  # noqa: E402
+
+
+def build(copies, width):
+    """ A synthesized block of copies of an adder and a multiplier between registers. """
+    pyrtl.reset_working_block()
+    for i in range(copies):
+        # an Input read by several copies would join them into one partition
+        a, b = pyrtl.Input(width, 'a%d' % i), pyrtl.Input(width, 'b%d' % i)
+        x = pyrtl.Register(width, 'x%d' % i)
+        y = pyrtl.Register(width, 'y%d' % i)
+        x.next <<= adders.kogge_stone(x, a)[:width]
+        y.next <<= multipliers.tree_multiplier(y, b)[:width]
+        out = pyrtl.Output(width, 'out%d' % i)
+        out <<= x ^ y
+    pyrtl.synthesize()
+    return pyrtl.working_block()
+
+
+def run(block, processes):
+    copy = pyrtl.copy_block(block, update_working_block=False)
+    start = time.time()
+    pyrtl.optimize(block=copy, processes=processes)
+    return {'seconds': time.time() - start, 'nets': len(copy.logic)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark optimizing partitions in parallel.')
+    parser.add_argument('--copies', type=int, default=16,
+                        help='the number of independent datapaths (default %(default)s)')
+    parser.add_argument('--width', type=int, default=16,
+                        help='the bitwidth of each datapath (default %(default)s)')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--output', help='the JSON file to write (default: standard output)')
+    args = parser.parse_args(argv)
+
+    block = build(args.copies, args.width)
+    results = {}
+    for processes in args.processes:
+        results[processes] = run(block, processes)
+        print('processes %-3d %8.3f s %8d nets' % (
+            processes, results[processes]['seconds'], results[processes]['nets']),
+            file=sys.stderr)
+
+    report = {'cpu_count': multiprocessing.cpu_count(), 'nets': len(block.logic),
+              'copies': args.copies, 'width': args.width, 'results': results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+""" Simulation benchmarks over rtllib designs.
+
+    Elaborates representative designs from pyrtl.rtllib at several sizes and,
+    for each simulator backend with and without tracing, measures:
+
+    * elaboration_s: seconds to build the design
+    * setup_s: seconds to construct the simulator (code generation, compiling)
+    * cycles_per_sec: simulation speed, with stimulus given through run_values
+    * peak_rss_kb: the peak resident set size of the process running the case
+
+    Every case runs in its own process so that the peak RSS of one case does
+    not hide another's.  The results are written as JSON, so that runs can be
+    saved and compared over time:
+
+        python benchmarks/simulation_benchmarks.py --output before.json
+        python benchmarks/simulation_benchmarks.py --compare before.json --output after.json
+        python benchmarks/simulation_benchmarks.py --designs kogge_stone --quick
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyrtl  # noqa: E402
+from pyrtl.rtllib import adders, aes, barrel, multipliers, muxes  # noqa: E402
+from pyrtl.simselect import _compiler_available  # noqa: E402
+
+
+# ----------------------------------------------------------------
+# The designs: each takes a size and builds into the working block
+
+def _output(name, wire):
+    out = pyrtl.Output(len(wire), name)
+    out <<= wire
+
+
+def build_aes_encrypt(size):
+    """ The multi-cycle AES-128 encryption state machine (size is unused). """
+    plaintext, key = pyrtl.Input(128, 'plaintext'), pyrtl.Input(128, 'key')
+    reset = pyrtl.Input(1, 'reset')
+    ready, ciphertext = aes.AES().encrypt_state_m(plaintext, key, reset)
+    _output('ready', ready)
+    _output('ciphertext', ciphertext)
+
+
+def build_aes_decrypt(size):
+    """ The multi-cycle AES-128 decryption state machine (size is unused). """
+    ciphertext, key = pyrtl.Input(128, 'ciphertext'), pyrtl.Input(128, 'key')
+    reset = pyrtl.Input(1, 'reset')
+    ready, plaintext = aes.AES().decryption_statem(ciphertext, key, reset)
+    _output('ready', ready)
+    _output('plaintext', plaintext)
+
+
+def build_tree_multiplier(size):
+    """ A registered size x size bit Wallace tree multiplier. """
+    a, b = pyrtl.Input(size, 'a'), pyrtl.Input(size, 'b')
+    product = pyrtl.Register(2 * size, 'product')
+    product.next <<= multipliers.tree_multiplier(a, b)
+    _output('out', product)
+
+
+def build_kogge_stone(size):
+    """ A size bit Kogge-Stone adder accumulating into a register. """
+    a = pyrtl.Input(size, 'a')
+    acc = pyrtl.Register(size, 'acc')
+    acc.next <<= adders.kogge_stone(acc, a)[:size]
+    _output('out', acc)
+
+
+def build_barrel_shifter(size):
+    """ A size bit barrel shifter feeding back into its own input register. """
+    data = pyrtl.Input(size, 'data')
+    load = pyrtl.Input(1, 'load')
+    direction = pyrtl.Input(1, 'direction')
+    dist = pyrtl.Input(max(size - 1, 1).bit_length(), 'dist')
+    value = pyrtl.Register(size, 'value')
+    shifted = barrel.barrel_shifter(value, value[0], direction, dist)
+    value.next <<= pyrtl.select(load, data, shifted)
+    _output('out', value)
+
+
+def build_multiselector_fsm(size):
+    """ A size state machine whose transitions and outputs use a MultiSelector. """
+    state_bits = max(size - 1, 1).bit_length()
+    go = pyrtl.Input(1, 'go')
+    data = pyrtl.Input(16, 'data')
+    state = pyrtl.Register(state_bits, 'state')
+    acc = pyrtl.Register(16, 'acc')
+    next_state = pyrtl.WireVector(state_bits)
+    next_acc = pyrtl.WireVector(16)
+    with muxes.MultiSelector(state, next_state, next_acc) as ms:
+        for s in range(size):
+            step = pyrtl.select(go, (s + 1) % size, s)
+            update = (acc ^ data) if s % 3 == 0 else (acc + data)[:16] if s % 3 == 1 else acc
+            ms.option(s, step, update)
+        if size < 1 << state_bits:
+            ms.default(0, acc)
+    state.next <<= next_state
+    acc.next <<= next_acc
+    _output('out', acc)
+    _output('current', state)
+
+
+DESIGNS = {
+    'aes_encrypt': (build_aes_encrypt, [128]),
+    'aes_decrypt': (build_aes_decrypt, [128]),
+    'tree_multiplier': (build_tree_multiplier, [8, 16, 32]),
+    'kogge_stone': (build_kogge_stone, [16, 64, 256]),
+    'barrel_shifter': (build_barrel_shifter, [16, 64, 256]),
+    'multiselector_fsm': (build_multiselector_fsm, [4, 16, 64]),
+}
+
+BACKENDS = {
+    'Simulation': pyrtl.Simulation,
+    'FastSimulation': pyrtl.FastSimulation,
+    'CompiledSimulation': pyrtl.CompiledSimulation,
+}
+
+
+# ----------------------------------------------------------------
+# Running a single case
+
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # macOS reports bytes
+
+
+def run_case(design, size, backend, tracing, cycles, max_seconds, seed=0):
+    """ Build, set up and simulate one case, returning its measurements. """
+    build, _ = DESIGNS[design]
+    pyrtl.reset_working_block()
+    start = time.time()
+    build(size)
+    elaboration = time.time() - start
+    block = pyrtl.working_block()
+
+    tracer = pyrtl.SimulationTrace() if tracing else None
+    start = time.time()
+    sim = BACKENDS[backend](tracer=tracer)
+    setup = time.time() - start
+
+    names = sim.bind_inputs()
+    widths = [block.get_wirevector_by_name(name).bitwidth for name in names]
+    rng = random.Random(seed)
+    rows = [tuple(rng.getrandbits(w) for w in widths) for _ in range(min(cycles, 1024))]
+
+    # run in doubling batches until all the cycles are done or time runs out,
+    # going on past the cycles asked for while a coarse clock reads no time
+    done, batch, elapsed = 0, 16, 0.0
+    while (done < cycles or not elapsed) and elapsed < max_seconds:
+        if done < cycles:
+            batch = min(batch, cycles - done)
+        stimulus = [rows[(done + i) % len(rows)] for i in range(batch)]
+        start = time.time()
+        sim.run_values(stimulus)
+        elapsed += time.time() - start
+        done += batch
+        batch *= 2
+
+    return {
+        'design': design,
+        'size': size,
+        'backend': backend,
+        'tracing': tracing,
+        'nets': len(block.logic),
+        'elaboration_s': elaboration,
+        'setup_s': setup,
+        'cycles': done,
+        'run_s': elapsed,
+        'cycles_per_sec': done / elapsed,
+        'peak_rss_kb': _peak_rss_kb(),
+    }
+
+
+def _case_worker(args, queue):
+    try:
+        queue.put(run_case(*args))
+    except Exception as e:
+        queue.put({'error': '%s: %s' % (type(e).__name__, e)})
+
+
+def run_isolated(*args):
+    """ Run run_case(*args) in a fresh process, so its peak RSS is its own. """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_case_worker, args=(args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if 'error' in result:
+        design, size, backend, tracing = args[:4]
+        result.update(design=design, size=size, backend=backend, tracing=tracing)
+    return result
+
+
+# ----------------------------------------------------------------
+# Command line
+
+def _case_key(result):
+    return result['design'], result['size'], result['backend'], result['tracing']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the PyRTL simulators.')
+    parser.add_argument('--designs', nargs='+', choices=sorted(DESIGNS), default=sorted(DESIGNS))
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS),
+                        default=sorted(BACKENDS))
+    parser.add_argument('--cycles', type=int, default=10000,
+                        help='cycles to simulate per case (default %(default)s)')
+    parser.add_argument('--max-seconds', type=float, default=10.0,
+                        help='stop simulating a case after this long (default %(default)s)')
+    parser.add_argument('--quick', action='store_true',
+                        help='only the smallest size of each design, and 1000 cycles')
+    parser.add_argument('--output', help='the JSON file to write (default: standard output)')
+    parser.add_argument('--compare', metavar='JSON',
+                        help='a previous output to report the change in cycles/sec against')
+    args = parser.parse_args(argv)
+
+    backends = list(args.backends)
+    if 'CompiledSimulation' in backends and not _compiler_available():
+        print('no C compiler found, skipping CompiledSimulation', file=sys.stderr)
+        backends.remove('CompiledSimulation')
+    cycles = 1000 if args.quick else args.cycles
+    baseline = {}
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = {_case_key(r): r for r in json.load(f)['results'] if 'error' not in r}
+
+    results = []
+    for design in args.designs:
+        sizes = DESIGNS[design][1]
+        for size in sizes[:1] if args.quick else sizes:
+            for backend in backends:
+                for tracing in (False, True):
+                    result = run_isolated(design, size, backend, tracing, cycles,
+                                          args.max_seconds)
+                    results.append(result)
+                    summary = result.get('error') or '%10.0f cycles/s' % result['cycles_per_sec']
+                    before = baseline.get(_case_key(result))
+                    if before and before.get('cycles_per_sec') and 'error' not in result:
+                        summary += '  (%.2fx)' % (
+                            result['cycles_per_sec'] / before['cycles_per_sec'])
+                    print('%-18s %4d %-18s %-7s %s' % (
+                        design, size, backend, 'traced' if tracing else '', summary),
+                        file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+""" Microbenchmarks of resolving long chains of wires.
+
+    Long chains of 'w' nets are common after conditional assignments, probes
+    and synthesis.  This times, on chains of a million wires by default:
+
+    * producer_list: resolving every wire of a chain through the _ProducerList
+      used by the optimization passes, with the links added from the end of
+      the chain back (the order that builds the deepest trees)
+    * remove_wire_nets: removing the 'w' nets of a chain in a block
+    * constant_propagation: folding a chain of single bit '&' nets with a
+      constant one into a wire
+
+        python benchmarks/wire_chain_benchmarks.py
+        python benchmarks/wire_chain_benchmarks.py --length 100000 --output chains.json
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyrtl  # noqa: E402
+from pyrtl.passes import _ProducerList, _remove_wire_nets  # noqa: E402
+
+
+def _timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def bench_producer_list(length):
+    block = pyrtl.Block()
+    wires = [pyrtl.WireVector(1, block=block) for _ in range(length)]
+    producers = _ProducerList()
+
+    def link_and_resolve():
+        for i in reversed(range(1, length)):
+            producers[wires[i]] = wires[i - 1]
+        for wire in wires:
+            producers.find_producer(wire)
+    return _timed(link_and_resolve)
+
+
+def _chain_block(length, make_link):
+    """ A block with a chain of length single bit wires from an input to an output. """
+    block = pyrtl.Block()
+    with pyrtl.set_working_block(block, no_sanity_check=True):
+        w = pyrtl.Input(1, 'in')
+        one = pyrtl.Const(1, 1)
+        for _ in range(length):
+            w = make_link(w, one)
+        out = pyrtl.Output(1, 'out')
+        out <<= w
+    return block
+
+
+def _wire_link(w, one):
+    new = pyrtl.WireVector(1)
+    new <<= w
+    return new
+
+
+def _and_link(w, one):
+    return w & one
+
+
+def bench_remove_wire_nets(length):
+    block = _chain_block(length, _wire_link)
+    with pyrtl.set_working_block(block, no_sanity_check=True):
+        return _timed(_remove_wire_nets, block)
+
+
+def bench_constant_propagation(length):
+    block = _chain_block(length, _and_link)
+    with pyrtl.set_working_block(block, no_sanity_check=True):
+        return _timed(pyrtl.constant_propagation, block, True)
+
+
+BENCHMARKS = {
+    'producer_list': bench_producer_list,
+    'remove_wire_nets': bench_remove_wire_nets,
+    'constant_propagation': bench_constant_propagation,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark resolving long wire chains.')
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS),
+                        default=sorted(BENCHMARKS))
+    parser.add_argument('--length', type=int, default=1000000,
+                        help='the number of wires in each chain (default %(default)s)')
+    parser.add_argument('--output', help='the JSON file to write (default: standard output)')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.benchmarks:
+        results[name] = BENCHMARKS[name](args.length)
+        print('%-22s %8.3f s' % (name, results[name]), file=sys.stderr)
+
+    report = {'length': args.length, 'seconds': results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -73,7 +73,15 @@ from .conditional import currently_under_condition
 from .simulation import Simulation
 from .simulation import FastSimulation
 from .simulation import SimulationTrace
+from .simulation import CompactSimulationTrace
+from .simulation import DeltaSimulationTrace
+from .simulation import StreamingVCDTrace
+from .simulation import FileSimulationTrace
+from .simulation import SavedSimulationTrace
+from .simulation import WindowedSimulationTrace
+from .simulation import Coverage
 from .compilesim import CompiledSimulation
+from .simselect import simulate
 
 # input and output to file format routines
 from .inputoutput import input_from_blif
@@ -89,10 +97,16 @@ from .inputoutput import trace_to_html
 # different analysis and transform passes
 from .passes import common_subexp_elimination
 from .passes import constant_propagation
+from .passes import word_level_simplification
+from .passes import dead_logic_elimination
+from .passes import value_ranges
+from .passes import narrow_bitwidths
 from .passes import synthesize
 from .passes import nand_synth
 from .passes import and_inverter_synth
 from .passes import optimize
+from .passmanager import Pass, PassManager
+from .aig import AIG, aig_from_block, aig_to_block, aig_optimize
 
 
 from .transform import net_transform, wire_transform, replace_wire, copy_block, clone_wire
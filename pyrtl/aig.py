@@ -0,0 +1,674 @@
+"""
+Aig provides a compact and-inverter graph for optimizing single bit logic.
+
+An AIG is a netlist of two input AND gates whose inputs may be inverted.
+Rather than one LogicNet per gate, it is stored in flat integer arrays, and
+each signal is a *literal*: twice the index of the node driving it, plus one
+if the signal is inverted.  Node 0 is the constant zero (so literal 0 is
+false and literal 1 is true), and every AND gate only uses nodes before it.
+Structural hashing makes sure no two gates have the same inputs.
+
+Registers and memory ports are kept at the boundary of the graph: the value
+of a register and the data read from a memory are inputs of the AIG, while
+the next value of a register and the address, data and enable of a memory
+port are outputs of it. ::
+
+    pyrtl.synthesize()
+    aig = pyrtl.aig_from_block()
+    aig = aig.rewrite().balance()
+    block = pyrtl.aig_to_block(aig)
+"""
+
+from __future__ import print_function, unicode_literals
+
+import array
+import collections
+import heapq
+
+from .core import working_block, set_working_block, LogicNet, PostSynthBlock
+from .corecircuits import concat_list
+from .passmanager import Pass, PassManager, _topological_order
+from .pyrtlexceptions import PyrtlError
+from .transform import _get_new_block_mem_instance
+from .wire import WireVector, Input, Output, Const, Register
+
+
+_NO_FANIN = -1  # the fanins recorded for the constant node and the inputs
+
+
+def _remap(node_map, lit):
+    """ The literal lit becomes given the new literal of each node in node_map. """
+    return node_map[lit >> 1] ^ (lit & 1)
+
+
+class AIG(object):
+    """ An and-inverter graph of single bit logic, stored in integer arrays.
+
+    Build one with `aig_from_block`, or with `add_input`, `add_and` and
+    `add_output`.  The optimizations (`cleanup`, `balance` and `rewrite`)
+    each return a new AIG with the same inputs and outputs, and leave this
+    one as it is.
+    """
+
+    def __init__(self):
+        self._fanin0 = array.array('l', [_NO_FANIN])
+        self._fanin1 = array.array('l', [_NO_FANIN])
+        self._level = array.array('l', [0])
+        self._strash = {}  # map from the fanin literals of each gate to its node
+        self.inputs = array.array('l')  # the node of each input
+        self.outputs = array.array('l')  # the literal of each output
+
+        # The wires the inputs and outputs are part of, by their positions in
+        # inputs and outputs, used to build the block back by aig_to_block
+        self.input_wires = []  # (name, input positions)
+        self.output_wires = []  # (name, output positions)
+        self.registers = []  # (name, input positions of value, output positions of next)
+        self.memory_reads = []  # (op_param, data name, address outputs, data inputs)
+        self.memory_writes = []  # (op_param, address outputs, data outputs, enable outputs)
+        self.io_map = {}  # map from the wires before synthesis to the names of theirs
+        self.mem_map = {}  # the mem_map of the PostSynthBlock the AIG was built from
+
+    def __repr__(self):
+        return 'AIG(%d inputs, %d outputs, %d ands, depth %d)' % (
+            len(self.inputs), len(self.outputs), self.num_ands, self.depth())
+
+    @property
+    def num_ands(self):
+        """ The number of AND gates, including any no output depends on. """
+        return len(self._fanin0) - 1 - len(self.inputs)
+
+    def depth(self):
+        """ The largest number of AND gates on a path from an input to an output. """
+        return max([self._level[lit >> 1] for lit in self.outputs] or [0])
+
+    def fanins(self, lit):
+        """ The literals of the inputs of the AND gate driving lit, or None for an input. """
+        node = lit >> 1
+        if self._fanin0[node] == _NO_FANIN:
+            return None
+        return self._fanin0[node], self._fanin1[node]
+
+    def add_input(self, name=None):
+        """ Add a single bit input and return its literal.
+
+        :param name: the name of its Input in aig_to_block (defaults to 'in'
+            followed by its position)
+        """
+        position = len(self.inputs)
+        self.input_wires.append((name if name is not None else 'in%d' % position, [position]))
+        return self._add_input()
+
+    def _add_input(self):
+        node = len(self._fanin0)
+        self.inputs.append(node)
+        self._fanin0.append(_NO_FANIN)
+        self._fanin1.append(_NO_FANIN)
+        self._level.append(0)
+        return 2 * node
+
+    def add_output(self, lit, name=None):
+        """ Add a single bit output driven by lit and return its position.
+
+        :param name: the name of its Output in aig_to_block (defaults to 'out'
+            followed by its position)
+        """
+        position = self._add_output(lit)
+        self.output_wires.append((name if name is not None else 'out%d' % position, [position]))
+        return position
+
+    def _add_output(self, lit):
+        self.outputs.append(lit)
+        return len(self.outputs) - 1
+
+    def add_and(self, a, b):
+        """ Return the literal of the AND of literals a and b, adding a gate if needed.
+
+        No gate is added when an existing gate already has the same inputs,
+        or when the result simplifies to a constant or to a or b: when either
+        is constant, for a & a and a & ~a, and for a & (a & c),
+        a & (~a & c) and a & ~(~a & c).
+        """
+        if a > b:
+            a, b = b, a
+        if a == 0 or a == b ^ 1:
+            return 0
+        if a == 1 or a == b:
+            return b
+        f0, f1 = self._fanin0, self._fanin1
+        for x, y in ((a, b), (b, a)):
+            y0, y1 = f0[y >> 1], f1[y >> 1]
+            if y0 == _NO_FANIN:
+                continue
+            if not y & 1:
+                if x == y0 or x == y1:
+                    return y
+                if x == y0 ^ 1 or x == y1 ^ 1:
+                    return 0
+            elif x == y0 ^ 1 or x == y1 ^ 1:
+                return x
+        key = a << 32 | b
+        node = self._strash.get(key)
+        if node is None:
+            node = len(f0)
+            f0.append(a)
+            f1.append(b)
+            self._level.append(1 + max(self._level[a >> 1], self._level[b >> 1]))
+            self._strash[key] = node
+        return 2 * node
+
+    def add_or(self, a, b):
+        """ Return the literal of the OR of literals a and b. """
+        return self.add_and(a ^ 1, b ^ 1) ^ 1
+
+    def add_xor(self, a, b):
+        """ Return the literal of the XOR of literals a and b. """
+        return self.add_or(self.add_and(a, b ^ 1), self.add_and(a ^ 1, b))
+
+    def add_mux(self, sel, truecase, falsecase):
+        """ Return the literal of truecase if sel is true, and falsecase otherwise. """
+        return self.add_or(self.add_and(sel, truecase), self.add_and(sel ^ 1, falsecase))
+
+    def simulate(self, input_values, mask=1):
+        """ Return the values of the outputs given the values of the inputs.
+
+        :param input_values: a value for each input
+        :param mask: the bits of the values to compute; each bit is computed
+            independently, so that many input patterns can be simulated at once
+        :return: a list with the value of each output
+        """
+        if len(input_values) != len(self.inputs):
+            raise PyrtlError('expected %d input values, got %d'
+                             % (len(self.inputs), len(input_values)))
+        f0, f1 = self._fanin0, self._fanin1
+        values = [0] * len(f0)
+        for node, value in zip(self.inputs, input_values):
+            values[node] = value & mask
+        for node in range(1, len(f0)):
+            a, b = f0[node], f1[node]
+            if a != _NO_FANIN:
+                values[node] = (values[a >> 1] ^ -(a & 1)) & (values[b >> 1] ^ -(b & 1)) & mask
+        return [(values[lit >> 1] ^ -(lit & 1)) & mask for lit in self.outputs]
+
+    def _fanout_counts(self):
+        """ The number of uses of each node by the outputs and the gates they depend on. """
+        f0, f1 = self._fanin0, self._fanin1
+        counts = array.array('l', [0]) * len(f0)
+        for lit in self.outputs:
+            counts[lit >> 1] += 1
+        for node in range(len(f0) - 1, 0, -1):
+            if counts[node] and f0[node] != _NO_FANIN:
+                counts[f0[node] >> 1] += 1
+                counts[f1[node] >> 1] += 1
+        return counts
+
+    def _start_copy(self):
+        """ A new AIG with the same inputs, and the map from each node to its new literal. """
+        new = AIG()
+        new.input_wires = list(self.input_wires)
+        new.output_wires = list(self.output_wires)
+        new.registers = list(self.registers)
+        new.memory_reads = list(self.memory_reads)
+        new.memory_writes = list(self.memory_writes)
+        new.io_map = dict(self.io_map)
+        new.mem_map = dict(self.mem_map)
+        node_map = array.array('l', [-1]) * len(self._fanin0)
+        node_map[0] = 0
+        for node in self.inputs:
+            node_map[node] = new._add_input()
+        return new, node_map
+
+    def _finish_copy(self, new, node_map):
+        new.outputs = array.array('l', (_remap(node_map, lit) for lit in self.outputs))
+        return new
+
+    def cleanup(self):
+        """ Return a copy without the gates no output depends on.
+
+        Every gate is added to the copy again, so it is also simplified
+        by `add_and` given what its inputs became.
+        """
+        f0, f1 = self._fanin0, self._fanin1
+        counts = self._fanout_counts()
+        new, node_map = self._start_copy()
+        for node in range(1, len(f0)):
+            if counts[node] and f0[node] != _NO_FANIN:
+                node_map[node] = new.add_and(_remap(node_map, f0[node]),
+                                             _remap(node_map, f1[node]))
+        return self._finish_copy(new, node_map)
+
+    def balance(self):
+        """ Return a copy in which each tree of AND gates is as shallow as possible.
+
+        A tree of AND gates whose inner gates are not inverted and have no
+        other uses computes the AND of its leaves, in any order.  Each such
+        tree is rebuilt by repeatedly joining the two shallowest of its leaves.
+        Since trees stop at gates with other uses, no logic is duplicated.
+        """
+        f0, f1 = self._fanin0, self._fanin1
+        counts = self._fanout_counts()
+        is_root = bytearray(len(f0))
+        for lit in self.outputs:
+            is_root[lit >> 1] = 1
+        leaves = {}  # map from the root of each tree to its leaves
+        for node in range(len(f0) - 1, 0, -1):
+            if not is_root[node] or f0[node] == _NO_FANIN:
+                continue
+            found, stack = [], [f0[node], f1[node]]
+            while stack:
+                lit = stack.pop()
+                child = lit >> 1
+                if not lit & 1 and f0[child] != _NO_FANIN and counts[child] == 1:
+                    stack.extend((f0[child], f1[child]))
+                else:
+                    found.append(lit)
+                    is_root[child] = 1
+            leaves[node] = found
+
+        new, node_map = self._start_copy()
+        level = new._level
+        for node in sorted(leaves):
+            heap = [(level[lit >> 1], lit)
+                    for lit in set(_remap(node_map, lit) for lit in leaves[node])]
+            heapq.heapify(heap)
+            while len(heap) > 1:
+                a, b = heapq.heappop(heap)[1], heapq.heappop(heap)[1]
+                lit = new.add_and(a, b)
+                heapq.heappush(heap, (level[lit >> 1], lit))
+            node_map[node] = heap[0][1]
+        return self._finish_copy(new, node_map)
+
+    def rewrite(self, cut_size=4, cut_limit=8):
+        """ Return a copy with small pieces of logic rebuilt with fewer gates.
+
+        :param cut_size: the most inputs of a piece of logic (from 2 to 6)
+        :param cut_limit: the most pieces considered for each gate
+
+        A cut of a gate is a set of nodes that every path from the gate to
+        the inputs goes through, and the logic between them is a function of
+        the cut that can be computed as a truth table.  For each gate and cut,
+        the function (or its complement) is written as an irredundant sum of
+        products, which is factored.  The gate is rebuilt from the cut with
+        the factored form that saves the most gates over those that are only
+        used to compute it.  The copy is returned if it is smaller than this
+        AIG, and a cleaned up copy of this AIG otherwise.
+        """
+        if not 2 <= cut_size <= 6:
+            raise PyrtlError('cut_size must be from 2 to 6')
+        aig = self.cleanup()
+        f0, f1 = aig._fanin0, aig._fanin1
+        counts = aig._fanout_counts()
+        full = (1 << (1 << cut_size)) - 1
+        var_tables = [sum(1 << m for m in range(1 << cut_size) if m >> i & 1)
+                      for i in range(cut_size)]
+        forms = {}  # map from truth table to (gates, factored form, inverted)
+
+        cuts = [[()]] + [None] * (len(f0) - 1)
+        replacements = {}  # map from a gate to the cut and form to rebuild it from
+        for node in range(1, len(f0)):
+            if f0[node] == _NO_FANIN:
+                cuts[node] = [(node,)]
+                continue
+            merged = set()
+            for cut0 in cuts[f0[node] >> 1]:
+                for cut1 in cuts[f1[node] >> 1]:
+                    cut = tuple(sorted(set(cut0).union(cut1)))
+                    if len(cut) <= cut_size:
+                        merged.add(cut)
+            merged = sorted(merged, key=lambda cut: (len(cut), cut))[:cut_limit - 1]
+            cuts[node] = [(node,)] + merged
+
+            best_gain = 0
+            for cut in merged:
+                truth = aig._cut_truth(node, cut, var_tables, full)
+                if truth not in forms:
+                    forms[truth] = _factored_form(truth, cut_size, var_tables, full)
+                gates, form, inverted = forms[truth]
+                gain = aig._cone_size(node, cut, counts) - gates
+                if gain > best_gain:
+                    best_gain = gain
+                    replacements[node] = cut, form, inverted
+
+        # build only the logic the outputs still need after the replacements
+        new, node_map = aig._start_copy()
+        stack = [lit >> 1 for lit in aig.outputs]
+        while stack:
+            node = stack[-1]
+            if node_map[node] != -1:
+                stack.pop()
+                continue
+            if node in replacements:
+                needed = replacements[node][0]
+            else:
+                needed = f0[node] >> 1, f1[node] >> 1
+            missing = [n for n in needed if node_map[n] == -1]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            if node in replacements:
+                cut, form, inverted = replacements[node]
+                node_map[node] = _build_form(new, form, [node_map[n] for n in cut]) ^ inverted
+            else:
+                node_map[node] = new.add_and(_remap(node_map, f0[node]),
+                                             _remap(node_map, f1[node]))
+        new = aig._finish_copy(new, node_map).cleanup()
+        return new if new.num_ands < aig.num_ands else aig
+
+    def _cut_truth(self, node, cut, var_tables, full):
+        """ The truth table of node as a function of the nodes in cut. """
+        f0, f1 = self._fanin0, self._fanin1
+        values = {0: 0}
+        values.update(zip(cut, var_tables))
+        stack = [node]
+        while stack:
+            n = stack[-1]
+            if n in values:
+                stack.pop()
+                continue
+            a, b = f0[n], f1[n]
+            missing = [x >> 1 for x in (a, b) if x >> 1 not in values]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            values[n] = (values[a >> 1] ^ -(a & 1)) & (values[b >> 1] ^ -(b & 1)) & full
+        return values[node]
+
+    def _cone_size(self, node, cut, counts):
+        """ The number of gates from node to cut that are used by nothing else. """
+        f0, f1 = self._fanin0, self._fanin1
+        size, stack, released = 0, [node], []
+        while stack:
+            n = stack.pop()
+            size += 1
+            for lit in (f0[n], f1[n]):
+                child = lit >> 1
+                if child in cut or f0[child] == _NO_FANIN:
+                    continue
+                counts[child] -= 1
+                released.append(child)
+                if not counts[child]:
+                    stack.append(child)
+        for child in released:
+            counts[child] += 1
+        return size
+
+
+# -----------------------------------------------------------------------
+# Factored forms of truth tables, for rewrite.  A form is ('const', value),
+# ('lit', 2 * variable + inverted), or ('and' or 'or', form, form).
+
+def _cofactors(truth, var, var_tables, full):
+    mask, shift = var_tables[var], 1 << var
+    low, high = truth & ~mask & full, truth & mask
+    return low | (low << shift), high | (high >> shift)
+
+
+def _isop(on, upper, num_vars, var_tables, full):
+    """ An irredundant sum of products covering on and inside upper (Minato-Morreale).
+
+    Returns the cubes, each a tuple of form literals, and the truth table
+    they cover.  Only the first num_vars variables are used.
+    """
+    if not on:
+        return [], 0
+    if upper == full:
+        return [()], full
+    for var in reversed(range(num_vars)):
+        on0, on1 = _cofactors(on, var, var_tables, full)
+        upper0, upper1 = _cofactors(upper, var, var_tables, full)
+        if on0 != on1 or upper0 != upper1:
+            break
+    cubes0, covered0 = _isop(on0 & ~upper1, upper0, var, var_tables, full)
+    cubes1, covered1 = _isop(on1 & ~upper0, upper1, var, var_tables, full)
+    rest = (on0 & ~covered0 | on1 & ~covered1) & full
+    cubes2, covered2 = _isop(rest, upper0 & upper1, var, var_tables, full)
+    mask = var_tables[var]
+    covered = (covered0 & ~mask | covered1 & mask | covered2) & full
+    return ([cube + (2 * var + 1,) for cube in cubes0] +
+            [cube + (2 * var,) for cube in cubes1] + cubes2), covered
+
+
+def _factor(cubes):
+    """ A form of the sum of cubes, dividing out the most common literal first. """
+    if not cubes:
+        return 'const', 0
+    if not all(cubes):
+        return 'const', 1
+    counts = collections.Counter(lit for cube in cubes for lit in cube)
+    lit, count = max(sorted(counts.items()), key=lambda item: item[1])
+    if count == 1:
+        products = [_join('and', [('lit', x) for x in cube]) for cube in cubes]
+        return _join('or', products)
+    quotient = [tuple(x for x in cube if x != lit) for cube in cubes if lit in cube]
+    rest = [cube for cube in cubes if lit not in cube]
+    if all(quotient):
+        term = 'and', ('lit', lit), _factor(quotient)
+    else:
+        term = 'lit', lit  # lit alone is one of the cubes, and covers the others
+    return term if not rest else ('or', term, _factor(rest))
+
+
+def _join(op, forms):
+    form = forms[0]
+    for other in forms[1:]:
+        form = op, form, other
+    return form
+
+
+def _form_gates(form):
+    if form[0] in ('const', 'lit'):
+        return 0
+    return 1 + _form_gates(form[1]) + _form_gates(form[2])
+
+
+def _factored_form(truth, num_vars, var_tables, full):
+    """ The smaller factored form of truth or of its complement, as (gates, form, inverted). """
+    best = None
+    for inverted in (0, 1):
+        target = truth ^ full if inverted else truth
+        form = _factor(_isop(target, target, num_vars, var_tables, full)[0])
+        gates = _form_gates(form)
+        if best is None or gates < best[0]:
+            best = gates, form, inverted
+    return best
+
+
+def _build_form(aig, form, leaves):
+    """ Add the gates of form to aig and return its literal.
+
+    :param leaves: the literals of the variables of form
+    """
+    if form[0] == 'const':
+        return form[1]
+    if form[0] == 'lit':
+        return leaves[form[1] >> 1] ^ (form[1] & 1)
+    a, b = _build_form(aig, form[1], leaves), _build_form(aig, form[2], leaves)
+    return aig.add_and(a, b) if form[0] == 'and' else aig.add_or(a, b)
+
+
+# -----------------------------------------------------------------------
+# Conversion from and to blocks
+
+def aig_from_block(block=None):
+    """ Build the AIG of a block of single bit logic, such as one made by synthesize.
+
+    :param block: the block to convert (defaults to the working block)
+    :return: the AIG
+
+    The ops '&', '|', '^', 'n', '~', 'x', 's', 'c' and 'w' are converted bit
+    by bit, so they may be on wider wires.  Arithmetic and comparisons are
+    not converted, so a block with any needs to be synthesized first.
+    Registers and memory ports become inputs and outputs of the AIG (see
+    the module documentation), and are rebuilt by `aig_to_block`.
+    """
+    block = working_block(block)
+    aig = AIG()
+    bits = {}  # map from each wire to the literals of its bits, least significant first
+    logic = _topological_order(block, None)
+
+    def add_inputs(wire):
+        first = len(aig.inputs)
+        bits[wire] = [aig._add_input() for _ in range(len(wire))]
+        return list(range(first, len(aig.inputs)))
+
+    def add_outputs(wire):
+        if wire not in bits:
+            raise PyrtlError('wire "%s" is used before it is driven '
+                             '(is there a combinational loop?)' % wire.name)
+        return [aig._add_output(lit) for lit in bits[wire]]
+
+    for wire in sorted(block.wirevector_subset(Input), key=lambda w: w.name):
+        aig.input_wires.append((wire.name, add_inputs(wire)))
+    register_values = [add_inputs(net.dests[0]) for net in logic if net.op == 'r']
+    read_data = [add_inputs(net.dests[0]) for net in logic if net.op == 'm']
+    for wire in block.wirevector_subset(Const):
+        bits[wire] = [(wire.val >> i) & 1 for i in range(len(wire))]
+
+    bitwise_ops = {'&': aig.add_and, '|': aig.add_or, '^': aig.add_xor,
+                   'n': lambda a, b: aig.add_and(a, b) ^ 1}
+    for net in logic:
+        if net.op in 'rm@':
+            continue
+        for arg in net.args:
+            if arg not in bits:
+                raise PyrtlError('wire "%s" is used before it is driven '
+                                 '(is there a combinational loop?)' % arg.name)
+        args = [bits[arg] for arg in net.args]
+        if net.op == 'w':
+            result = args[0]
+        elif net.op == '~':
+            result = [lit ^ 1 for lit in args[0]]
+        elif net.op in bitwise_ops:
+            result = [bitwise_ops[net.op](a, b) for a, b in zip(*args)]
+        elif net.op == 'x':
+            sel = args[0][0]
+            result = [aig.add_mux(sel, t, f) for f, t in zip(args[1], args[2])]
+        elif net.op == 's':
+            result = [args[0][i] for i in net.op_param]
+        elif net.op == 'c':
+            result = [lit for arg in reversed(args) for lit in arg]
+        else:
+            raise PyrtlError('cannot convert a "%s" net to an AIG, '
+                             'synthesize the block first' % net.op)
+        bits[net.dests[0]] = result
+
+    for wire in sorted(block.wirevector_subset(Output), key=lambda w: w.name):
+        aig.output_wires.append((wire.name, add_outputs(wire)))
+    registers = [net for net in logic if net.op == 'r']
+    for net, value in zip(registers, register_values):
+        aig.registers.append((net.dests[0].name, value, add_outputs(net.args[0])))
+    reads = [net for net in logic if net.op == 'm']
+    for net, data in zip(reads, read_data):
+        aig.memory_reads.append((net.op_param, net.dests[0].name, add_outputs(net.args[0]), data))
+    for net in logic:
+        if net.op == '@':
+            aig.memory_writes.append((net.op_param,) + tuple(add_outputs(a) for a in net.args))
+
+    if isinstance(block, PostSynthBlock):
+        aig.io_map = {pre: post.name for pre, post in block.io_map.items()}
+        aig.mem_map = dict(block.mem_map)
+    return aig
+
+
+def aig_to_block(aig, update_working_block=True):
+    """ Build a PostSynthBlock of '&' and '~' nets from an AIG.
+
+    :param aig: the AIG to convert
+    :param update_working_block: whether to make the new block the working block
+    :return: the new PostSynthBlock
+
+    The new block has the inputs, outputs, registers and memories the AIG
+    was built from, with the same names, and (if it was built from a
+    PostSynthBlock) an io_map and mem_map to the same wires and memories
+    before synthesis, so the same testbench works with either.
+    """
+    f0, f1 = aig._fanin0, aig._fanin1
+    block_out = PostSynthBlock()
+    block_out.legal_ops = set('~&rwcsm@')
+    wires = [None] * len(f0)  # the wire of each node
+    inverted = {}  # map from a node to the inverse of its wire
+
+    with set_working_block(block_out, no_sanity_check=True):
+        def set_input_wires(positions, wire):
+            for i, position in enumerate(positions):
+                wires[aig.inputs[position]] = wire[i]
+            return wire
+
+        for name, positions in aig.input_wires:
+            set_input_wires(positions, Input(len(positions), name))
+        registers = [set_input_wires(value, Register(len(value), name))
+                     for name, value, next_value in aig.registers]
+        read_data = [set_input_wires(data, WireVector(len(data), name))
+                     for op_param, name, address, data in aig.memory_reads]
+
+        def lit_wire(lit):
+            node = lit >> 1
+            if node == 0:
+                return Const(lit, bitwidth=1)
+            if not lit & 1:
+                return wires[node]
+            if node not in inverted:
+                inverted[node] = ~wires[node]
+            return inverted[node]
+
+        counts = aig._fanout_counts()
+        for node in range(1, len(f0)):
+            if counts[node] and f0[node] != _NO_FANIN:
+                wires[node] = lit_wire(f0[node]) & lit_wire(f1[node])
+
+        def outputs_wire(positions):
+            return concat_list([lit_wire(aig.outputs[p]) for p in positions])
+
+        for name, positions in aig.output_wires:
+            output = Output(len(positions), name)
+            output <<= outputs_wire(positions)
+        for register, (name, value, next_value) in zip(registers, aig.registers):
+            register.next <<= outputs_wire(next_value)
+        mem_map = {}  # map from the memories of the source block to those of block_out
+        for data, (op_param, name, address, _) in zip(read_data, aig.memory_reads):
+            block_out.add_net(LogicNet(
+                'm', _get_new_block_mem_instance(op_param, mem_map, block_out),
+                args=(outputs_wire(address),), dests=(data,)))
+        for op_param, address, data, enable in aig.memory_writes:
+            block_out.add_net(LogicNet(
+                '@', _get_new_block_mem_instance(op_param, mem_map, block_out),
+                args=(outputs_wire(address), outputs_wire(data), outputs_wire(enable)),
+                dests=()))
+
+    block_out.io_map = {pre: block_out.wirevector_by_name[name]
+                        for pre, name in aig.io_map.items()}
+    block_out.mem_map = {pre: mem_map[post] for pre, post in aig.mem_map.items()
+                         if post in mem_map}
+    if update_working_block:
+        set_working_block(block_out, no_sanity_check=True)
+    return block_out
+
+
+def _aig_optimize(block, pass_manager):
+    aig = aig_from_block(block)
+    aig = aig.rewrite().balance().rewrite().balance()
+    return aig_to_block(aig, update_working_block=False)
+
+
+_aig_optimize_pass = Pass(_aig_optimize, 'aig_optimize')
+
+
+def aig_optimize(update_working_block=True, block=None, pass_manager=None):
+    """ Optimize a block of single bit logic as an AIG.
+
+    :param update_working_block: whether to make the new block the working block
+    :param block: the block to optimize, such as one made by synthesize
+        (defaults to the working block)
+    :param pass_manager: the PassManager to run the pass with (defaults to a new one)
+    :return: the new, optimized PostSynthBlock
+
+    The block is converted with `aig_from_block`, rewritten and balanced
+    twice, and converted back with `aig_to_block`.
+    """
+    if pass_manager is None:
+        pass_manager = PassManager()
+    block_out = pass_manager.run(_aig_optimize_pass, working_block(block))
+    if update_working_block:
+        set_working_block(block_out, no_sanity_check=True)
+    return block_out
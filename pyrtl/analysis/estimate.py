@@ -46,60 +46,10 @@ def area_estimation(tech_in_nm=130, block=None):
         area_estimate = 0.001 * tech_in_um**2.07 * bits**0.9 * ports**0.7 + 0.0048
         return area_estimate if not is_rom else area_estimate / 10.0
 
-    # Subset of the raw data gathered from yosys, mapping to vsclib 130nm library
-    # Width   Adder_Area  Mult_Area  (area in "tracks" as discussed below)
-    # 8       211         2684
-    # 16      495         12742
-    # 32      1110        49319
-    # 64      2397        199175
-    # 128     4966        749828
-
-    def adder_stdcell_estimate(width):
-        return width * 34.4 - 25.8
-
-    def multiplier_stdcell_estimate(width):
-        if width == 1:
-            return 5
-        elif width == 2:
-            return 39
-        elif width == 3:
-            return 219
-        else:
-            return -958 + (150 * width) + (45 * width**2)
-
-    def stdcell_estimate(net):
-        if net.op in 'w~sc':
-            return 0
-        elif net.op in '&|n':
-            return 40/8.0 * len(net.args[0])   # 40 lambda
-        elif net.op in '^=<>x':
-            return 80/8.0 * len(net.args[0])   # 80 lambda
-        elif net.op == 'r':
-            return 144/8.0 * len(net.args[0])  # 144 lambda
-        elif net.op in '+-':
-            return adder_stdcell_estimate(len(net.args[0]))
-        elif net.op == '*':
-            return multiplier_stdcell_estimate(len(net.args[0]))
-        elif net.op in 'm@':
-            return 0  # memories handled elsewhere
-        else:
-            raise PyrtlInternalError('Unable to estimate the following net '
-                                     'due to unimplemented op :\n%s' % str(net))
-
     block = working_block(block)
 
-    # The functions above were gathered and calibrated by mapping
-    # reference designs to an openly available 130nm stdcell library.
-    # http://www.vlsitechnology.org/html/vsc_description.html
-    # http://www.vlsitechnology.org/html/cells/vsclib013/lib_gif_index.html
-
-    # In a standard cell design, each gate takes up a length of standard "track"
-    # in the chip.  The functions above return that length for each of the different
-    # types of functions in the units of "tracks".  In the 130nm process used,
-    # 1 lambda is 55nm, and 1 track is 8 lambda.
-
     # first, sum up the area of all of the logic elements (including registers)
-    total_tracks = sum(stdcell_estimate(a_net) for a_net in block.logic)
+    total_tracks = sum(_stdcell_estimate(a_net) for a_net in block.logic)
     total_length_in_nm = total_tracks * 8 * 55
     # each track is then 72 lambda tall, and converted from nm2 to mm2
     area_in_mm2_for_130nm = (total_length_in_nm * (72 * 55)) / 1e12
@@ -116,6 +66,60 @@ def area_estimation(tech_in_nm=130, block=None):
     return logic_area, mem_area
 
 
+# Subset of the raw data gathered from yosys, mapping to vsclib 130nm library
+# Width   Adder_Area  Mult_Area  (area in "tracks" as discussed below)
+# 8       211         2684
+# 16      495         12742
+# 32      1110        49319
+# 64      2397        199175
+# 128     4966        749828
+
+# The functions below were gathered and calibrated by mapping
+# reference designs to an openly available 130nm stdcell library.
+# http://www.vlsitechnology.org/html/vsc_description.html
+# http://www.vlsitechnology.org/html/cells/vsclib013/lib_gif_index.html
+
+# In a standard cell design, each gate takes up a length of standard "track"
+# in the chip.  The functions below return that length for each of the different
+# types of functions in the units of "tracks".  In the 130nm process used,
+# 1 lambda is 55nm, and 1 track is 8 lambda.
+
+def _adder_stdcell_estimate(width):
+    return width * 34.4 - 25.8
+
+
+def _multiplier_stdcell_estimate(width):
+    if width == 1:
+        return 5
+    elif width == 2:
+        return 39
+    elif width == 3:
+        return 219
+    else:
+        return -958 + (150 * width) + (45 * width**2)
+
+
+def _stdcell_estimate(net):
+    """ Estimate the length in stdcell tracks of the logic implementing net. """
+    if net.op in 'w~sc':
+        return 0
+    elif net.op in '&|n':
+        return 40/8.0 * len(net.args[0])   # 40 lambda
+    elif net.op in '^=<>x':
+        return 80/8.0 * len(net.args[0])   # 80 lambda
+    elif net.op == 'r':
+        return 144/8.0 * len(net.args[0])  # 144 lambda
+    elif net.op in '+-':
+        return _adder_stdcell_estimate(len(net.args[0]))
+    elif net.op == '*':
+        return _multiplier_stdcell_estimate(len(net.args[0]))
+    elif net.op in 'm@':
+        return 0  # memories handled elsewhere
+    else:
+        raise PyrtlInternalError('Unable to estimate the following net '
+                                 'due to unimplemented op :\n%s' % str(net))
+
+
 def _bits_ports_and_isrom_from_memory(mem):
     """ Helper to extract mem bits and ports for estimation. """
     is_rom = False
@@ -320,6 +324,113 @@ class TimingAnalysis(object):
             print()
 
 
+# --------------------------------------------------------------------
+#    __   __        ___  __
+#   |__) /  \ |  | |__  |__)
+#   |    \__/ |/\| |___ |  \
+#
+
+class PowerAnalysis(object):
+    """
+    Power analysis estimates the dynamic (switching) power of the block
+
+    The energy of each toggle of a wire is taken to be proportional to the
+    capacitance it switches: that of the logic driving it (its share, per
+    output bit, of the driving net's stdcell tracks) plus the inputs of
+    the logic it drives (each consuming net's tracks shared out over its
+    input bits).  The toggle rates come from simulation, so the estimate
+    follows the workload simulated.
+
+    PowerAnalysis has a wire_power map from each wire to its estimated
+    power in mW, along with op_power (summed by the op of the driving net,
+    with 'Input' for the block inputs) and total_power.
+    """
+
+    def __init__(self, activity, block=None, tech_in_nm=130, voltage=1.2, freq_in_mhz=None,
+                 default_toggle_rate=0.0):
+        """ Estimates the dynamic power of the block.
+
+        :param activity: the ActivityTable returned by the `activity` method of a
+            simulator created with activity=True, or a SimulationTrace (whose
+            values are counted in a single pass)
+        :param block: pyrtl block to analyze
+        :param tech_in_nm: the size of the circuit technology to be estimated
+            (for example, 65 is 65nm and 250 is 0.25um)
+        :param voltage: the supply voltage
+        :param freq_in_mhz: the clock frequency (defaults to the max_freq of
+            a TimingAnalysis of the block)
+        :param default_toggle_rate: the toggles per bit per cycle assumed for
+            the wires with no recorded activity (such as untraced wires)
+
+        Like area_estimation, the capacitance model is calibrated to a 130nm
+        stdcell library and scaled linearly to the target technology.  The clock
+        network, leakage and memories are not included, so the results are best
+        used to compare designs and workloads rather than as absolute numbers.
+        """
+        from ..simulation import ActivityTable
+
+        self.block = working_block(block)
+        self.block.sanity_check()
+        if not isinstance(activity, ActivityTable):
+            activity = ActivityTable.from_trace(activity)
+        if freq_in_mhz is None:
+            freq_in_mhz = TimingAnalysis(self.block).max_freq(tech_in_nm)
+        self.freq_in_mhz = freq_in_mhz
+        self.unknown_wires = set()
+        self._generate_power_map(activity, tech_in_nm, voltage, default_toggle_rate)
+
+    # estimated switched capacitance of one stdcell track in the 130nm library
+    _fF_per_track = 0.5
+
+    def _generate_power_map(self, activity, tech_in_nm, voltage, default_toggle_rate):
+        src_map, dst_map = self.block.net_connections()
+        fF_per_track = self._fF_per_track * tech_in_nm / 130.0
+
+        # per bit capacitance loading each wire, in tracks
+        load = {}
+        for net in self.block.logic:
+            tracks = _stdcell_estimate(net)
+            if not tracks:
+                continue
+            for dest in net.dests:
+                load[dest] = load.get(dest, 0) + tracks / float(len(dest))
+            in_bits = sum(len(arg) for arg in net.args)
+            for arg in net.args:
+                load[arg] = load.get(arg, 0) + tracks / float(in_bits)
+
+        # P = 1/2 * toggles per cycle * C * V^2 * f, in mW
+        scale = 0.5 * fF_per_track * 1e-15 * voltage**2 * self.freq_in_mhz * 1e6 * 1e3
+        self.wire_power = {}
+        self.op_power = {}
+        for wire in self.block.wirevector_set:
+            if isinstance(wire, Const):
+                continue
+            if wire.name in activity and activity.cycles > 1:
+                toggles_per_cycle = activity.toggle_rate(wire.name) * len(wire)
+            else:
+                self.unknown_wires.add(wire)
+                toggles_per_cycle = default_toggle_rate * len(wire)
+            power = scale * toggles_per_cycle * load.get(wire, 0)
+            self.wire_power[wire] = power
+            op = src_map[wire].op if wire in src_map else 'Input'
+            self.op_power[op] = self.op_power.get(op, 0) + power
+        self.total_power = sum(self.wire_power.values())
+
+    def print_power(self, file=sys.stdout, limit=20):
+        """ Prints the total power, the power by op and the most power hungry wires. """
+        print('Estimated dynamic power at %.1f MHz: %.6f mW'
+              % (self.freq_in_mhz, self.total_power), file=file)
+        print('By op:', file=file)
+        for op, power in sorted(self.op_power.items(), key=lambda x: (-x[1], x[0])):
+            print('  %-6s %.6f mW' % (op, power), file=file)
+        print('By wire:', file=file)
+        wires = sorted(self.wire_power.items(), key=lambda x: (-x[1], x[0].name))
+        for wire, power in wires[:limit]:
+            print('  %-20s %.6f mW' % (wire.name, power), file=file)
+        if self.unknown_wires:
+            print('(%d wires had no recorded activity)' % len(self.unknown_wires), file=file)
+
+
 # --------------------------------------------------------------------
 #          __   __       __
 #     \ / /  \ /__` \ / /__`
@@ -13,7 +13,10 @@ from .core import working_block
 from .wire import Input, Output, Const, WireVector, Register
 from .memory import RomBlock
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
-from .simulation import SimulationTrace
+from .simulation import (
+    SimulationTrace, WindowedSimulationTrace, ActivityTable, WireActivity,
+    _coverage_plan, _make_coverage, _PositionalInputs)
+from .helperfuncs import _rtl_assertion_failed
 
 
 __all__ = ['CompiledSimulation']
@@ -60,7 +63,7 @@ class DllMemInspector(collections.Mapping):
         return all(self[x] == other.get(x, 0) for x in self)
 
 
-class CompiledSimulation(object):
+class CompiledSimulation(_PositionalInputs):
     """Simulate a block, compiling to C for efficiency.
 
     THIS IS AN EXPERIMENTAL SIMULATION CLASS.
@@ -82,11 +85,18 @@ class CompiledSimulation(object):
         - mips64 (untested)
 
     default_value is currently only implemented for registers, not memories.
+
+    With tracer=None nothing is recorded, and `inspect` can only give the
+    values of the Outputs in the last cycle run.
+
+    With activity=True the C step function also counts the bit toggles and
+    one bits of every wire (see `activity`), and with coverage enabled it
+    records toggle, mux arm and state coverage (see `coverage`).
     """
 
     def __init__(
             self, tracer=True, register_value_map={}, memory_value_map={},
-            default_value=0, block=None):
+            default_value=0, block=None, activity=False, coverage=False):
         self._dll = self._dir = None
         self.block = working_block(block)
         self.block.sanity_check()
@@ -94,15 +104,64 @@ class CompiledSimulation(object):
         if tracer is True:
             tracer = SimulationTrace()
         self.tracer = tracer
-        self._remove_untraceable()
+        self._probe_mapping = {}
+        if tracer is not None:
+            self._remove_untraceable()
+        self._last_outputs = {}
+        if isinstance(tracer, WindowedSimulationTrace) and tracer.trigger is not None:
+            if not self._traceable(self.block.get_wirevector_by_name(tracer.trigger)):
+                raise PyrtlError(
+                    'CompiledSimulation can only trigger on an Input, an Output '
+                    'or a wire directly driving an Output')
 
         self.default_value = default_value
         self._regmap, self._memmap = register_value_map, memory_value_map
         self._uid_counter = 0
+        self._assert_wires = list(self.block.rtl_assert_dict)
+        self._cycle = 0
+        self._act_wires = None
+        if activity:
+            self._act_wires = [w for w in self.block.wirevector_set if not isinstance(w, Const)]
+        self._coverage_plan = _coverage_plan(self.block, coverage)
         self.varname = {}  # mapping from wires and memories to C variables
 
         self._create_dll()
 
+    def activity(self):
+        """Return the ActivityTable of the cycles simulated so far."""
+        if self._act_wires is None:
+            raise PyrtlError('the simulator was not created with activity=True')
+        n = len(self._act_wires)
+        toggles = (ctypes.c_uint64*n).in_dll(self._dll, 'act_toggles')
+        ones = (ctypes.c_uint64*n).in_dll(self._dll, 'act_ones')
+        return ActivityTable(self._cycle, {
+            w.name: WireActivity(w.bitwidth, toggles[x], ones[x])
+            for x, w in enumerate(self._act_wires)})
+
+    def coverage(self):
+        """Return the Coverage of the cycles simulated so far."""
+        if self._coverage_plan is None:
+            raise PyrtlError('the simulator was not created with coverage enabled')
+        toggle_wires, mux_nets, state_regs = self._coverage_plan
+        nlimbs = sum(self._limbs(w) for w in toggle_wires)
+        rose_limbs = (ctypes.c_uint64*nlimbs).in_dll(self._dll, 'cov_rose')
+        fell_limbs = (ctypes.c_uint64*nlimbs).in_dll(self._dll, 'cov_fell')
+        rose, fell, pos = [], [], 0
+        for w in toggle_wires:
+            limbs = self._limbs(w)
+            rose.append(sum(rose_limbs[pos+n] << (64*n) for n in range(limbs)))
+            fell.append(sum(fell_limbs[pos+n] << (64*n) for n in range(limbs)))
+            pos += limbs
+        mux_hits = (ctypes.c_uint64*(2*len(mux_nets))).in_dll(self._dll, 'cov_mux')
+        muxes = [mux_hits[2*k:2*k+2] for k in range(len(mux_nets))]
+        nstates = sum(1 << r.bitwidth for r in state_regs)
+        state_hits = (ctypes.c_uint64*nstates).in_dll(self._dll, 'cov_state')
+        states, pos = [], 0
+        for r in state_regs:
+            states.append(state_hits[pos:pos + (1 << r.bitwidth)])
+            pos += 1 << r.bitwidth
+        return _make_coverage(self._coverage_plan, self._cycle, rose, fell, muxes, states)
+
     def inspect_mem(self, mem):
         """Get a view into the contents of a MemBlock."""
         return DllMemInspector(self, mem)
@@ -111,6 +170,12 @@ class CompiledSimulation(object):
         """Get the latest value of the wire given, if possible."""
         if isinstance(w, WireVector):
             w = w.name
+        if self.tracer is None:
+            if w in self._last_outputs:
+                return self._last_outputs[w]
+            if w in self._outputpos:
+                raise PyrtlError('No context available. Please run a simulation step')
+            raise PyrtlError('CompiledSimulation without a tracer can only inspect Outputs')
         try:
             vals = self.tracer.trace[w]
         except KeyError:
@@ -135,13 +200,9 @@ class CompiledSimulation(object):
         and its length is the number of steps to be executed.
         """
         steps = len(inputs)
-        # create i/o arrays of the appropriate length
+        # create input array of the appropriate length
         ibuf_type = ctypes.c_uint64*(steps*self._ibufsz)
-        obuf_type = ctypes.c_uint64*(steps*self._obufsz)
         ibuf = ibuf_type()
-        obuf = obuf_type()
-        # these array will be passed to _crun
-        self._crun.argtypes = [ctypes.c_uint64, ibuf_type, obuf_type]
 
         # build the input array
         for n, inmap in enumerate(inputs):
@@ -161,11 +222,70 @@ class CompiledSimulation(object):
                 for pos in range(start, start+count):
                     ibuf[pos] = val & ((1 << 64)-1)
                     val >>= 64
+        self._run_ibuf(steps, ibuf, ibuf_type)
+
+    def step_values(self, values):
+        """Run one step with values for the inputs bound by `bind_inputs`."""
+        self.run_values([values])
+
+    def run_values(self, rows):
+        """Run one step per row of rows, each holding values for the bound inputs.
+
+        The values are packed straight into the input array of the C step function.
+        """
+        steps = len(rows)
+        ibuf_type = ctypes.c_uint64*(steps*self._ibufsz)
+        ibuf = ibuf_type()
+        positions = [self._inputpos[name] for name in self._bound_names]
+        for n, values in enumerate(rows):
+            self._check_values(values)
+            base = n*self._ibufsz
+            for (start, count), val in zip(positions, values):
+                if count == 1:
+                    ibuf[base+start] = val
+                    continue
+                for pos in range(base+start, base+start+count):
+                    ibuf[pos] = val & ((1 << 64)-1)
+                    val >>= 64
+        self._run_ibuf(steps, ibuf, ibuf_type)
+
+    def _run_ibuf(self, steps, ibuf, ibuf_type):
+        """Run the steps whose inputs are packed in ibuf."""
+        # the index of the first rtl_assert to fail, if any (the run stops there)
+        failed = (ctypes.c_int64*1)(-1)
+        if isinstance(self.tracer, WindowedSimulationTrace):
+            self._run_window(steps, ibuf, failed)
+        else:
+            self._run_all(steps, ibuf, ibuf_type, failed)
+        if failed[0] >= 0:
+            _rtl_assertion_failed(self.block, self._assert_wires[failed[0]], self._cycle - 1)
+
+    def _run_all(self, steps, ibuf, ibuf_type, failed):
+        """Run steps, copying back the traced values of every cycle."""
+        # create output array of the appropriate length
+        obuf_type = ctypes.c_uint64*(steps*self._obufsz)
+        obuf = obuf_type()
+        # these array will be passed to _crun
+        self._crun.argtypes = [ctypes.c_uint64, ibuf_type, obuf_type, type(failed)]
 
         # run the simulation
-        self._crun(steps, ibuf, obuf)
+        steps = self._crun(steps, ibuf, obuf, failed)
+        self._cycle += steps
+
+        if self.tracer is None:
+            # keep just the last outputs, for inspect
+            if steps:
+                base = (steps-1)*self._obufsz
+                for name, (start, count) in self._outputpos.items():
+                    val = 0
+                    for pos in reversed(range(base+start, base+start+count)):
+                        val <<= 64
+                        val |= obuf[pos]
+                    self._last_outputs[name] = val
+            return
 
         # save traced wires
+        values = {}
         for name in self.tracer.trace:
             rname = self._probe_mapping.get(name, name)
             if rname in self._outputpos:
@@ -185,7 +305,70 @@ class CompiledSimulation(object):
                     val |= buf[pos]
                 res.append(val)
                 start += sz
-            self.tracer.trace[name].extend(res)
+            values[name] = res
+        self.tracer.add_steps_named(values)
+
+    def _run_window(self, steps, ibuf, failed):
+        """Run steps with the capture window of a WindowedSimulationTrace kept in C.
+
+        Each captured cycle is stored as an output record followed by an input
+        record in a ring buffer of window+post_trigger slots, and the trigger is
+        checked as the records are written, so only the cycles in the window
+        are ever copied back to Python.
+        """
+        tracer = self.tracer
+        recsz = self._obufsz + self._ibufsz
+        if self._window is None:
+            slots = tracer.window + tracer.post_trigger
+            ring = (ctypes.c_uint64*(slots*recsz))()
+            # recorded, triggered, post cycles remaining, done
+            state = (ctypes.c_uint64*4)()
+            trigger = [0, 0, 0, 0]
+            if tracer.trigger is not None:
+                name = self._probe_mapping.get(tracer.trigger, tracer.trigger)
+                if name in self._outputpos:
+                    start, count = self._outputpos[name]
+                else:
+                    start, count = self._inputpos[name]
+                    start += self._obufsz
+                value = tracer.trigger_value
+                trigger = [1, start, count, tracer.post_trigger]
+                for n in range(count):
+                    trigger.append(value & ((1 << 64)-1))
+                    value >>= 64
+            trigger = (ctypes.c_uint64*len(trigger))(*trigger)
+            self._window = slots, ring, state, trigger
+            self._crun_window.argtypes = [
+                ctypes.c_uint64, ctypes.POINTER(ctypes.c_uint64), type(ring),
+                ctypes.c_uint64, type(state), type(trigger), type(failed)]
+        slots, ring, state, trigger = self._window
+
+        before = state[0]
+        self._cycle += self._crun_window(
+            steps, ctypes.cast(ibuf, ctypes.POINTER(ctypes.c_uint64)),
+            ring, slots, state, trigger, failed)
+        after = state[0]
+        first = max(before, after - slots)
+        tracer._skip(first - before)
+
+        values = {}
+        for name in tracer.trace:
+            rname = self._probe_mapping.get(name, name)
+            if rname in self._outputpos:
+                start, count = self._outputpos[rname]
+            else:
+                start, count = self._inputpos[rname]
+                start += self._obufsz
+            res = []
+            for k in range(first, after):
+                base = (k % slots)*recsz + start
+                val = 0
+                for pos in reversed(range(base, base+count)):
+                    val <<= 64
+                    val |= ring[pos]
+                res.append(val)
+            values[name] = res
+        tracer.add_steps_named(values)
 
     def _traceable(self, wv):
         """Check if wv is able to be traced
@@ -207,9 +390,7 @@ class CompiledSimulation(object):
         """
         self._probe_mapping = {}
         wvs = {wv for wv in self.tracer.wires_to_track if self._traceable(wv)}
-        self.tracer.wires_to_track = wvs
-        self.tracer._wires = {wv.name: wv for wv in wvs}
-        self.tracer.trace.__init__(wvs)
+        self.tracer._set_wires_to_track(wvs)
 
     def _create_dll(self):
         """Create a dynamically-linked library implementing the simulation logic."""
@@ -227,7 +408,10 @@ class CompiledSimulation(object):
             ], shell=(platform.system() == 'Windows'))
         self._dll = ctypes.CDLL(path.join(self._dir, 'pyrtlsim.so'))
         self._crun = self._dll.sim_run_all
-        self._crun.restype = None  # argtypes set on use
+        self._crun.restype = ctypes.c_uint64  # argtypes set on use
+        self._crun_window = self._dll.sim_run_window
+        self._crun_window.restype = ctypes.c_uint64
+        self._window = None
 
     def _limbs(self, w):
         """Number of 64-bit words needed to store value of wire."""
@@ -449,10 +633,11 @@ class CompiledSimulation(object):
                 res.append('(({arg}[{limb}]>>{start})<<{pos})'.format(
                     arg=arg, limb=alimb, start=astart, pos=dpos))
                 dpos += asize
-                if dpos >= dest.bitwidth-64*n:
-                    break
                 if dpos > 64:
-                    curr = (arg, alimb, 64-(dpos-asize), dpos-64)
+                    # the rest of this piece goes in the next limb
+                    curr = (arg, alimb, astart+64-(dpos-asize), dpos-64)
+                    break
+                if dpos >= dest.bitwidth-64*n:
                     break
                 curr = next(pieces)
                 if dpos == 64:
@@ -505,8 +690,31 @@ class CompiledSimulation(object):
         for mem in mems:
             self._declare_mem(write, mem)
 
+        # activity counters
+        if self._act_wires is not None:
+            nlimbs = sum(self._limbs(w) for w in self._act_wires)
+            write('EXPORT')
+            write('uint64_t act_toggles[{}], act_ones[{}];'.format(
+                max(len(self._act_wires), 1), max(len(self._act_wires), 1)))
+            write('static uint64_t act_prev[{}];'.format(max(nlimbs, 1)))
+            write('static int act_started = 0;')
+
+        # coverage counters
+        if self._coverage_plan is not None:
+            toggle_wires, mux_nets, state_regs = self._coverage_plan
+            nlimbs = max(sum(self._limbs(w) for w in toggle_wires), 1)
+            write('EXPORT')
+            write('uint64_t cov_rose[{n}], cov_fell[{n}];'.format(n=nlimbs))
+            write('EXPORT')
+            write('uint64_t cov_mux[{}];'.format(max(2*len(mux_nets), 1)))
+            write('EXPORT')
+            write('uint64_t cov_state[{}];'.format(
+                max(sum(1 << r.bitwidth for r in state_regs), 1)))
+            write('static uint64_t cov_prev[{}];'.format(nlimbs))
+            write('static int cov_started = 0;')
+
         # single step function
-        write('static void sim_run_step(uint64_t inputs[], uint64_t outputs[]) {')
+        write('static int64_t sim_run_step(uint64_t inputs[], uint64_t outputs[]) {')
         write('uint64_t tmp, carry, tmphi, tmplo;')  # temporary variables
 
         # declare wire vectors
@@ -565,6 +773,48 @@ class CompiledSimulation(object):
                     n=n))
             write('}')
 
+        # activity counts, toggles against the previous cycle
+        if self._act_wires is not None:
+            pos = 0
+            for x, w in enumerate(self._act_wires):
+                for n in range(self._limbs(w)):
+                    write('act_toggles[{x}] += act_started ? '
+                          '__builtin_popcountll({vn}[{n}] ^ act_prev[{p}]) : 0;'.format(
+                              x=x, vn=self.varname[w], n=n, p=pos))
+                    write('act_ones[{x}] += __builtin_popcountll({vn}[{n}]);'.format(
+                        x=x, vn=self.varname[w], n=n))
+                    write('act_prev[{p}] = {vn}[{n}];'.format(p=pos, vn=self.varname[w], n=n))
+                    pos += 1
+            write('act_started = 1;')
+
+        # coverage, the bits that rose and fell since the previous cycle
+        if self._coverage_plan is not None:
+            toggle_wires, mux_nets, state_regs = self._coverage_plan
+            write('if (cov_started) {')
+            pos = 0
+            for w in toggle_wires:
+                for n in range(self._limbs(w)):
+                    write('tmp = {vn}[{n}] ^ cov_prev[{p}];'.format(
+                        vn=self.varname[w], n=n, p=pos))
+                    write('cov_rose[{p}] |= tmp & {vn}[{n}];'.format(
+                        p=pos, vn=self.varname[w], n=n))
+                    write('cov_fell[{p}] |= tmp & cov_prev[{p}];'.format(p=pos))
+                    pos += 1
+            write('}')
+            pos = 0
+            for w in toggle_wires:
+                for n in range(self._limbs(w)):
+                    write('cov_prev[{p}] = {vn}[{n}];'.format(p=pos, vn=self.varname[w], n=n))
+                    pos += 1
+            write('cov_started = 1;')
+            for k, net in enumerate(mux_nets):
+                write('cov_mux[{}]++;'.format(
+                    '{} + {}[0]'.format(2*k, self.varname[net.args[0]])))
+            pos = 0
+            for r in state_regs:
+                write('cov_state[{} + {}[0]]++;'.format(pos, self.varname[r]))
+                pos += 1 << r.bitwidth
+
         # register updates
         regnets = list(self.block.logic_subset('r'))
         for x, net in enumerate(regnets):
@@ -588,17 +838,57 @@ class CompiledSimulation(object):
                 write('outputs[{pos}] = {vn}[{n}];'.format(pos=opos, vn=self.varname[w], n=n))
                 opos += 1
         self._obufsz = opos  # total length of output array
+
+        # rtl assertions, returning the index of the first to fail
+        for x, w in enumerate(self._assert_wires):
+            write('if (!{vn}[0]) return {x};'.format(vn=self.varname[w], x=x))
+        write('return -1;')
         write('}')
 
         # entry point
         write('EXPORT')
-        write('void sim_run_all(uint64_t stepcount, uint64_t inputs[], uint64_t outputs[]) {')
+        write('uint64_t sim_run_all(uint64_t stepcount, uint64_t inputs[], uint64_t outputs[], '
+              'int64_t failed[]) {')
         write('uint64_t input_pos = 0, output_pos = 0;')
         write('for (uint64_t stepnum = 0; stepnum < stepcount; stepnum++) {')
-        write('sim_run_step(inputs+input_pos, outputs+output_pos);')
+        write('int64_t f = sim_run_step(inputs+input_pos, outputs+output_pos);')
         write('input_pos += {};'.format(self._ibufsz))
         write('output_pos += {};'.format(self._obufsz))
-        write('}}')
+        write('if (f >= 0) { failed[0] = f; return stepnum+1; }')
+        write('}')
+        write('return stepcount;')
+        write('}')
+
+        # entry point capturing only a window of cycles (see _run_window)
+        recsz = self._obufsz + self._ibufsz
+        write('EXPORT')
+        write('uint64_t sim_run_window(uint64_t stepcount, uint64_t inputs[], uint64_t ring[], '
+              'uint64_t slots, uint64_t state[], uint64_t trigger[], int64_t failed[]) {')
+        write('uint64_t scratch[{}];'.format(max(self._obufsz, 1)))
+        write('for (uint64_t stepnum = 0; stepnum < stepcount; stepnum++) {')
+        write('uint64_t *in = inputs + stepnum*{};'.format(self._ibufsz))
+        write('int64_t f;')
+        write('if (state[3]) {')
+        write('f = sim_run_step(in, scratch);')
+        write('if (f >= 0) { failed[0] = f; return stepnum+1; }')
+        write('continue;')
+        write('}')
+        write('uint64_t *rec = ring + (state[0] % slots)*{};'.format(recsz))
+        write('f = sim_run_step(in, rec);')
+        write('for (uint64_t n = 0; n < {}; n++) rec[{}+n] = in[n];'.format(
+            self._ibufsz, self._obufsz))
+        write('state[0]++;')
+        write('if (state[1]) { if (--state[2] == 0) state[3] = 1; }')
+        write('else if (trigger[0]) {')
+        write('int match = 1;')
+        write('for (uint64_t n = 0; n < trigger[2]; n++) '
+              'if (rec[trigger[1]+n] != trigger[4+n]) match = 0;')
+        write('if (match) { state[1] = 1; state[2] = trigger[3]; if (!state[2]) state[3] = 1; }')
+        write('}')
+        write('if (f >= 0) { failed[0] = f; return stepnum+1; }')
+        write('}')
+        write('return stepcount;')
+        write('}')
 
     def __del__(self):
         """Handle removal of the DLL when the simulator is deleted."""
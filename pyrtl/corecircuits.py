@@ -622,13 +622,12 @@ def _one_bit_add(a, b, carry_in):
 
 def _add_helper(a, b, carry_in):
     a, b = match_bitwidth(a, b)
-    if len(a) == 1:
-        sumbits, carry_out = _one_bit_add(a, b, carry_in)
-    else:
-        lsbit, ripplecarry = _one_bit_add(a[0], b[0], carry_in)
-        msbits, carry_out = _add_helper(a[1:], b[1:], ripplecarry)
-        sumbits = concat(msbits, lsbit)
-    return sumbits, carry_out
+    sumbits = []
+    carry = carry_in
+    for i in range(len(a)):  # a loop rather than recursion, so wide adders are fine
+        sumbit, carry = _one_bit_add(a[i], b[i], carry)
+        sumbits.append(sumbit)
+    return concat_list(sumbits), carry
 
 
 def _basic_add(a, b):
@@ -638,7 +637,7 @@ def _basic_add(a, b):
 
 def _basic_sub(a, b):
     sumbits, carry_out = _add_helper(a, ~b, 1)
-    return concat(carry_out, sumbits)
+    return concat(~carry_out, sumbits)  # the top bit is the borrow, not the carry
 
 
 def _basic_eq(a, b):
@@ -647,12 +646,12 @@ def _basic_eq(a, b):
 
 def _basic_lt(a, b):
     assert len(a) == len(b)
-    a_msb = a[-1]
-    b_msb = b[-1]
-    if len(a) == 1:
-        return (b_msb & ~a_msb)
-    small = _basic_lt(a[:-1], b[:-1])
-    return (b_msb & ~a_msb) | (small & ~(a_msb ^ b_msb))
+    # from the least significant bit up, a < b so far if b has a 1 where a has
+    # a 0, or if the bits are equal and a < b in the bits below
+    lt = b[0] & ~a[0]
+    for i in range(1, len(a)):
+        lt = (b[i] & ~a[i]) | (lt & ~(a[i] ^ b[i]))
+    return lt
 
 
 def _basic_gt(a, b):
@@ -3,6 +3,7 @@
 
 from __future__ import print_function, unicode_literals
 
+import copy
 import numbers
 import six
 import math
@@ -64,7 +65,11 @@ def rtl_assert(w, exp, block=None):
     :return: the Output wire for the assertion (can be ignored in most cases)
 
     If at any time during execution the wire w is not `true` (i.e. asserted low)
-    then simulation will raise exp.
+    then simulation will raise exp.  The simulators check the assertions as
+    part of evaluating each cycle and stop at the end of the first failing
+    cycle.  Each failure raises a copy of exp whose *rtl_assert_cycle* and
+    *rtl_assert_wire* attributes hold the failing cycle and the name of the
+    assertion wire.
     """
     block = working_block(block)
 
@@ -95,15 +100,38 @@ def check_rtl_assertions(sim):
 
     :param sim: Simulation in which to check the assertions
     :return: None
+
+    The cycle reported for a failure is the last one sim has simulated.  An
+    assertion whose wire sim cannot inspect raises a PyrtlError naming it,
+    rather than being skipped.
     """
 
-    for (w, exp) in sim.block.rtl_assert_dict.items():
+    for w in sim.block.rtl_assert_dict:
         try:
-            value = sim.inspect(w)
-            if not value:
-                raise exp
-        except KeyError:
-            pass
+            value = sim.inspect(w.name)
+        except (KeyError, PyrtlError):
+            raise PyrtlError('rtl_assert on wire "%s" cannot be checked, as the '
+                             'simulation has no value for it' % w.name)
+        if not value:
+            _rtl_assertion_failed(sim.block, w, getattr(sim, '_cycle', 1) - 1)
+
+
+def _rtl_assertion_failed(block, w, cycle):
+    """ Raise the exception registered for the assertion wire w, which failed in cycle.
+
+    A copy of the registered exception is raised, so that failures do not
+    share state, with the cycle and the name of w in its rtl_assert_cycle and
+    rtl_assert_wire attributes.  It is chained to a PyrtlError reporting them.
+    """
+    registered = block.rtl_assert_dict[w]
+    try:
+        exp = copy.copy(registered)
+    except Exception:  # an exception type that cannot be rebuilt from its args
+        exp = registered
+    exp.rtl_assert_cycle = cycle
+    exp.rtl_assert_wire = w.name
+    six.raise_from(exp, PyrtlError(
+        'rtl_assert on wire "%s" failed in cycle %d' % (w.name, cycle)))
 
 
 def input_list(names, bitwidth=None):
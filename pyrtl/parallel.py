@@ -0,0 +1,321 @@
+"""
+Parallel contains helpers for spreading independent simulation and
+optimization work across a pool of worker processes.
+
+For simulation, the block is elaborated once in the calling process, pickled,
+and shipped to each worker when the pool starts.  Each unit of work (for
+example one stimulus set) then only has to send its own inputs and results
+back and forth, so throughput scales with the number of cores rather than
+being limited to a single Python interpreter.
+
+For optimization, the combinational logic is split into partitions that
+share no logic (see `logic_partitions`), and each worker optimizes a share
+of them.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import collections
+import heapq
+import multiprocessing
+import pickle
+
+from .core import working_block, set_working_block, Block, LogicNet
+from .pyrtlexceptions import PyrtlError
+from .wire import WireVector, Output, Const
+from .simulation import FastSimulation, SimulationTrace
+from .passmanager import PassManager
+
+
+ShardResult = collections.namedtuple('ShardResult', ['trace', 'error'])
+ShardResult.__doc__ = """ The result of simulating a single stimulus set.
+
+    *trace* is the SimulationTrace of all the cycles simulated (up to and
+    including a failing cycle) and *error* is the exception raised while
+    simulating the set, or None if the whole set completed.
+    """
+
+
+# state installed in each worker process by _init_worker
+_worker_state = {}
+
+
+def _init_worker(state):
+    _worker_state.clear()
+    _worker_state.update(pickle.loads(state))
+
+
+def _simulate_stimulus_set(stimulus):
+    """ Run one stimulus set on a fresh simulator inside a worker. """
+    block = _worker_state['block']
+    sim_class = _worker_state['sim_class']
+    with set_working_block(block, no_sanity_check=True):
+        tracer = SimulationTrace(wires_to_track=_worker_state['wires_to_track'], block=block)
+        error = None
+        try:
+            sim = sim_class(
+                tracer=tracer, register_value_map=_worker_state['register_value_map'],
+                memory_value_map=_worker_state['memory_value_map'],
+                default_value=_worker_state['default_value'], block=block)
+            if hasattr(sim, 'run'):
+                sim.run(stimulus)
+            else:
+                for inputs in stimulus:
+                    sim.step(inputs)
+        except Exception as e:
+            error = e
+        values = {name: list(tracer.trace[name]) for name in tracer.trace}
+    return values, error
+
+
+def _name_keys(stimulus):
+    """ Convert the WireVector keys of a stimulus set into names so it can be pickled. """
+    return [{(w.name if isinstance(w, WireVector) else w): v for w, v in inputs.items()}
+            for inputs in stimulus]
+
+
+def sharded_simulation(stimuli, sim_class=FastSimulation, processes=None, chunksize=1,
+                       wires_to_track=None, register_value_map=None, memory_value_map=None,
+                       default_value=0, block=None):
+    """ Simulate many independent stimulus sets in parallel.
+
+    :param stimuli: a list of stimulus sets, each of which is a list of input
+        mappings (one per cycle, in the form accepted by `step`)
+    :param sim_class: the simulator to instantiate for each stimulus set
+        (Simulation, FastSimulation or CompiledSimulation)
+    :param processes: the number of worker processes (defaults to the number of cores).
+        If 1, the sets are simulated in the calling process.
+    :param chunksize: the number of stimulus sets handed to a worker at a time
+    :param wires_to_track: the wires to trace (defaults to the SimulationTrace default)
+    :param register_value_map: passed to each simulator
+    :param memory_value_map: passed to each simulator
+    :param default_value: passed to each simulator
+    :param block: the block to simulate (defaults to the working block)
+    :return: a list of ShardResult, one per stimulus set and in the same order
+
+    Every stimulus set starts from a freshly constructed simulator, so sets
+    cannot influence each other.  An exception raised while simulating a set
+    (such as one registered with `rtl_assert`) stops only that set and is
+    returned in its ShardResult along with the trace up to the failing cycle. ::
+
+        results = sharded_simulation([[{'a': 1}, {'a': 2}], [{'a': 3}]])
+        for result in results:
+            if result.error is not None:
+                raise result.error
+            result.trace.render_trace()
+    """
+    block = working_block(block)
+    block.sanity_check()
+
+    if wires_to_track is not None and wires_to_track != 'all':
+        wires_to_track = [block.get_wirevector_by_name(w, strict=True)
+                          if not isinstance(w, WireVector) else w for w in wires_to_track]
+    state = {
+        'block': block,
+        'sim_class': sim_class,
+        'wires_to_track': wires_to_track,
+        'register_value_map': register_value_map,
+        'memory_value_map': memory_value_map,
+        'default_value': default_value,
+    }
+    try:
+        state = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise PyrtlError('unable to send the block to worker processes: %s' % str(e))
+
+    work = [_name_keys(stimulus) for stimulus in stimuli]
+    if processes == 1:
+        _init_worker(state)
+        raw_results = [_simulate_stimulus_set(stimulus) for stimulus in work]
+        _worker_state.clear()
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, (state,))
+        try:
+            raw_results = pool.map(_simulate_stimulus_set, work, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    results = []
+    for values, error in raw_results:
+        wires = [block.wirevector_by_name[name] for name in values]
+        trace = SimulationTrace(wires_to_track=wires, block=block)
+        for name, vals in values.items():
+            trace.trace[name].extend(vals)
+        results.append(ShardResult(trace, error))
+    return results
+
+
+# ----------------------------------------------------------------
+# Optimizing partitions of the logic
+
+def logic_partitions(block=None):
+    """ Split the combinational logic of a block into partitions that share no logic.
+
+    :param block: the block to partition (defaults to the working block)
+    :return: a list of sets of nets, largest first
+
+    Two nets are in the same partition when one uses a wire the other
+    drives.  So partitions only meet at registers, memory ports, Inputs
+    and Consts, which are not part of any partition, and each can be
+    optimized on its own.
+    """
+    block = working_block(block)
+    nets = sorted((net for net in block.logic if net.op not in 'rm@'),
+                  key=lambda net: min(w._creation_index for w in net.dests))
+    driver = {}  # map from a wire to the index of the net driving it
+    for i, net in enumerate(nets):
+        for dest in net.dests:
+            driver[dest] = i
+
+    parent = list(range(len(nets)))  # a union-find forest of the nets
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, net in enumerate(nets):
+        for arg in net.args:
+            if arg in driver:
+                parent[find(i)] = find(driver[arg])
+    partitions = collections.OrderedDict()
+    for i, net in enumerate(nets):
+        partitions.setdefault(find(i), set()).add(net)
+    return sorted(partitions.values(), key=len, reverse=True)
+
+
+def _describe_nets(nets, used_outside):
+    """ The (wires, nets) of nets by name, to be rebuilt in a worker.
+
+    Each wire is (name, bitwidth, kind, value), where kind is 'const', 'input'
+    for wires driven outside of nets, 'output' for those used outside of
+    them, or 'wire'.
+    """
+    driven = set(dest for net in nets for dest in net.dests)
+    wires = collections.OrderedDict()
+    for net in nets:
+        for w in net.args + net.dests:
+            if w.name in wires:
+                continue
+            if isinstance(w, Const):
+                kind = 'const'
+            elif w not in driven:
+                kind = 'input'
+            elif isinstance(w, Output) or w in used_outside:
+                kind = 'output'
+            else:
+                kind = 'wire'
+            wires[w.name] = (w.name, w.bitwidth, kind, getattr(w, 'val', None))
+    return (list(wires.values()),
+            [(net.op, net.op_param, tuple(w.name for w in net.args),
+              tuple(w.name for w in net.dests)) for net in nets])
+
+
+def _optimize_nets(description):
+    """ Rebuild the nets of description in a new block, optimize it, and describe the result.
+
+    Returns (changed, wires, nets), with the wires as (name, bitwidth, value)
+    where value is None for all but Consts.
+    """
+    from .passes import _optimization_passes
+    wire_specs, net_specs = description
+    block = Block()
+    wires = {}
+    for name, bitwidth, kind, value in wire_specs:
+        if kind == 'const':
+            wires[name] = Const(value, bitwidth, block=block)
+        else:
+            # inputs are plain wires, so that those optimized away go unreported
+            # (which leaves them undriven, so the block is not sanity checked)
+            wire_class = Output if kind == 'output' else WireVector
+            wires[name] = wire_class(bitwidth, name, block=block)
+    for op, op_param, args, dests in net_specs:
+        block.add_net(LogicNet(op, op_param, tuple(wires[n] for n in args),
+                               tuple(wires[n] for n in dests)))
+
+    pass_manager = PassManager()
+    with set_working_block(block, no_sanity_check=True):
+        pass_manager.run(_optimization_passes(sanity_check=False), block)
+    if not any(stat.changed for stat in pass_manager.stats):
+        return False, None, None
+    result_wires = sorted(block.wirevector_set, key=lambda w: w._creation_index)
+    return (True, [(w.name, w.bitwidth, getattr(w, 'val', None)) for w in result_wires],
+            _describe_nets(block.logic, ())[1])
+
+
+def _stitch(block, nets, description, result):
+    """ Replace nets in block with the optimized nets of result. """
+    _, wire_specs, net_specs = result
+    sent = set(spec[0] for spec in description[0] if spec[2] != 'const')
+    wires = {}
+    for name, bitwidth, value in wire_specs:
+        if name in sent:
+            wires[name] = block.wirevector_by_name[name]
+        elif value is not None:
+            wires[name] = Const(value, bitwidth, block=block)
+        else:  # a wire made by the optimization, named here so names stay unique
+            wires[name] = WireVector(bitwidth, block=block)
+    block.logic.difference_update(nets)
+    for op, op_param, args, dests in net_specs:
+        block.add_net(LogicNet(op, op_param, tuple(wires[n] for n in args),
+                               tuple(wires[n] for n in dests)))
+
+
+def optimize_partitions(block=None, processes=None):
+    """ Optimize the partitions of the logic of a block in parallel.
+
+    :param block: the block to optimize (defaults to the working block)
+    :param processes: the number of worker processes (defaults to the number of cores).
+        If 1, the partitions are optimized in the calling process.
+    :return: whether the block changed
+
+    The partitions of `logic_partitions` are shared out between the workers,
+    largest first, and each share is rebuilt in a worker as a block of its
+    own and optimized with `optimize`.  The results replace the original
+    nets, keeping the names of the wires that survive and giving new names
+    to the wires the optimization made.  Registers and memories are left as
+    they are, and no logic is shared between partitions, so this can do
+    less than optimizing the whole block would: duplicate logic in two
+    partitions is not merged, and logic feeding registers that nothing reads
+    is kept.  After synthesis all the logic reading the bits of an Input or
+    register is in one partition, so only independent datapaths split well.
+    This is what ``optimize(processes=...)`` uses.
+    """
+    from .passes import _remove_unused_wires
+    block = working_block(block)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    partitions = logic_partitions(block)
+    if not partitions:
+        return False
+
+    # share out the partitions, largest first, between a few jobs per process
+    jobs = [(0, i, []) for i in range(min(len(partitions), 4 * processes))]
+    for partition in partitions:
+        size, i, nets = heapq.heappop(jobs)
+        nets.extend(partition)
+        heapq.heappush(jobs, (size + len(partition), i, nets))
+    jobs = [nets for size, i, nets in sorted(jobs, key=lambda job: job[1])]
+
+    used_outside = set(arg for net in block.logic if net.op in 'rm@' for arg in net.args)
+    descriptions = [_describe_nets(nets, used_outside) for nets in jobs]
+    if processes == 1:
+        results = [_optimize_nets(description) for description in descriptions]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_optimize_nets, descriptions, 1)
+        finally:
+            pool.close()
+            pool.join()
+
+    changed = False
+    for nets, description, result in zip(jobs, descriptions, results):
+        if result[0]:
+            _stitch(block, nets, description, result)
+            changed = True
+    if changed:
+        _remove_unused_wires(block)
+    return changed
@@ -6,16 +6,19 @@ ways to change a block.
 
 from __future__ import print_function, unicode_literals
 
+import collections
+import multiprocessing
+import os
+import re
+
 from .core import working_block, set_working_block, debug_mode, LogicNet, PostSynthBlock
-from .helperfuncs import _NetCount
-from .corecircuits import (_basic_mult, _basic_add, _basic_sub, _basic_eq,
-                           _basic_lt, _basic_gt, _basic_select, concat_list,
-                           as_wires)
+from .corecircuits import concat_list, as_wires
 from .memory import MemBlock
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
+from .simulation import Simulation
 from .wire import WireVector, Input, Output, Const, Register
-from .transform import net_transform, _get_new_block_mem_instance, copy_block, replace_wires
-from . import transform  # transform.all_nets loos better than all_nets
+from .transform import net_transform, _get_new_block_mem_instance, copy_block
+from .passmanager import Pass, PassManager, _topological_order
 
 
 # --------------------------------------------------------------------
@@ -25,35 +28,87 @@ from . import transform  # transform.all_nets loos better than all_nets
 #
 
 
-def optimize(update_working_block=True, block=None, skip_sanity_check=False):
+def optimize(update_working_block=True, block=None, skip_sanity_check=False,
+             pass_manager=None, processes=1):
     """
     Return an optimized version of a synthesized hardware block.
 
     :param Boolean update_working_block: Don't copy the block and optimize the
     new block
     :param Block block: the block to optimize (defaults to working block)
+    :param PassManager pass_manager: the pass manager to run the passes with,
+    which records their timing (defaults to a new one)
+    :param int processes: if not 1, the number of worker processes to optimize
+    the independent partitions of the logic in (None for the number of cores),
+    see `parallel.optimize_partitions`
 
     Note:
     optimize works on all hardware designs, both synthesized and non synthesized
+
+    Optimizing in several processes is weaker than optimizing the whole block.
+    Each partition is optimized on its own, so a common subexpression that
+    appears in two partitions is kept twice. Logic that only feeds registers
+    is not removed, even if nothing reads those registers. The result can
+    therefore have more nets than with processes=1. Each share of partitions
+    is also pickled to a worker and back, so this only pays off with several
+    cores and large partitions, and is slower on one core (see
+    benchmarks/partition_benchmarks.py). With processes=None on a single
+    core, the whole block is optimized in this process.
     """
     block = working_block(block)
     if not update_working_block:
         block = copy_block(block)
-
+    if pass_manager is None:
+        pass_manager = PassManager()
+
+    checks = [_sanity_check_pass] if (not skip_sanity_check) or debug_mode else []
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes == 1:
+        passes = checks + _optimization_passes() + checks
+    else:
+        from .parallel import optimize_partitions
+        passes = checks + [
+            Pass(lambda block, pass_manager: optimize_partitions(block, processes),
+                 'optimize_partitions'),
+            # the wires between partitions and registers are outputs of the
+            # partitions, so their wire nets are only removed now
+            _remove_wire_nets_pass,
+        ] + checks
     with set_working_block(block, no_sanity_check=True):
-        if (not skip_sanity_check) or debug_mode:
-            block.sanity_check()
-        _remove_wire_nets(block)
-        constant_propagation(block, True)
-        _remove_unlistened_nets(block)
-        common_subexp_elimination(block)
-        if (not skip_sanity_check) or debug_mode:
-            block.sanity_check()
+        pass_manager.run(passes, block)
     return block
 
 
+def _optimization_passes(sanity_check=True):
+    """ The passes of a serial optimize, between its sanity checks.
+
+    :param sanity_check: if False, the removal of wire nets does not check
+        the block afterwards (for blocks that are only part of a design)
+    """
+    return [
+        _remove_wire_nets_pass if sanity_check else _unchecked_remove_wire_nets_pass,
+        _constant_propagation_pass,
+        _dead_logic_elimination_pass,
+        _common_subexp_elimination_pass,
+    ]
+
+
+def _sanity_check(block, pass_manager):
+    block.sanity_check()
+    return False
+
+
+_sanity_check_pass = Pass(_sanity_check, preserves='all')
+
+
 class _ProducerList(object):
     """  Maps from wire to its immediate producer and finds ultimate producers
+
+    This is a union-find forest where each wire points at the wire producing
+    its value: find_producer walks to the root iteratively (so chains of any
+    length are fine) and compresses the path it took, so walking it again is
+    constant time.
     """
     def __init__(self):
         self.dict = {}  # map from wirevector to its direct producer wirevector
@@ -62,17 +117,24 @@ class _ProducerList(object):
         raise PyrtlError("You usually don't want the immediate producer")
 
     def __setitem__(self, key, item):
+        if self.find_producer(item) is key:
+            raise PyrtlError('loop of wire assignments through "%s"' % key.name)
         self.dict[key] = item
 
     def find_producer(self, item):
-        if item in self.dict:
-            return self.find_producer(self.dict[item])
-        else:
-            return item
+        producers = self.dict
+        root = item
+        while root in producers:
+            root = producers[root]
+        while item is not root:
+            parent = producers[item]
+            producers[item] = root
+            item = parent
+        return root
 
 
-def _remove_wire_nets(block):
-    """ Remove all wire nodes from the block. """
+def _remove_wire_nets(block, sanity_check=True):
+    """ Remove all wire nodes from the block, and then sanity check it. """
 
     wire_src_dict = _ProducerList()
     wire_removal_set = set()  # set of all wirevectors to be removed
@@ -85,13 +147,15 @@ def _remove_wire_nets(block):
             if not isinstance(net.dests[0], Output):
                 wire_removal_set.add(net.dests[0])
 
-    # second full pass to create the new logic without the wire nets
+    # second full pass to create the new logic without the wire nets,
+    # rebuilding only the nets that listened to a removed wire
     new_logic = set()
     for net in block.logic:
         if net.op != 'w' or isinstance(net.dests[0], Output):
             new_args = tuple(wire_src_dict.find_producer(x) for x in net.args)
-            new_net = LogicNet(net.op, net.op_param, new_args, net.dests)
-            new_logic.add(new_net)
+            if any(new is not old for new, old in zip(new_args, net.args)):
+                net = LogicNet(net.op, net.op_param, new_args, net.dests)
+            new_logic.add(net)
 
     # now update the block with the new logic and remove wirevectors
     block.logic = new_logic
@@ -99,7 +163,16 @@ def _remove_wire_nets(block):
         del block.wirevector_by_name[dead_wirevector.name]
         block.wirevector_set.remove(dead_wirevector)
 
-    block.sanity_check()
+    if sanity_check:
+        block.sanity_check()
+    return bool(wire_removal_set)
+
+
+_remove_wire_nets_pass = Pass(lambda block, pass_manager: _remove_wire_nets(block),
+                              'remove_wire_nets')
+_unchecked_remove_wire_nets_pass = Pass(
+    lambda block, pass_manager: _remove_wire_nets(block, sanity_check=False),
+    'remove_wire_nets')
 
 
 def constant_propagation(block, silence_unexpected_net_warnings=False):
@@ -110,13 +183,17 @@ def constant_propagation(block, silence_unexpected_net_warnings=False):
     listened to. This is to be expected. These are to be removed by the
     _remove_unlistened_nets function
     """
-    net_count = _NetCount(block)
-    while net_count.shrinking():
-        _constant_prop_pass(block, silence_unexpected_net_warnings)
+    _constant_prop_pass(block, silence_unexpected_net_warnings)
 
 
-def _constant_prop_pass(block, silence_unexpected_net_warnings=False):
-    """ Does one constant propagation pass """
+def _constant_prop_pass(block, silence_unexpected_net_warnings=False, nets=None):
+    """ Propagates constants through the block until nothing more can be folded.
+
+    The nets are visited from a worklist.  When a net folds into a constant or
+    a wire, only the nets listening to its dest are revisited, and nets whose
+    arguments never change are kept as they are, so a single call reaches the
+    fixed point.
+    """
     valid_net_ops = '~&|^nrwcsm@'
     no_optimization_ops = 'wcsm@'
     one_var_ops = {
@@ -135,38 +212,34 @@ def _constant_prop_pass(block, silence_unexpected_net_warnings=False):
             raise PyrtlError("Unexpected net, {}, has {}".format(net, error_str))
 
     def constant_prop_check(net_checking):
-        def replace_net(new_net):
-            nets_to_remove.add(net_checking)
-            nets_to_add.add(new_net)
-
+        """ Return a wire to replace the net's dest with, a net to replace the net
+        with, or None to keep it. """
         def replace_net_with_const(const_val):
             new_const_wire = Const(bitwidth=1, val=const_val, block=block)
             wire_add_set.add(new_const_wire)
-            replace_net_with_wire(new_const_wire)
+            return replace_net_with_wire(new_const_wire)
 
         def replace_net_with_wire(new_wire):
             if isinstance(net_checking.dests[0], Output):
-                replace_net(LogicNet('w', None, args=(new_wire,),
-                                     dests=net_checking.dests))
+                return LogicNet('w', None, args=(new_wire,), dests=net_checking.dests)
             else:
-                nets_to_remove.add(net_checking)
-                new_wire_src[net_checking.dests[0]] = new_wire
+                return new_wire
 
         if net_checking.op not in valid_net_ops:
             _constant_prop_error(net_checking, "has a net not handled by constant_propagation")
-            return  # skip if we are ignoring unoptimizable ops
+            return None  # skip if we are ignoring unoptimizable ops
 
         num_constants = sum((isinstance(arg, Const) for arg in net_checking.args))
 
-        if num_constants is 0 or net_checking.op in no_optimization_ops:
-            return  # assuming wire nets are already optimized
+        if num_constants == 0 or net_checking.op in no_optimization_ops:
+            return None  # assuming wire nets are already optimized
 
         if (net_checking.op in two_var_ops) and num_constants == 1:
             long_wires = [w for w in net_checking.args + net_checking.dests if len(w) != 1]
             if len(long_wires):
                 _constant_prop_error(net_checking, "has wire(s) {} with bitwidths that are not 1"
                                      .format(long_wires))
-                return  # skip if we are ignoring unoptimizable ops
+                return None  # skip if we are ignoring unoptimizable ops
 
             # special case
             const_wire, other_wire = net_checking.args
@@ -177,12 +250,11 @@ def _constant_prop_pass(block, silence_unexpected_net_warnings=False):
                        for other_val in (0, 1)]
 
             if outputs[0] == outputs[1]:
-                replace_net_with_const(outputs[0])
+                return replace_net_with_const(outputs[0])
             elif outputs[0] == 0:
-                replace_net_with_wire(other_wire)
+                return replace_net_with_wire(other_wire)
             else:
-                replace_net(LogicNet('~', None, args=(other_wire,),
-                                     dests=net_checking.dests))
+                return LogicNet('~', None, args=(other_wire,), dests=net_checking.dests)
 
         else:
             # this optimization is actually compatible with long wires
@@ -191,145 +263,384 @@ def _constant_prop_pass(block, silence_unexpected_net_warnings=False):
                                                       net_checking.args[1].val)
             else:
                 output = one_var_ops[net_checking.op](net_checking.args[0].val)
-            replace_net_with_const(output)
+            return replace_net_with_const(output)
 
-    new_wire_src = _ProducerList()
     wire_add_set = set()
-    nets_to_add = set()
-    nets_to_remove = set()
+    changed = _rewrite_nets(block, lambda net, producer: constant_prop_check(net), nets)
+    for new_wirevector in wire_add_set:
+        block.add_wirevector(new_wirevector)
 
-    for a_net in block.logic:
-        constant_prop_check(a_net)
-    # second full pass to cleanup
+    _remove_unused_wires(block)
+    return changed
 
-    new_logic = set()
-    for net in block.logic.union(nets_to_add) - nets_to_remove:
-        new_args = tuple(new_wire_src.find_producer(x) for x in net.args)
-        new_net = LogicNet(net.op, net.op_param, new_args, net.dests)
-        new_logic.add(new_net)
 
-    block.logic = new_logic
-    for new_wirevector in wire_add_set:
-        block.add_wirevector(new_wirevector)
+_constant_propagation_pass = Pass(
+    lambda block, pass_manager: _constant_prop_pass(
+        block, True, pass_manager.analysis('topological_order')),
+    'constant_propagation', requires=('topological_order',))
+
 
+def word_level_simplification(block=None):
+    """ Folds constants and simplifies identities on nets of any bitwidth.
+
+    :param block: the block to simplify (defaults to the working block)
+
+    Unlike constant_propagation, which only handles single bit logic, this
+    works on blocks before synthesis, so the netlist shrinks before the cost
+    of simulating or synthesizing it is paid.  It
+
+    * folds any net whose arguments are all constants (with the same
+      semantics as Simulation)
+    * simplifies x&0, x&1...1, x|0, x|1...1, x^0, x+0, x-0, x*0, x*1 and
+      x&x, x|x, x^x, x-x, x=x, x<x, x>x
+    * replaces muxes with a constant select (or equal arms) by the arm chosen
+    * selects straight out of the argument of a concat or select instead of
+      the concatenated (or selected) wire, and removes identity selects
+    * replaces a concat of selects from the same wire with a single select
+
+    Registers and memories are kept as they are.
+    """
+    block = working_block(block)
+    _rewrite_nets(block, lambda net, producer: _simplify_word_net(block, net, producer))
     _remove_unused_wires(block)
 
 
+def _simplify_word_net(block, net, producer):
+    """ Return the replacement for net (see _rewrite_nets), or None to keep it. """
+    if net.op in 'rm@':
+        return None
+    dest = net.dests[0]
+    if net.op == 'w':
+        return None if isinstance(dest, Output) else net.args[0]
+
+    def use(wire):
+        # replace the net by wire, zero extended to the width of the dest
+        if len(wire) < len(dest):
+            extension = Const(0, bitwidth=len(dest) - len(wire), block=block)
+            return LogicNet('c', None, (extension, wire), net.dests)
+        elif isinstance(dest, Output):
+            return LogicNet('w', None, (wire,), net.dests)
+        else:
+            return wire
+
+    def use_const(val):
+        return use(Const(val & ((1 << len(dest)) - 1), bitwidth=len(dest), block=block))
+
+    args = net.args
+    if all(isinstance(arg, Const) for arg in args):
+        vals = [arg.val for arg in args]
+        if net.op == 'c':
+            result = 0
+            for arg in args:
+                result = (result << len(arg)) | arg.val
+        elif net.op == 's':
+            result = sum(((vals[0] >> b) & 1) << i for i, b in enumerate(net.op_param))
+        else:
+            result = Simulation.simple_func[net.op](*vals)
+        return use_const(result)
+
+    if net.op in '&|' and args[0] is args[1]:
+        return use(args[0])
+    elif net.op in '^-=<>' and args[0] is args[1]:
+        return use_const(1 if net.op == '=' else 0)
+
+    if net.op in '&|^+-*' and any(isinstance(arg, Const) for arg in args):
+        if isinstance(args[0], Const) and net.op != '-':
+            const, other = args
+        elif isinstance(args[1], Const):
+            other, const = args
+        else:
+            return None  # only the first argument of a subtraction is constant
+        ones = (1 << len(const)) - 1
+        if const.val == 0 and net.op in '|^+-':
+            return use(other)
+        elif const.val == 0 and net.op in '&*':
+            return use_const(0)
+        elif const.val == 1 and net.op == '*':
+            return use(other)
+        elif const.val == ones and net.op == '&':
+            return use(other)
+        elif const.val == ones and net.op == '|':
+            return use_const(ones)
+        return None
+
+    if net.op == 'x':
+        sel, falsecase, truecase = args
+        if isinstance(sel, Const):
+            return use(truecase if sel.val else falsecase)
+        elif falsecase is truecase:
+            return use(falsecase)
+        return None
+
+    if net.op == 's':
+        source = args[0]
+        if tuple(net.op_param) == tuple(range(len(source))):
+            return use(source)
+        source_net = producer(source)
+        if source_net is None:
+            return None
+        if source_net.op == 's':
+            bits = tuple(source_net.op_param[b] for b in net.op_param)
+            return LogicNet('s', bits, (source_net.args[0],), net.dests)
+        if source_net.op == 'c':
+            # the bit ranges of the concatenated wires, least significant first
+            spans, low = [], 0
+            for arg in reversed(source_net.args):
+                spans.append((low, low + len(arg), arg))
+                low += len(arg)
+            for low, high, arg in spans:
+                if all(low <= b < high for b in net.op_param):
+                    bits = tuple(b - low for b in net.op_param)
+                    return LogicNet('s', bits, (arg,), net.dests)
+        return None
+
+    if net.op == 'c':
+        if len(args) == 1:
+            return use(args[0])
+        arg_nets = [producer(arg) for arg in args]
+        if all(n is not None and n.op == 's' for n in arg_nets):
+            source = arg_nets[0].args[0]
+            if all(n.args[0] is source for n in arg_nets):
+                bits = tuple(b for n in reversed(arg_nets) for b in n.op_param)
+                return LogicNet('s', bits, (source,), net.dests)
+        return None
+
+    return None
+
+
+def _rewrite_nets(block, rewrite, nets=None):
+    """ Rewrite the nets of the block from a worklist until nothing changes.
+
+    :param rewrite: called as rewrite(net, producer) for each net, where
+        producer(wire) returns the net currently driving wire (or None).  It
+        returns None to keep the net, a LogicNet with the same dests to replace
+        it, or a wire to replace the net's dest with everywhere (removing the net).
+    :param nets: the nets of the block in topological order, if already known
+    :return: True if any net was rewritten
+
+    When a net changes, only it and the nets listening to its dest are
+    revisited, and a net is only rebuilt when one of its arguments was replaced.
+    """
+    new_wire_src = _ProducerList()
+    # visiting in topological order means a net's args are usually final by
+    # the time it is checked, which keeps the worklist short
+    nets = list(nets if nets is not None else _topological_order(block, None))
+    changed = False
+    consumers = {}  # map from wirevector to the indices of the nets listening to it
+    drivers = {}  # map from wirevector to the index of the net driving it
+    for i, net in enumerate(nets):
+        for arg in net.args:
+            consumers.setdefault(arg, set()).add(i)
+        for dest in net.dests:
+            drivers[dest] = i
+
+    def current(i):
+        net = nets[i]
+        new_args = tuple(new_wire_src.find_producer(x) for x in net.args)
+        if any(new is not old for new, old in zip(new_args, net.args)):
+            net = nets[i] = LogicNet(net.op, net.op_param, new_args, net.dests)
+        return net
+
+    def producer(wire):
+        i = drivers.get(new_wire_src.find_producer(wire))
+        return None if i is None else current(i)
+
+    worklist = collections.deque(range(len(nets)))
+    queued = [True] * len(nets)
+
+    def enqueue(indices):
+        for j in indices:
+            if not queued[j]:
+                queued[j] = True
+                worklist.append(j)
+
+    while worklist:
+        i = worklist.popleft()
+        queued[i] = False
+        if nets[i] is None:
+            continue  # already removed
+        net = current(i)
+
+        replacement = rewrite(net, producer)
+        changed = changed or replacement is not None
+        if isinstance(replacement, LogicNet):
+            nets[i] = replacement
+            for arg in replacement.args:
+                consumers.setdefault(arg, set()).add(i)
+            enqueue([i])
+            enqueue(consumers.get(net.dests[0], ()) if net.dests else ())
+        elif replacement is not None:
+            # the dest is now produced by replacement, so revisit its listeners
+            nets[i] = None
+            dest = net.dests[0]
+            del drivers[dest]
+            new_wire_src[dest] = replacement
+            listeners = consumers.pop(dest, ())
+            consumers.setdefault(replacement, set()).update(listeners)
+            enqueue(listeners)
+
+    block.logic = set(net for net in nets if net is not None)
+    return changed
+
+
 def common_subexp_elimination(block=None, abs_thresh=1, percent_thresh=0):
     """
     Common Subexpression Elimination for PyRTL blocks
 
     :param block: the block to run the subexpression elimination on
-    :param abs_thresh: absolute threshold for stopping optimization
-    :param percent_thresh: percent threshold for stopping optimization
+    :param abs_thresh: no longer used (a single call now removes every common
+        subexpression), kept for compatibility
+    :param percent_thresh: no longer used, kept for compatibility
+
+    Nets computing the same op on the same arguments are merged, keeping the
+    first one visited.  The nets are hashed from a worklist in topological
+    order; when a net is merged, only the nets listening to the removed wire
+    are rehashed, so one call reaches the fixed point.  The arguments of
+    commutative ops are put in a canonical order by wire creation, so the
+    result is the same from run to run.
     """
-    block = working_block(block)
-    net_count = _NetCount(block)
+    _common_subexp_elimination(working_block(block))
 
-    while net_count.shrinking(block, percent_thresh, abs_thresh):
-        net_table = _find_common_subexps(block)
-        _replace_subexps(block, net_table)
 
+def _common_subexp_elimination(block, nets=None):
+    net_table = {}  # map from the key of a net to the net kept for it
+    merged_wires = []
 
-ops_where_arg_order_matters = 'm@xc<>-'
+    def eliminate(net, producer):
+        if not _has_normal_dest_wire(net):
+            return None
+        key = _net_key(net)
+        kept = net_table.get(key)
+        if kept is not None and kept is not net and producer(kept.dests[0]) is kept:
+            merged_wires.append(net.dests[0])
+            return kept.dests[0]
+        net_table[key] = net
+        return None
 
+    _rewrite_nets(block, eliminate, nets)
+    for wire in merged_wires:
+        block.remove_wirevector(wire)
+    return bool(merged_wires)
 
-def _find_common_subexps(block):
-    net_table = {}  # {net (without dest) : [net, ...]
-    t = tuple()  # just a placeholder
-    const_dict = {}
-    for net in block.logic:
-        if net.op in ops_where_arg_order_matters:
-            new_args = tuple(_const_to_int(w, const_dict) for w in net.args)
-        else:
-            new_args = tuple(sorted((_const_to_int(w, const_dict) for w in net.args), key=hash))
-        net_sub = LogicNet(net[0], net[1], new_args, t)  # don't care about dests
-        if net_sub in net_table:
-            net_table[net_sub].append(net)
-        else:
-            net_table[net_sub] = [net]
-    return net_table
 
+_common_subexp_elimination_pass = Pass(
+    lambda block, pass_manager: _common_subexp_elimination(
+        block, pass_manager.analysis('topological_order')),
+    'common_subexp_elimination', requires=('topological_order',))
 
-def _const_to_int(wire, const_dict):
-    if isinstance(wire, Const):
-        # a very bad hack to make sure two consts will compare
-        # correctly with an 'is'
-        bitwidth = wire.bitwidth
-        val = wire.val
-        if bitwidth not in const_dict:
-            const_dict[bitwidth] = {val: (bitwidth, val)}
-        else:
-            if val not in const_dict[bitwidth]:
-                const_dict[bitwidth][val] = (bitwidth, val)
-        return const_dict[bitwidth][val]
 
-    return wire
+ops_where_arg_order_matters = 'm@xc<>-'
 
 
-def _replace_subexps(block, net_table):
-    wire_map = {}
-    unnecessary_nets = []
-    for nets in net_table.values():
-        _process_nets_to_discard(nets, wire_map, unnecessary_nets)
+def _net_key(net):
+    """ A hashable key equal for nets computing the same value. """
+    args = tuple(_arg_key(w) for w in net.args)
+    if net.op not in ops_where_arg_order_matters:
+        args = tuple(sorted(args))
+    return net.op, net.op_param, args
 
-    block.logic.difference_update(unnecessary_nets)
-    replace_wires(wire_map, block)
+
+def _arg_key(wire):
+    # consts compare by value, other wires by identity (in creation order)
+    if isinstance(wire, Const):
+        return 0, wire.bitwidth, wire.val
+    return 1, wire._creation_index, 0
 
 
 def _has_normal_dest_wire(net):
-    return not isinstance(net.dests[0], (Register, Output))
+    return len(net.dests) == 1 and not isinstance(net.dests[0], (Register, Output))
 
 
-def _process_nets_to_discard(nets, wire_map, unnecessary_nets):
-    if len(nets) == 1:
-        return  # also deals with nets with no dest wires
-    nets_to_consider = list(filter(_has_normal_dest_wire, nets))
+def dead_logic_elimination(block=None):
+    """ Removes the logic that no Output, memory write or rtl_assert depends on.
 
-    if len(nets_to_consider) > 1:  # needed to handle cases with only special wires
-        net_to_keep = nets_to_consider[0]
-        nets_to_discard = nets_to_consider[1:]
-        dest_w = net_to_keep.dests[0]
-        for net in nets_to_discard:
-            old_dst = net.dests[0]
-            wire_map[old_dst] = dest_w
-            unnecessary_nets.append(net)
+    :param block: the block to clean up (defaults to the working block)
+    :return: a dictionary from the call site that created the removed logic
+        (as "file:line in function") to the list of nets removed
 
+    The call sites are only known for wires created in debug mode (see
+    set_debug_mode); the nets of any other wires are reported under 'unknown'.
+    The call site is the innermost frame outside of the core of PyRTL, so
+    logic built by pyrtl.rtllib is attributed to the rtllib function. ::
 
-def _remove_unlistened_nets(block):
-    """ Removes all nets that are not connected to an output wirevector
+        pyrtl.set_debug_mode()
+        ...  # build the design
+        removed = pyrtl.dead_logic_elimination()
+        for site, nets in sorted(removed.items(), key=lambda item: -len(item[1])):
+            print(len(nets), site)
     """
+    block = working_block(block)
+    return _remove_unlistened_nets(block)
+
+
+def _remove_unlistened_nets(block, wire_src_dict=None):
+    """ Removes all nets that are not connected to an output wirevector
+
+    Walks backwards once from the nets driving the Outputs (including the
+    rtl_assert wires) and the memory write ports, so it takes time linear in
+    the size of the block.  Returns the removed nets grouped by call site, as
+    described in dead_logic_elimination.
 
+    :param wire_src_dict: the map from wire to the net driving it, if already known
+    """
+    if wire_src_dict is None:
+        wire_src_dict, _ = block.net_connections()
+    to_visit = [net for net in block.logic
+                if net.op == '@' or any(isinstance(dest, Output) or dest in block.rtl_assert_dict
+                                        for dest in net.dests)]
     listened_nets = set()
     listened_wires = set()
-    prev_listened_net_count = 0
-
-    def add_to_listened(net):
+    while to_visit:
+        net = to_visit.pop()
+        if net in listened_nets:
+            continue
         listened_nets.add(net)
-        listened_wires.update(net.args)
+        listened_wires.update(net.dests)
+        for arg in net.args:
+            if arg not in listened_wires:
+                listened_wires.add(arg)
+                if arg in wire_src_dict:
+                    to_visit.append(wire_src_dict[arg])
+
+    removed = {}
+    for net in block.logic - listened_nets:
+        site = _call_site(net.dests[0]) if net.dests else 'unknown'
+        removed.setdefault(site, []).append(net)
 
-    for a_net in block.logic:
-        if a_net.op == '@':
-            add_to_listened(a_net)
-        elif any(isinstance(destW, Output) for destW in a_net.dests):
-            add_to_listened(a_net)
+    block.logic = listened_nets
+    _remove_unused_wires(block, valid_wires=listened_wires)
+    return removed
 
-    while len(listened_nets) > prev_listened_net_count:
-        prev_listened_net_count = len(listened_nets)
 
-        for net in block.logic - listened_nets:
-            if any((destWire in listened_wires) for destWire in net.dests):
-                add_to_listened(net)
+_dead_logic_elimination_pass = Pass(
+    lambda block, pass_manager: bool(_remove_unlistened_nets(
+        block, pass_manager.analysis('connectivity')[0])),
+    'dead_logic_elimination', requires=('connectivity',))
 
-    block.logic = listened_nets
-    _remove_unused_wires(block)
+
+_call_site_pattern = re.compile(r'File "(.*)", line (\d+), in (\S+)')
+
+
+def _call_site(wire):
+    """ The innermost frame that created wire outside of the core of PyRTL. """
+    pyrtl_dir = os.path.dirname(os.path.abspath(__file__))
+    for frame in reversed(getattr(wire, 'init_call_stack', None) or ()):
+        match = _call_site_pattern.search(frame)
+        if match and os.path.dirname(os.path.abspath(match.group(1))) != pyrtl_dir:
+            return '%s:%s in %s' % match.groups()
+    return 'unknown'
 
 
-def _remove_unused_wires(block, keep_inputs=True):
-    """ Removes all unconnected wires from a block"""
-    valid_wires = set()
-    for logic_net in block.logic:
-        valid_wires.update(logic_net.args, logic_net.dests)
+def _remove_unused_wires(block, keep_inputs=True, valid_wires=None):
+    """ Removes all unconnected wires from a block
+
+    :param valid_wires: the set of wires used by the logic of the block, if
+        already known (otherwise it is found from block.logic)
+    """
+    if valid_wires is None:
+        valid_wires = set()
+        for logic_net in block.logic:
+            valid_wires.update(logic_net.args, logic_net.dests)
 
     wire_removal_set = block.wirevector_set.difference(valid_wires)
     for removed_wire in wire_removal_set:
@@ -345,6 +656,279 @@ def _remove_unused_wires(block, keep_inputs=True):
 
     block.wirevector_set = valid_wires
 
+
+def value_ranges(block=None, register_value_map=None):
+    """ Find the range of values every wire of a block can take.
+
+    :param block: the block to analyze (defaults to the working block)
+    :param register_value_map: a map from Register to its initial value, as
+        given to the simulation (registers not in it start at 0)
+    :return: a dictionary from each wire driven by the logic of the block to a
+        (low, high) pair bounding its value
+
+    The ranges start from the constants and the full range of the Inputs and
+    are propagated through the logic; a wire whose range has a high value of
+    fewer bits than its bitwidth has known zero upper bits, and one whose low
+    and high values are the same is a known constant.  The ranges of the
+    registers are grown until they cover every value their next state can
+    take, so logic feeding back through registers is handled.  Memory reads
+    can return any value.
+    """
+    block = working_block(block)
+    return _value_ranges(block, _topological_order(block, None), register_value_map)
+
+
+def _ones(bitwidth):
+    return (1 << bitwidth) - 1
+
+
+def _value_ranges(block, nets, register_value_map=None):
+    """ The value_ranges of a block, with its nets in topological order. """
+    ranges = {}
+
+    def get(wire):
+        if wire in ranges:
+            return ranges[wire]
+        elif isinstance(wire, Const):
+            return wire.val, wire.val
+        return 0, wire.bitmask
+
+    register_nets = [net for net in nets if net.op == 'r']
+    for net in register_nets:
+        reg = net.dests[0]
+        val = (register_value_map or {}).get(reg, 0)
+        ranges[reg] = val, val
+    logic = [net for net in nets if net.op not in 'r@']
+
+    # after a few rounds, grow the registers still changing to the next
+    # power of two, so that counters converge in a round per bit
+    rounds = 0
+    while True:
+        for net in logic:
+            ranges[net.dests[0]] = _net_range(net, get)
+        changed = False
+        for net in register_nets:
+            reg = net.dests[0]
+            old_low, old_high = ranges[reg]
+            low, high = get(net.args[0])
+            if high > reg.bitmask:
+                low, high = 0, reg.bitmask
+            low, high = min(low, old_low), max(high, old_high)
+            if (low, high) != (old_low, old_high):
+                if rounds >= 8:
+                    low, high = 0, _ones(high.bit_length())
+                ranges[reg] = low, high
+                changed = True
+        if not changed:
+            return ranges
+        rounds += 1
+
+
+def _net_range(net, get):
+    """ The (low, high) range of the dest of net, given the ranges of its args. """
+    op, dest = net.op, net.dests[0]
+    args = [get(arg) for arg in net.args]
+    if op == 'm':
+        return 0, dest.bitmask
+    if all(low == high for low, high in args):
+        vals = [low for low, high in args]
+        if op == 'c':
+            val = 0
+            for arg, arg_val in zip(net.args, vals):
+                val = (val << len(arg)) | arg_val
+        elif op == 's':
+            val = sum(((vals[0] >> b) & 1) << i for i, b in enumerate(net.op_param))
+        else:
+            val = Simulation.simple_func[op](*vals)
+        val &= dest.bitmask
+        return val, val
+
+    if op == 'w':
+        low, high = args[0]
+    elif op in '~n':
+        arg_mask = net.args[0].bitmask
+        if op == 'n':
+            low, high = arg_mask - min(args[0][1], args[1][1]), arg_mask
+        else:
+            low, high = arg_mask - args[0][1], arg_mask - args[0][0]
+    elif op == '&':
+        low, high = 0, min(args[0][1], args[1][1])
+    elif op in '|^':
+        (a_low, a_high), (b_low, b_high) = args
+        ones = _ones(max(a_high.bit_length(), b_high.bit_length()))
+        if op == '|':
+            low, high = max(a_low, b_low), min(a_high + b_high, ones)
+        else:
+            low, high = 0, ones
+    elif op == '+':
+        low, high = args[0][0] + args[1][0], args[0][1] + args[1][1]
+    elif op == '-':
+        (a_low, a_high), (b_low, b_high) = args
+        if a_low >= b_high:
+            low, high = a_low - b_high, a_high - b_low
+        else:  # the difference can wrap around
+            low, high = 0, dest.bitmask
+    elif op == '*':
+        low, high = args[0][0] * args[1][0], args[0][1] * args[1][1]
+    elif op in '<>=':
+        (a_low, a_high), (b_low, b_high) = args if op != '>' else reversed(args)
+        if op == '=':
+            low, high = 0, int(not (a_high < b_low or b_high < a_low))
+        elif a_high < b_low:
+            low, high = 1, 1
+        elif a_low >= b_high:
+            low, high = 0, 0
+        else:
+            low, high = 0, 1
+    elif op == 'x':
+        sel, falsecase, truecase = args
+        if sel[1] == 0:
+            low, high = falsecase
+        elif sel[0] == 1:
+            low, high = truecase
+        else:
+            low, high = min(falsecase[0], truecase[0]), max(falsecase[1], truecase[1])
+    elif op == 'c':
+        low = high = 0
+        for arg, (arg_low, arg_high) in zip(net.args, args):
+            low, high = (low << len(arg)) | arg_low, (high << len(arg)) | arg_high
+    elif op == 's':
+        arg_low, arg_high = args[0]
+        start, bits = net.op_param[0], len(net.op_param)
+        if (tuple(net.op_param) == tuple(range(start, start + bits))
+                and arg_high >> (start + bits) == 0):
+            low, high = arg_low >> start, arg_high >> start
+        else:
+            known_zero = arg_high.bit_length()
+            low, high = 0, sum(1 << i for i, b in enumerate(net.op_param) if b < known_zero)
+    else:
+        raise PyrtlError('op "%s" not supported in value_ranges' % op)
+
+    if high > dest.bitmask:  # the result is truncated to the dest
+        return 0, dest.bitmask
+    return low, high
+
+
+def narrow_bitwidths(block=None, register_value_map=None):
+    """ Narrows the wires and ops of a block to the bits their values can use.
+
+    :param block: the block to narrow (defaults to the working block)
+    :param register_value_map: a map from Register to its initial value, as
+        given to the simulation (registers not in it start at 0)
+    :return: a dictionary from the name of each narrowed wire to its
+        (old bitwidth, new bitwidth), where a new bitwidth of 0 means the wire
+        was replaced by a constant
+
+    Using the ranges of value_ranges, each wire and Register is narrowed to
+    the bits its highest value needs, wires with a known value are replaced by
+    Consts, and each op is rebuilt at the width of its (narrowed) result:
+    bitwise ops, additions, subtractions that cannot wrap around and
+    multiplications only need the low bits of their arguments, and
+    comparisons need only as many bits as their widest argument.  Inputs,
+    Outputs, memories and rtl_assert wires keep their bitwidths, so the
+    design behaves the same in simulation (as long as the registers start
+    from the values given).  The narrowed wires and Registers are replaced by
+    new ones with the same names.  Arguments
+    are matched up with new concats and selects, which
+    word_level_simplification can clean up afterwards. ::
+
+        narrowed = pyrtl.narrow_bitwidths()
+        print(sum(old - new for old, new in narrowed.values()), 'bits saved')
+    """
+    block = working_block(block)
+    nets = _topological_order(block, None)
+    ranges = _value_ranges(block, nets, register_value_map)
+
+    kept = set(block.rtl_assert_dict)
+    kept.update(block.wirevector_subset((Input, Output, Const)))
+    kept.update(net.dests[0] for net in nets if net.op == 'm')
+    replacement, report = {}, {}
+    for wire, (low, high) in ranges.items():
+        bitwidth = max(high.bit_length(), 1)
+        if wire in kept or bitwidth == len(wire) and (low != high or isinstance(wire, Register)):
+            continue
+        block.remove_wirevector(wire)
+        if low == high and not isinstance(wire, Register):
+            replacement[wire] = Const(low, bitwidth, block=block)
+            report[wire.name] = len(wire), 0
+        else:
+            replacement[wire] = wire.__class__(bitwidth, wire.name, block=block)
+            report[wire.name] = len(wire), bitwidth
+
+    logic, fitted = set(), {}
+
+    def fit(wire, bitwidth):
+        # the value of wire, as a wire of the given bitwidth
+        wire = replacement.get(wire, wire)
+        if len(wire) == bitwidth:
+            return wire
+        if (wire, bitwidth) not in fitted:
+            if isinstance(wire, Const):
+                new_wire = Const(wire.val & _ones(bitwidth), bitwidth, block=block)
+            else:
+                new_wire = WireVector(bitwidth, block=block)
+                if len(wire) > bitwidth:
+                    logic.add(LogicNet('s', tuple(range(bitwidth)), (wire,), (new_wire,)))
+                else:
+                    extension = Const(0, bitwidth - len(wire), block=block)
+                    logic.add(LogicNet('c', None, (extension, wire), (new_wire,)))
+            fitted[wire, bitwidth] = new_wire
+        return fitted[wire, bitwidth]
+
+    def width(wire):
+        return len(replacement.get(wire, wire))
+
+    for net in nets:
+        if net.op == '@':
+            logic.add(LogicNet(net.op, net.op_param, tuple(
+                fit(arg, len(arg)) for arg in net.args), net.dests))
+            continue
+        dest = net.dests[0]
+        if isinstance(replacement.get(dest), Const):
+            continue  # the value of dest is known
+        bitwidth = width(dest)
+        if dest in kept:
+            bitwidth = max(ranges[dest][1].bit_length(), 1)
+        if net.op in 'w~&|^nrx':
+            args = [fit(arg, bitwidth) for arg in net.args]
+            if net.op == 'x':
+                args[0] = fit(net.args[0], 1)
+        elif net.op in '+*-':
+            arg_width = max(width(arg) for arg in net.args)
+            if net.op == '-' and bitwidth > arg_width:
+                arg_width = len(net.args[0])  # the difference can wrap around
+            arg_width = min(bitwidth, arg_width)
+            args = [fit(arg, arg_width) for arg in net.args]
+        elif net.op in '<>=':
+            args = [fit(arg, max(width(arg) for arg in net.args)) for arg in net.args]
+        elif net.op == 'c':
+            args, remaining = [], bitwidth
+            for arg in reversed(net.args):
+                if remaining:
+                    args.insert(0, fit(arg, min(len(arg), remaining)))
+                    remaining -= len(args[0])
+        elif net.op == 's':
+            bits = net.op_param[:bitwidth]
+            arg = replacement.get(net.args[0], net.args[0])
+            args = [arg if len(arg) > max(bits) else fit(arg, max(bits) + 1)]
+        else:  # memory reads
+            args = [fit(arg, len(arg)) for arg in net.args]
+
+        new_dest = replacement.get(dest, dest)
+        if len(new_dest) != bitwidth:  # a kept wire with known zero upper bits
+            new_dest = WireVector(bitwidth, block=block)
+            extension = Const(0, len(dest) - bitwidth, block=block)
+            logic.add(LogicNet('c', None, (extension, new_dest), (dest,)))
+        if net.op == 'c' and len(args) == 1:
+            logic.add(LogicNet('w', None, tuple(args), (new_dest,)))
+        elif net.op == 's':
+            logic.add(LogicNet('s', bits, tuple(args), (new_dest,)))
+        else:
+            logic.add(LogicNet(net.op, net.op_param, tuple(args), (new_dest,)))
+    block.logic = logic
+    _remove_unused_wires(block)
+    return report
+
 # --------------------------------------------------------------------
 #    __           ___       ___  __     __
 #   /__` \ / |\ |  |  |__| |__  /__` | /__`
@@ -352,11 +936,13 @@ def _remove_unused_wires(block, keep_inputs=True):
 #
 
 
-def synthesize(update_working_block=True, block=None):
+def synthesize(update_working_block=True, block=None, pass_manager=None):
     """ Lower the design to just single-bit "and", "or", and "not" gates.
 
     :param update_working_block: Boolean specifying if working block update
     :param block: The block you want to synthesize
+    :param pass_manager: the PassManager to run the passes with, which records
+        their timing (defaults to a new one)
     :return: The newly synthesized block (of type PostSynthesisBlock).
 
     Takes as input a block (default to working block) and creates a new
@@ -369,7 +955,8 @@ def synthesize(update_working_block=True, block=None):
     the individual bits and memories.  Memories (read and write ports) which
     require the reassembly and disassembly of the wirevectors immediately
     before and after.  There arethe only two places where 'c' and 's' ops
-    should exist.
+    should exist.  Gates with constant inputs are folded away and identical
+    gates are only made once as the design is lowered.
 
     The block that results from synthesis is actually of type
     "PostSynthesisBlock" which contains a mapping from the original inputs
@@ -380,151 +967,284 @@ def synthesize(update_working_block=True, block=None):
     """
 
     block_pre = working_block(block)
-    block_pre.sanity_check()  # before going further, make sure that pressynth is valid
-    block_in = copy_block(block_pre, update_working_block=False)
-
-    block_out = PostSynthBlock()
-    # resulting block should only have one of a restricted set of net ops
-    block_out.legal_ops = set('~&|^nrwcsm@')
-    wirevector_map = {}  # map from (vector,index) -> new_wire
-
-    with set_working_block(block_out, no_sanity_check=True):
-        # First, replace advanced operators with simpler ones
-        for op, fun in [
-                ('*', _basic_mult),
-                ('+', _basic_add),
-                ('-', _basic_sub),
-                ('x', _basic_select),
-                ('=', _basic_eq),
-                ('<', _basic_lt),
-                ('>', _basic_gt)]:
-            net_transform(_replace_op(op, fun), block_in)
-
-        # Next, create all of the new wires for the new block
-        # from the original wires and store them in the wirevector_map
-        # for reference.
-        for wirevector in block_in.wirevector_subset():
-            for i in range(len(wirevector)):
-                new_name = '_'.join((wirevector.name, 'synth', str(i)))
-                if isinstance(wirevector, Const):
-                    new_val = (wirevector.val >> i) & 0x1
-                    new_wirevector = Const(bitwidth=1, val=new_val)
-                elif isinstance(wirevector, (Input, Output)):
-                    new_wirevector = WireVector(name="tmp_" + new_name, bitwidth=1)
-                else:
-                    new_wirevector = wirevector.__class__(name=new_name, bitwidth=1)
-                wirevector_map[(wirevector, i)] = new_wirevector
-
-        # Now connect up the inputs and outputs to maintain the interface
-        for wirevector in block_in.wirevector_subset(Input):
-            input_vector = Input(name=wirevector.name, bitwidth=len(wirevector))
-            for i in range(len(wirevector)):
-                wirevector_map[(wirevector, i)] <<= input_vector[i]
-        for wirevector in block_in.wirevector_subset(Output):
-            output_vector = Output(name=wirevector.name, bitwidth=len(wirevector))
-            # the "reversed" is needed because most significant bit comes first in concat
-            output_bits = [wirevector_map[(wirevector, i)]
-                           for i in range(len(output_vector))]
-            output_vector <<= concat_list(output_bits)
-
-        # Now that we have all the wires built and mapped, walk all the blocks
-        # and map the logic to the equivalent set of primitives in the system
-        out_mems = block_out.mem_map  # dictionary: PreSynth Map -> PostSynth Map
-        for net in block_in.logic:
-            _decompose(net, wirevector_map, out_mems, block_out)
+    if pass_manager is None:
+        pass_manager = PassManager()
+    block_out = pass_manager.run(_synthesis_passes, block_pre)
 
     if update_working_block:
         set_working_block(block_out, no_sanity_check=True)
     return block_out
 
 
-def _replace_op(op, fun):
-    def _replace_op_inner(net):
-        if net.op != op:
-            return True
-        dest = net.dests[0]
-        dest <<= fun(*net.args)
-        return False
-    return _replace_op_inner
+def _bit_blast(block_in, pass_manager):
+    """ Build the PostSynthBlock of single bit logic equivalent to block_in. """
+    block_out = PostSynthBlock()
+    # resulting block should only have one of a restricted set of net ops
+    block_out.legal_ops = set('~&|^nrwcsm@')
+    with set_working_block(block_out, no_sanity_check=True):
+        _BitBlaster(block_out).blast(block_in, pass_manager.analysis('topological_order'))
+    return block_out
 
 
-def _decompose(net, wv_map, mems, block_out):
-    """ Add the wires and logicnets to block_out and wv_map to decompose net """
+_synthesis_passes = [
+    _sanity_check_pass,  # before going further, make sure that pressynth is valid
+    Pass(_bit_blast, 'bit_blast', requires=('topological_order',)),
+]
 
-    def arg(x, i):
-        # return the mapped wire vector for argument x, wire number i
-        return wv_map[(net.args[x], i)]
 
-    def destlen():
-        # return iterator over length of the destination in bits
-        return range(len(net.dests[0]))
+class _BitBlaster(object):
+    """ Lowers the nets of a block, bit by bit, to single bit nets in block_out.
 
-    def assign_dest(i, v):
-        # assign v to the wiremap for dest[0], wire i
-        wv_map[(net.dests[0], i)] <<= v
+    The bits of each wire are kept as a list, least significant first, of
+    the 1-bit wires computing them in block_out, or of the ints 0 and 1 for
+    constant bits.  So the bits of 'w', 's' and 'c' nets are just those of
+    their arguments, and wires are only made for the bits some gate
+    computes.  Gates with a constant argument are folded, and the gates are
+    structurally hashed so the same gate of the same bits is made only once.
 
-    one_var_ops = {
-        'w': lambda w: w,
-        '~': lambda w: ~w,
-    }
-    c_two_var_ops = {
-        '&': lambda l, r: l & r,
-        '|': lambda l, r: l | r,
-        '^': lambda l, r: l ^ r,
-        'n': lambda l, r: l.nand(r),
-    }
+    The nets are lowered in topological order, so the bits of the arguments
+    of a net are known before it, except in a loop (which may only be a
+    loop at the word level).  A wire used before it is driven gets a
+    placeholder wire for each of its bits, which is driven once it is.
+    """
 
-    if net.op in one_var_ops:
-        for i in destlen():
-            assign_dest(i, one_var_ops[net.op](arg(0, i)))
-    elif net.op in c_two_var_ops:
-        for i in destlen():
-            assign_dest(i, c_two_var_ops[net.op](arg(0, i), arg(1, i)))
-    elif net.op == 's':
-        for i in destlen():
-            selected_bit = arg(0, net.op_param[i])
-            assign_dest(i, selected_bit)
-    elif net.op == 'c':
-        arg_wirelist = []
-        # generate list of wires for vectors being concatenated
-        for arg_vector in net.args:
-            arg_vector_as_list = [wv_map[(arg_vector, i)] for i in range(len(arg_vector))]
-            arg_wirelist = arg_vector_as_list + arg_wirelist
-        for i in destlen():
-            assign_dest(i, arg_wirelist[i])
-    elif net.op == 'r':
-        for i in destlen():
-            args = (arg(0, i),)
-            dests = (wv_map[(net.dests[0], i)],)
-            new_net = LogicNet('r', None, args=args, dests=dests)
-            block_out.add_net(new_net)
-    elif net.op == 'm':
-        arg0list = [arg(0, i) for i in range(len(net.args[0]))]
-        addr = concat_list(arg0list)
-        new_mem = _get_new_block_mem_instance(net.op_param, mems, block_out)[1]
-        data = as_wires(new_mem[addr])
-        for i in destlen():
-            assign_dest(i, data[i])
-    elif net.op == '@':
-        addrlist = [arg(0, i) for i in range(len(net.args[0]))]
-        addr = concat_list(addrlist)
-        datalist = [arg(1, i) for i in range(len(net.args[1]))]
-        data = concat_list(datalist)
-        enable = arg(2, 0)
-        new_mem = _get_new_block_mem_instance(net.op_param, mems, block_out)[1]
-        new_mem[addr] <<= MemBlock.EnabledWrite(data=data, enable=enable)
-    else:
-        raise PyrtlInternalError('Unable to synthesize the following net '
-                                 'due to unimplemented op :\n%s' % str(net))
-    return
+    def __init__(self, block_out):
+        self.block = block_out
+        self.bits = {}  # map from each wire of the block being lowered to its bits
+        self.placeholders = {}  # map from the wires used before being driven to their bits
+        self.gates = {}  # map from (op, creation indices of the args) to the gate's wire
+        self.inverses = {}  # map from a wire to its inverse, both ways
+        self.consts = {}
+
+    def blast(self, block_in, logic):
+        for wire in block_in.wirevector_subset(Const):
+            self.bits[wire] = [(wire.val >> i) & 1 for i in range(len(wire))]
+        for wire in block_in.wirevector_subset(Input):
+            new_input = Input(name=wire.name, bitwidth=len(wire))
+            self.bits[wire] = [new_input[i] for i in range(len(wire))]
+        for net in logic:
+            if net.op == 'r':
+                reg = net.dests[0]
+                self.bits[reg] = [Register(name='_'.join((reg.name, 'synth', str(i))), bitwidth=1)
+                                  for i in range(len(reg))]
+        for net in logic:
+            self._lower(net)
+        for wire in block_in.wirevector_subset(Output):
+            output_vector = Output(name=wire.name, bitwidth=len(wire))
+            output_vector <<= self._wires(self._get(wire))
+
+    def _get(self, wire):
+        bits = self.bits.get(wire)
+        if bits is None:  # used before it is driven, which only happens in a loop
+            bits = [WireVector(bitwidth=1) for _ in range(len(wire))]
+            self.bits[wire] = self.placeholders[wire] = bits
+        return bits
+
+    def _set(self, wire, bits):
+        bits = bits[:len(wire)] + [0] * (len(wire) - len(bits))
+        for placeholder, bit in zip(self.placeholders.pop(wire, ()), bits):
+            self.block.add_net(LogicNet('w', None, args=(self._wire(bit),), dests=(placeholder,)))
+        self.bits[wire] = bits
+
+    def _wire(self, bit):
+        if isinstance(bit, WireVector):
+            return bit
+        if bit not in self.consts:
+            self.consts[bit] = Const(bit, bitwidth=1)
+        return self.consts[bit]
+
+    def _wires(self, bits):
+        return concat_list([self._wire(bit) for bit in bits])
+
+    def _lower(self, net):
+        op = net.op
+        if op == 'r':
+            for reg, bit in zip(self.bits[net.dests[0]], self._get(net.args[0])):
+                self.block.add_net(LogicNet('r', None, args=(self._wire(bit),), dests=(reg,)))
+            return
+        if op == 'm':
+            new_mem = _get_new_block_mem_instance(net.op_param, self.block.mem_map, self.block)[1]
+            data = as_wires(new_mem[self._wires(self._get(net.args[0]))])
+            self._set(net.dests[0], [data[i] for i in range(len(data))])
+            return
+        if op == '@':
+            addr, data, enable = (self._wires(self._get(arg)) for arg in net.args)
+            new_mem = _get_new_block_mem_instance(net.op_param, self.block.mem_map, self.block)[1]
+            new_mem[addr] <<= MemBlock.EnabledWrite(data=data, enable=enable)
+            return
+
+        args = [self._get(arg) for arg in net.args]
+        bitwise_ops = {'&': self._and, '|': self._or, '^': self._xor, 'n': self._nand}
+        if op == 'w':
+            result = args[0]
+        elif op == '~':
+            result = [self._not(a) for a in args[0]]
+        elif op in bitwise_ops:
+            result = [bitwise_ops[op](a, b) for a, b in zip(*args)]
+        elif op == 'x':
+            sel = args[0][0]
+            result = [self._or(self._and(f, self._not(sel)), self._and(t, sel))
+                      for f, t in zip(args[1], args[2])]
+        elif op == 's':
+            result = [args[0][i] for i in net.op_param]
+        elif op == 'c':
+            result = [bit for arg in reversed(args) for bit in arg]
+        elif op == '+':
+            result = self._add(args[0], args[1], 0)
+        elif op == '-':
+            a, b = self._extend(*args)
+            result = self._add(a, [self._not(bit) for bit in b], 1)
+            result[-1] = self._not(result[-1])  # the top bit is the borrow, not the carry
+        elif op == '*':
+            result = self._mult(*args)
+        elif op == '=':
+            a, b = self._extend(*args)
+            result = [self._not(self._reduce(self._or, [self._xor(x, y) for x, y in zip(a, b)]))]
+        elif op == '<':
+            result = [self._lt(*args)]
+        elif op == '>':
+            result = [self._lt(args[1], args[0])]
+        else:
+            raise PyrtlInternalError('Unable to synthesize the following net '
+                                     'due to unimplemented op :\n%s' % str(net))
+        self._set(net.dests[0], result)
+
+    # The gates, each taking and returning bits
+
+    def _gate(self, op, *args):
+        key = (op,) + tuple(arg._creation_index for arg in args)
+        dest = self.gates.get(key)
+        if dest is None:
+            dest = WireVector(bitwidth=1)
+            self.block.add_net(LogicNet(op, None, args=args, dests=(dest,)))
+            self.gates[key] = dest
+        return dest
+
+    def _two_var_gate(self, op, a, b):
+        if a._creation_index > b._creation_index:
+            a, b = b, a
+        return self._gate(op, a, b)
+
+    def _not(self, a):
+        if not isinstance(a, WireVector):
+            return 1 - a
+        if a not in self.inverses:
+            inverse = self._gate('~', a)
+            self.inverses[a], self.inverses[inverse] = inverse, a
+        return self.inverses[a]
+
+    def _and(self, a, b):
+        if not isinstance(a, WireVector):
+            return b if a else 0
+        if not isinstance(b, WireVector):
+            return a if b else 0
+        if a is b:
+            return a
+        if self.inverses.get(a) is b:
+            return 0
+        return self._two_var_gate('&', a, b)
+
+    def _or(self, a, b):
+        if not isinstance(a, WireVector):
+            return 1 if a else b
+        if not isinstance(b, WireVector):
+            return 1 if b else a
+        if a is b:
+            return a
+        if self.inverses.get(a) is b:
+            return 1
+        return self._two_var_gate('|', a, b)
+
+    def _xor(self, a, b):
+        if not isinstance(a, WireVector):
+            return self._not(b) if a else b
+        if not isinstance(b, WireVector):
+            return self._not(a) if b else a
+        if a is b:
+            return 0
+        if self.inverses.get(a) is b:
+            return 1
+        return self._two_var_gate('^', a, b)
+
+    def _nand(self, a, b):
+        if not isinstance(a, WireVector) or not isinstance(b, WireVector) or a is b:
+            return self._not(self._and(a, b))
+        if self.inverses.get(a) is b:
+            return 1
+        return self._two_var_gate('n', a, b)
+
+    # The arithmetic, on lists of bits
+
+    @staticmethod
+    def _extend(a, b):
+        length = max(len(a), len(b))
+        return a + [0] * (length - len(a)), b + [0] * (length - len(b))
+
+    def _reduce(self, gate, bits):
+        while len(bits) > 1:
+            bits = [gate(*bits[i:i + 2]) if i + 1 < len(bits) else bits[i]
+                    for i in range(0, len(bits), 2)]
+        return bits[0]
+
+    def _full_add(self, a, b, carry):
+        partial = self._xor(a, b)
+        return self._xor(partial, carry), self._or(self._and(a, b), self._and(partial, carry))
+
+    def _add(self, a, b, carry):
+        """ The sum of a, b and the carry in, with the carry out as its last bit. """
+        result = []
+        for x, y in zip(*self._extend(a, b)):
+            sum_bit, carry = self._full_add(x, y, carry)
+            result.append(sum_bit)
+        return result + [carry]
+
+    def _lt(self, a, b):
+        lt = 0
+        for x, y in zip(*self._extend(a, b)):
+            lt = self._or(self._and(y, self._not(x)), self._and(lt, self._not(self._xor(x, y))))
+        return lt
+
+    def _mult(self, a, b):
+        """ The product of a and b, with a Wallace tree like _basic_mult. """
+        width = len(a) + len(b)
+        columns = [[] for _ in range(width)]
+        for i, x in enumerate(a):
+            for j, y in enumerate(b):
+                columns[i + j].append(self._and(x, y))
+        columns = [[bit for bit in column if isinstance(bit, WireVector) or bit]
+                   for column in columns]
+        while any(len(column) > 2 for column in columns):
+            deferred = [[] for _ in range(width + 1)]
+            for i, column in enumerate(columns):
+                full_adders = len(column) // 3
+                for k in range(0, 3 * full_adders, 3):
+                    sum_bit, carry = self._full_add(*column[k:k + 3])
+                    deferred[i].append(sum_bit)
+                    deferred[i + 1].append(carry)
+                rest = column[3 * full_adders:]
+                if len(rest) == 2:
+                    deferred[i].append(self._xor(*rest))
+                    deferred[i + 1].append(self._and(*rest))
+                else:
+                    deferred[i].extend(rest)
+            columns = deferred[:width]
+        first = [column[0] if column else 0 for column in columns]
+        second = [column[1] if len(column) > 1 else 0 for column in columns]
+        return self._add(first, second, 0)[:width]
 
 
-@transform.all_nets
-def nand_synth(net):
+def nand_synth(block=None, pass_manager=None):
     """
     Synthesizes an Post-Synthesis block into one consisting of nands and inverters in place
     :param block: The block to synthesize.
+    :param pass_manager: the PassManager to run the pass with (defaults to a new one)
     """
+    if pass_manager is None:
+        pass_manager = PassManager()
+    pass_manager.run(_nand_synth_pass, block)
+
+
+def _nand_synth_net(net):
     if net.op in '~nrwcsm@':
         return True
 
@@ -543,12 +1263,22 @@ def nand_synth(net):
         raise PyrtlError("Op, '{}' is not supported in nand_synth".format(net.op))
 
 
-@transform.all_nets
-def and_inverter_synth(net):
+_nand_synth_pass = Pass(
+    lambda block, pass_manager: net_transform(_nand_synth_net, block), 'nand_synth')
+
+
+def and_inverter_synth(block=None, pass_manager=None):
     """
     Transforms a decomposed block into one consisting of ands and inverters in place
     :param block: The block to synthesize
+    :param pass_manager: the PassManager to run the pass with (defaults to a new one)
     """
+    if pass_manager is None:
+        pass_manager = PassManager()
+    pass_manager.run(_and_inverter_synth_pass, block)
+
+
+def _and_inverter_synth_net(net):
     if net.op in '~&rwcsm@':
         return True
 
@@ -566,3 +1296,8 @@ def and_inverter_synth(net):
         dest <<= ~(arg(0) & arg(1))
     else:
         raise PyrtlError("Op, '{}' is not supported in and_inv_synth".format(net.op))
+
+
+_and_inverter_synth_pass = Pass(
+    lambda block, pass_manager: net_transform(_and_inverter_synth_net, block),
+    'and_inverter_synth')
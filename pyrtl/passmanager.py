@@ -0,0 +1,230 @@
+"""
+Passmanager runs sequences of passes over a block, sharing analyses between them.
+
+Each pass declares the analyses it uses (such as the connectivity of the
+block or a topological order of its nets) and the ones it leaves valid.  An
+analysis is computed the first time a pass asks for it and then cached until
+a pass that changes the block does not preserve it, so a pass that finds
+nothing to do costs no recomputation.  Every pass and analysis is timed and
+the number of nets before and after it is recorded. ::
+
+    pm = pyrtl.PassManager()
+    pyrtl.synthesize(pass_manager=pm)
+    pyrtl.optimize(pass_manager=pm)
+    pm.report()
+"""
+
+from __future__ import print_function, unicode_literals
+
+import collections
+import heapq
+import sys
+import time
+
+import six
+
+from .core import working_block, Block
+from .pyrtlexceptions import PyrtlError
+
+
+PassStats = collections.namedtuple(
+    'PassStats', ['name', 'seconds', 'nets_before', 'nets_after', 'changed'])
+PassStats.__doc__ = """ The measurements of one run of a pass (or analysis).
+
+    *seconds* does not include the analyses the pass asked for, which are
+    recorded separately under "analysis:" followed by their name.
+    """
+
+
+class Pass(object):
+    """ A transformation of a block, with the analyses it uses and preserves. """
+
+    def __init__(self, func, name=None, requires=(), preserves=()):
+        """ Declare a pass.
+
+        :param func: the function doing the work, called as func(block, pass_manager).
+            It returns whether it changed the block (None is taken as True), or
+            a new Block to continue with instead of block.
+        :param name: the name reported in the statistics (defaults to the name of func)
+        :param requires: the names of the analyses the pass uses, which are
+            computed before it runs (it gets them from `PassManager.analysis`)
+        :param preserves: the names of the analyses still valid after the pass
+            changes the block, or 'all' for a pass that never changes it
+        """
+        for analysis in tuple(requires) + (() if preserves == 'all' else tuple(preserves)):
+            if analysis not in PassManager.analyses:
+                raise PyrtlError('unknown analysis "%s"' % analysis)
+        self.func = func
+        self.name = name if name is not None else func.__name__.strip('_')
+        self.requires = tuple(requires)
+        self.preserves = preserves if preserves == 'all' else tuple(preserves)
+
+    def __repr__(self):
+        return 'Pass(%s)' % self.name
+
+
+def _connectivity(block, pass_manager):
+    """ The (wire_src_dict, wire_dst_dict) pair of Block.net_connections. """
+    return block.net_connections()
+
+
+def _topological_order(block, pass_manager):
+    """ The nets of the block in a topological order that is the same from run to run.
+
+    Nets that are ready at the same time come in the order their dests were
+    created.  Nets on combinational loops (which are not legal, but should
+    not crash a pass) come last.
+    """
+    def order_key(net):
+        if net.dests:
+            return 0, min(w._creation_index for w in net.dests)
+        return 1, tuple(w._creation_index for w in net.args)
+
+    logic = sorted(block.logic, key=order_key)
+    drivers = {}
+    for i, net in enumerate(logic):
+        if net.op != 'r':  # the value of a register is ready at the start of the cycle
+            for dest in net.dests:
+                drivers[dest] = i
+    waiting = {}  # map from wire to the nets waiting on it
+    pending = [0] * len(logic)
+    for i, net in enumerate(logic):
+        for arg in net.args:
+            if arg in drivers:
+                pending[i] += 1
+                waiting.setdefault(arg, []).append(i)
+
+    ready = [i for i in range(len(logic)) if not pending[i]]
+    ordered, emitted = [], [False] * len(logic)
+    while ready:
+        i = heapq.heappop(ready)
+        ordered.append(logic[i])
+        emitted[i] = True
+        if logic[i].op != 'r':
+            for dest in logic[i].dests:
+                for j in waiting.get(dest, ()):
+                    pending[j] -= 1
+                    if not pending[j]:
+                        heapq.heappush(ready, j)
+    ordered.extend(net for i, net in enumerate(logic) if not emitted[i])
+    return ordered
+
+
+def _fanout(block, pass_manager):
+    """ A map from each wire to the number of nets listening to it. """
+    wire_dst_dict = pass_manager.analysis('connectivity', block)[1]
+    return {wire: len(nets) for wire, nets in wire_dst_dict.items()}
+
+
+def _timing(block, pass_manager):
+    """ The TimingAnalysis of the block. """
+    from .analysis import TimingAnalysis
+    return TimingAnalysis(block)
+
+
+class PassManager(object):
+    """ Runs passes over blocks, caching the analyses they share and timing them.
+
+    The analyses available to passes are
+
+    * 'connectivity': the (wire_src_dict, wire_dst_dict) of Block.net_connections
+    * 'topological_order': a list of the nets in a deterministic topological order
+    * 'fanout': a map from wire to the number of nets listening to it
+    * 'timing': the TimingAnalysis of the block
+
+    The statistics of every pass run are appended to `stats`.
+    """
+
+    analyses = {
+        'connectivity': _connectivity,
+        'topological_order': _topological_order,
+        'fanout': _fanout,
+        'timing': _timing,
+    }
+
+    def __init__(self):
+        self.stats = []
+        self._block = None
+        self._cache = {}
+
+    def analysis(self, name, block=None):
+        """ Return the named analysis of block, computing it if it is not cached.
+
+        :param name: one of the names in `PassManager.analyses`
+        :param block: the block to analyze (defaults to the block being
+            transformed, or the working block outside of `run`)
+        """
+        if name not in self.analyses:
+            raise PyrtlError('unknown analysis "%s"' % name)
+        block = working_block(block if block is not None else self._block)
+        if block is not self._block:
+            self._block = block
+            self._cache = {}
+        if name not in self._cache:
+            nets = len(block.logic)
+            start, first_nested = time.time(), len(self.stats)
+            self._cache[name] = self.analyses[name](block, self)
+            self.stats.append(PassStats(
+                'analysis:' + name, self._seconds_since(start, first_nested), nets, nets, False))
+        return self._cache[name]
+
+    def _seconds_since(self, start, first_nested):
+        # the time since start, less that of the passes and analyses run in between
+        return time.time() - start - sum(s.seconds for s in self.stats[first_nested:])
+
+    def invalidate(self, preserves=()):
+        """ Drop the cached analyses, except those named in preserves. """
+        if preserves != 'all':
+            self._cache = {k: v for k, v in self._cache.items() if k in preserves}
+
+    def run(self, passes, block=None):
+        """ Run passes in order over block.
+
+        :param passes: a Pass or a list of them
+        :param block: the block to transform (defaults to the working block)
+        :return: the resulting block, which is a new one if a pass returned one
+
+        Analyses are shared between the passes of one call, but are always
+        recomputed for the first pass that needs them, as the block could have
+        been changed in between calls.
+        """
+        if isinstance(passes, Pass):
+            passes = [passes]
+        block = working_block(block)
+        # the block may have been changed since the analyses were cached
+        self._block, self._cache = block, {}
+        for a_pass in passes:
+            for name in a_pass.requires:
+                self.analysis(name, block)
+            self._block = block
+            nets_before = len(block.logic)
+            start, first_nested = time.time(), len(self.stats)
+            result = a_pass.func(block, self)
+            seconds = self._seconds_since(start, first_nested)
+            if isinstance(result, Block):
+                block, changed = result, True
+                self._block, self._cache = block, {}
+            else:
+                changed = result is None or bool(result)
+                if changed:
+                    self.invalidate(a_pass.preserves)
+            self.stats.append(PassStats(
+                a_pass.name, seconds, nets_before, len(block.logic), changed))
+        return block
+
+    def report(self, file=sys.stdout):
+        """ Print the time and nets of each pass run, and the totals per pass. """
+        print('%-32s %10s %10s %10s' % ('pass', 'seconds', 'nets in', 'nets out'), file=file)
+        for s in self.stats:
+            print('%-32s %10.4f %10d %10d%s' % (
+                s.name, s.seconds, s.nets_before, s.nets_after,
+                '' if s.changed or s.name.startswith('analysis:') else '  (no change)'),
+                file=file)
+        totals = collections.OrderedDict()
+        for s in self.stats:
+            totals[s.name] = totals.get(s.name, 0.0) + s.seconds
+        print('total %.4f seconds; slowest: %s' % (
+            sum(totals.values()),
+            ', '.join('%s %.4f' % item for item in
+                      sorted(six.iteritems(totals), key=lambda item: -item[1])[:3])),
+            file=file)
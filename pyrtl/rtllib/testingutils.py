@@ -108,6 +108,34 @@ def sim_and_ret_outws(inwires, invals):
     return sim_trace.trace  # Pulling the value of wires straight from the trace
 
 
+def sim_blocks_on_random_inputs(blocks, cycles=20, seed=0, register_value_map=None):
+    """ Simulates each block on the same random input values, and returns their outputs.
+    Used to check that a transformation of a block kept its behavior.
+
+    :param blocks: a list of blocks with the same Inputs and Outputs (by name)
+    :param int cycles: the number of cycles to simulate
+    :param seed: the seed of the random input values
+    :param register_value_map: a map from register names to their initial
+        values, applied to the register of that name in every block
+    :return: for each block, a dict from each Output name to its list of values
+    """
+    inputs = sorted((w.name, w.bitwidth) for w in blocks[0].wirevector_subset(pyrtl.Input))
+    rng = random.Random(seed)
+    stimulus = [{name: rng.getrandbits(bitwidth) for name, bitwidth in inputs}
+                for _ in range(cycles)]
+    results = []
+    for block in blocks:
+        outputs = block.wirevector_subset(pyrtl.Output)
+        reg_map = {block.get_wirevector_by_name(name): value
+                   for name, value in (register_value_map or {}).items()}
+        sim_trace = pyrtl.SimulationTrace(wires_to_track=outputs, block=block)
+        sim = pyrtl.Simulation(tracer=sim_trace, register_value_map=reg_map, block=block)
+        for step in stimulus:
+            sim.step(step)
+        results.append({w.name: list(sim_trace.trace[w.name]) for w in outputs})
+    return results
+
+
 def sim_multicycle(in_dict, hold_dict, hold_cycles, sim=None):
     # TODO: write param and return descriptions
     """ Simulation of a circuit that takes multiple cycles to complete.
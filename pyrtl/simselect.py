@@ -0,0 +1,278 @@
+"""
+Simselect picks the simulator expected to finish a simulation soonest.
+
+Each backend is modelled as a setup cost (building the simulator, which for
+FastSimulation means generating and compiling Python and for
+CompiledSimulation running the C compiler) plus a cost per cycle, both linear
+in the size of the design.  Until `calibrate` is called the coefficients are
+rough built-in defaults; `calibrate` measures them with a small
+microbenchmark (running the C compiler if there is one) and caches them per
+machine, so every later session uses the measured values.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import json
+import os
+import platform
+import time
+
+from .core import working_block, set_working_block, Block
+from .pyrtlexceptions import PyrtlError
+from .wire import Input, Output, Register, WireVector
+from .simulation import Simulation, FastSimulation, SimulationTrace
+from .compilesim import CompiledSimulation
+
+
+_backends = (Simulation, FastSimulation, CompiledSimulation)
+
+# bump whenever the calibration microbenchmark or the model changes
+_calibration_version = 1
+
+# seconds of CompiledSimulation setup per 64-bit word of memory; the arrays are
+# zero-initialized by the loader, so this is small enough not to calibrate
+_compiled_seconds_per_mem_word = 2e-9
+
+# rough coefficients from a 64-bit Linux desktop, used until calibrate is run
+_default_calibration = {
+    'Simulation': {'setup': (0.0, 2.5e-5), 'cycle': (0.0, 4e-6), 'traced': 1e-6},
+    'FastSimulation': {'setup': (1e-3, 3e-5), 'cycle': (2e-6, 3e-8), 'traced': 5e-7},
+    'CompiledSimulation': {'setup': (0.03, 3e-4), 'cycle': (1.5e-6, 4e-9), 'traced': 5e-7},
+}
+
+_calibration = None
+
+
+def _calibration_file():
+    cache_dir = os.environ.get('PYRTL_CACHE_DIR')
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'pyrtl')
+    return os.path.join(cache_dir, 'simselect.json')
+
+
+def _machine_key():
+    return '%s|%s|%s|%d' % (platform.node(), platform.machine(),
+                            platform.python_version(), _calibration_version)
+
+
+def _limbs(bitwidth):
+    return (bitwidth + 63) // 64
+
+
+def _features(block, tracer):
+    """ Return the numbers the cost model is linear in.
+
+    * nets: the number of nets, which the Python simulators spend roughly
+      constant time on each
+    * limb_ops: the 64-bit word operations done by the compiled simulator
+      (multiplications are quadratic in the number of words)
+    * mem_words: the 64-bit words of memory the compiled simulator allocates
+    * traced: the number of wires recorded each cycle
+    """
+    limb_ops = 0
+    mems = set()
+    for net in block.logic:
+        limbs = max(_limbs(w.bitwidth) for w in net.args + net.dests)
+        limb_ops += limbs * limbs if net.op == '*' else limbs
+        if net.op in 'm@':
+            mems.add(net.op_param[1])
+    mem_words = sum((1 << mem.addrwidth) * _limbs(mem.bitwidth) for mem in mems)
+    traced = 0 if tracer is None else len(tracer.trace)
+    return {'nets': len(block.logic), 'limb_ops': limb_ops, 'mem_words': mem_words,
+            'traced': traced}
+
+
+def _compiler_available():
+    """ True if the C compiler used by CompiledSimulation can be run. """
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        for name in ('gcc', 'gcc.exe'):
+            if os.access(os.path.join(directory, name), os.X_OK):
+                return True
+    return False
+
+
+def _compiled_supports(block, tracer):
+    """ True if CompiledSimulation can simulate block and record everything tracer asks for. """
+    if not _compiler_available():
+        return False
+    machine = platform.machine().lower()
+    if (machine not in ('x86_64', 'amd64', 'arm64', 'aarch64', 'aarch64_be', 'mips64') and
+            any(len(net.args[0]) + len(net.args[1]) > 64 for net in block.logic_subset('*'))):
+        return False  # the wide multiply needs inline assembly
+    if tracer is not None:
+        probed = {net.args[0].name for net in block.logic_subset('w')
+                  if isinstance(net.dests[0], Output)}
+        for name in tracer.trace:
+            wire = block.wirevector_by_name[name]
+            if not isinstance(wire, (Input, Output)) and name not in probed:
+                return False  # CompiledSimulation can only trace the I/O
+    return True
+
+
+def _benchmark_block(size, outputs=4):
+    """ A block of size nets of 32-bit logic, with an accumulating register. """
+    block = Block()
+    with set_working_block(block, no_sanity_check=True):
+        ins = [Input(32, 'in%d' % i) for i in range(4)]
+        acc = Register(32, 'acc')
+        wires = ins + [acc]
+        while len(block.logic) < size:
+            a, b = wires[-1], wires[-(len(block.logic) % 4) - 2]
+            w = WireVector(32)
+            op = len(block.logic) % 3
+            w <<= (a ^ b) if op == 0 else (a & b) if op == 1 else (a + b)[:32]
+            wires.append(w)
+        acc.next <<= wires[-1]
+        for i in range(outputs):
+            o = Output(32, 'out%d' % i)
+            o <<= wires[-1 - i]
+    return block
+
+
+def _measure(sim_class, block, cycles, traced):
+    """ Return (setup seconds, seconds per cycle) of sim_class on block. """
+    with set_working_block(block, no_sanity_check=True):
+        tracer = None
+        if traced:
+            tracer = SimulationTrace(wires_to_track=[
+                w for w in block.wirevector_set if isinstance(w, (Input, Output))])
+        start = time.time()
+        sim = sim_class(tracer=tracer, block=block)
+        setup = time.time() - start
+        sim.bind_inputs()
+        rows = [(i, 3 * i, 5 * i, 7 * i) for i in range(cycles)]
+        start = time.time()
+        sim.run_values(rows)
+        return setup, (time.time() - start) / cycles
+
+
+def _fit(x1, y1, x2, y2):
+    """ The (intercept, slope) of the line through two measurements, kept non-negative. """
+    slope = max((y2 - y1) / float(x2 - x1), 0.0)
+    return max(y1 - slope * x1, 0.0), slope
+
+
+def calibrate(save=True):
+    """ Run the simulator microbenchmark and return the fitted cost model.
+
+    :param save: if True, cache the result for this machine so later
+        sessions use it too
+    :return: a dictionary from backend name to its model coefficients
+
+    The benchmark simulates two sizes of a synthetic design with each backend
+    (running the C compiler if there is one), taking a few seconds.
+    """
+    global _calibration
+    small, large = 100, 400
+    model = {}
+    for sim_class in _backends:
+        if sim_class is CompiledSimulation and not _compiler_available():
+            continue
+        cycles = 2000 if sim_class is CompiledSimulation else 200
+        setup1, cycle1 = _measure(sim_class, _benchmark_block(small), cycles, False)
+        setup2, cycle2 = _measure(sim_class, _benchmark_block(large), cycles, False)
+        _, traced_cycle = _measure(sim_class, _benchmark_block(small, 8), cycles, True)
+        model[sim_class.__name__] = {
+            'setup': list(_fit(small, setup1, large, setup2)),
+            'cycle': list(_fit(small, cycle1, large, cycle2)),
+            # 8 outputs and 4 inputs are traced
+            'traced': max(traced_cycle - cycle1, 0.0) / 12,
+        }
+    _calibration = model
+    if save:
+        filename = _calibration_file()
+        try:
+            with open(filename) as f:
+                saved = json.load(f)
+        except (IOError, OSError, ValueError):
+            saved = {}
+        saved[_machine_key()] = model
+        try:
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'w') as f:
+                json.dump(saved, f, indent=1, sort_keys=True)
+        except (IOError, OSError):
+            pass  # the calibration is simply rerun next time
+    return model
+
+
+def _load_calibration():
+    global _calibration
+    if _calibration is None:
+        try:
+            with open(_calibration_file()) as f:
+                _calibration = json.load(f)[_machine_key()]
+        except (IOError, OSError, ValueError, KeyError):
+            return _default_calibration
+    return _calibration
+
+
+def estimate_simulation_times(expected_cycles, block=None, tracer=None):
+    """ Estimate the seconds each simulator needs to set up and run a simulation.
+
+    :param expected_cycles: the number of cycles that will be simulated
+    :param block: the block to simulate (defaults to the working block)
+    :param tracer: the SimulationTrace that will record the simulation, or None
+    :return: a dictionary from each usable simulator class to (setup, total) seconds
+
+    The estimates assume stimulus given in batches (`run` or `run_values`).
+    CompiledSimulation is left out if there is no C compiler or if the tracer
+    records wires it cannot trace.
+    """
+    block = working_block(block)
+    model = _load_calibration()
+    features = _features(block, tracer)
+    estimates = {}
+    for sim_class in _backends:
+        coefficients = model.get(sim_class.__name__)
+        if coefficients is None:
+            continue
+        if sim_class is CompiledSimulation:
+            if not _compiled_supports(block, tracer):
+                continue
+            size = features['limb_ops']
+        else:
+            size = features['nets']
+        setup = coefficients['setup'][0] + coefficients['setup'][1] * size
+        if sim_class is CompiledSimulation:
+            setup += _compiled_seconds_per_mem_word * features['mem_words']
+        cycle = (coefficients['cycle'][0] + coefficients['cycle'][1] * size +
+                 coefficients['traced'] * features['traced'])
+        estimates[sim_class] = (setup, setup + cycle * expected_cycles)
+    return estimates
+
+
+def simulate(expected_cycles, block=None, tracer=True, **kwargs):
+    """ Create the simulator expected to finish expected_cycles of simulation soonest.
+
+    :param expected_cycles: the number of cycles that will be simulated
+    :param block: the block to simulate (defaults to the working block)
+    :param tracer: the SimulationTrace to record into, True for a new
+        SimulationTrace (the default) or None for no tracing
+    :param kwargs: passed on to the chosen simulator (register_value_map,
+        memory_value_map, default_value)
+    :return: a Simulation, FastSimulation or CompiledSimulation
+
+    The choice is made with `estimate_simulation_times` from the number of
+    nets, wire widths and memory sizes of the block, whether a C compiler is
+    available, and a per machine calibration.  Until `calibrate` has been run
+    on this machine built-in default coefficients are used, so the choice
+    is only approximate; nothing is measured or written by `simulate`. ::
+
+        sim = pyrtl.simulate(expected_cycles=100000, tracer=None)
+        sim.bind_inputs(['a', 'b'])
+        sim.run_values(stimulus)
+    """
+    block = working_block(block)
+    if tracer is True:
+        tracer = SimulationTrace(block=block)
+    for key in kwargs:
+        if key not in ('register_value_map', 'memory_value_map', 'default_value'):
+            raise PyrtlError('simulate got an unexpected argument "%s"' % key)
+    estimates = estimate_simulation_times(expected_cycles, block, tracer)
+    sim_class = min(estimates, key=lambda c: (estimates[c][1], _backends.index(c)))
+    if sim_class is CompiledSimulation:
+        # CompiledSimulation does not accept None for these
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+    return sim_class(tracer=tracer, block=block, **kwargs)
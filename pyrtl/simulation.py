@@ -4,14 +4,26 @@ from __future__ import print_function, unicode_literals
 
 import sys
 import re
+import keyword
 import numbers
 import collections
+import array
+import bisect
+import heapq
+import itertools
+import binascii
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import time
 
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
 from .core import working_block, PostSynthBlock, _PythonSanitizer
 from .wire import Input, Register, Const, Output, WireVector
 from .memory import RomBlock
-from .helperfuncs import check_rtl_assertions, _currently_in_ipython
+from .helperfuncs import check_rtl_assertions, _rtl_assertion_failed, _currently_in_ipython
 from .inputoutput import _VerilogSanitizer
 
 # ----------------------------------------------------------------
@@ -21,7 +33,77 @@ from .inputoutput import _VerilogSanitizer
 #
 
 
-class Simulation(object):
+class _PositionalInputs(object):
+    """ Positional stimulus, shared by Simulation, FastSimulation and CompiledSimulation.
+
+    The inputs are resolved once with `bind_inputs`, after which each cycle is
+    given as a plain sequence of values in that order, avoiding the name lookups
+    and per cycle dictionaries of `step`. ::
+
+        sim.bind_inputs(['a', 'b'])
+        sim.step_values((1, 2))
+        sim.run_values([(1, 2), (3, 4), (5, 6)])
+    """
+
+    _bound_inputs = None
+    _bound_names = ()
+
+    def bind_inputs(self, inputs=None):
+        """ Fix the order of the values passed to step_values and run_values.
+
+        :param inputs: every Input of the block (or its name), in the order their
+          values will be given.  Defaults to all the Inputs sorted by name.
+        :return: the names of the bound inputs, in order
+        """
+        all_inputs = self.block.wirevector_subset(Input)
+        if inputs is None:
+            wires = sorted(all_inputs, key=lambda w: w.name)
+        else:
+            wires = [self.block.get_wirevector_by_name(w, strict=True)
+                     if not isinstance(w, WireVector) else w for w in inputs]
+        names = [w.name for w in wires]
+        input_names = {w.name for w in all_inputs}
+        for name in names:
+            if name not in input_names:
+                raise PyrtlError('cannot bind "%s", which is not an Input of the block' % name)
+        if len(set(names)) != len(names):
+            raise PyrtlError('an Input was bound more than once')
+        missing = input_names.difference(names)
+        if missing:
+            raise PyrtlError('Input "%s" is not bound' % sorted(missing)[0])
+        self._bound_inputs = tuple(wires)
+        self._bound_names = tuple(names)
+        self._bound_masks = tuple(w.bitmask for w in wires)
+        return names
+
+    def _check_values(self, values):
+        """ Raise a PyrtlError unless values fit the bound inputs. """
+        if self._bound_inputs is None:
+            raise PyrtlError('bind_inputs must be called before step_values or run_values')
+        if len(values) != len(self._bound_masks):
+            raise PyrtlError('expected %d input values but got %d'
+                             % (len(self._bound_masks), len(values)))
+        for name, mask, value in zip(self._bound_names, self._bound_masks, values):
+            if not 0 <= value <= mask:
+                raise PyrtlError('Wire {} has value {} which cannot be represented'
+                                 ' using its bitwidth'.format(name, value))
+
+    def step_values(self, values):
+        """ Run one cycle with values for the bound inputs, in order.
+
+        This steps with a dictionary from the bound names to the values;
+        the simulators override it to skip building that dictionary.
+        """
+        self._check_values(values)
+        self.step(dict(zip(self._bound_names, values)))
+
+    def run_values(self, rows):
+        """ Run one cycle per row of rows, each holding values for the bound inputs. """
+        for values in rows:
+            self.step_values(values)
+
+
+class Simulation(_PositionalInputs):
     """A class for simulating blocks of logic step by step.
 
     In addition to the functions methods listed below, it is sometimes
@@ -52,7 +134,7 @@ class Simulation(object):
 
     def __init__(
             self, tracer=True, register_value_map=None, memory_value_map=None,
-            default_value=0, block=None):
+            default_value=0, block=None, activity=False, coverage=False):
         """ Creates a new circuit simulator
 
         :param tracer: an instance of SimulationTrace used to store execution results.
@@ -70,6 +152,11 @@ class Simulation(object):
           use the value stored in the object (default to 0)
         :param block: the hardware block to be traced (which might be of type PostSynthesisBlock).
           defaults to the working block
+        :param activity: if True, count the bit toggles and one bits of every wire
+          each cycle (see `activity`)
+        :param coverage: if True, collect toggle, mux arm and state coverage, with
+          every register of at most 8 bits taken as a state register; a list of
+          registers (or their names) selects the state registers (see `coverage`)
 
         Warning: Simulation initializes some things when called with __init__,
         so changing items in the block for Simulation will likely break
@@ -91,6 +178,8 @@ class Simulation(object):
         if tracer is True:
             tracer = SimulationTrace()
         self.tracer = tracer
+        self._activity_enabled = activity
+        self._coverage_plan = _coverage_plan(block, coverage)
         self._initialize(register_value_map, memory_value_map)
 
     def _initialize(self, register_value_map=None, memory_value_map=None, default_value=None):
@@ -148,6 +237,21 @@ class Simulation(object):
         self.ordered_nets = tuple((i for i in self.block))
         self.reg_update_nets = tuple((self.block.logic_subset('r')))
         self.mem_update_nets = tuple((self.block.logic_subset('@')))
+        self._cycle = 0
+
+        self._act_wires = None
+        if self._activity_enabled:
+            self._act_wires = tuple(w for w in self.block.wirevector_set
+                                    if not isinstance(w, Const))
+            self._act_toggles = [0] * len(self._act_wires)
+            self._act_ones = [0] * len(self._act_wires)
+
+        if self._coverage_plan is not None:
+            toggle_wires, mux_nets, state_regs = self._coverage_plan
+            self._cov_rose = [0] * len(toggle_wires)
+            self._cov_fell = [0] * len(toggle_wires)
+            self._cov_muxes = [[0, 0] for _ in mux_nets]
+            self._cov_states = [[0] * (1 << r.bitwidth) for r in state_regs]
 
     def step(self, provided_inputs):
         """ Take the simulation forward one cycle
@@ -193,7 +297,20 @@ class Simulation(object):
         if input_set != supplied_inputs:
             for i in input_set.difference(supplied_inputs):
                 raise PyrtlError('Input "%s" has no input value specified' % i.name)
+        self._step()
+
+    def step_values(self, values):
+        """ Take the simulation forward one cycle with values for the bound inputs.
 
+        :param values: a sequence with a value for each input bound by `bind_inputs`
+        """
+        self._check_values(values)
+        for wire, value in zip(self._bound_inputs, values):
+            self.value[wire] = value
+        self._step()
+
+    def _step(self):
+        """ Simulate a cycle once the input values are in self.value. """
         self.value.update(self.regvalue)  # apply register updates from previous step
 
         for net in self.ordered_nets:
@@ -207,6 +324,10 @@ class Simulation(object):
         # print self.value # Helpful Debug Print
         if self.tracer is not None:
             self.tracer.add_step(self.value)
+        if self._act_wires is not None:
+            self._count_activity()
+        if self._coverage_plan is not None:
+            self._count_coverage()
 
         # Do all of the reg updates based off of the new values
         for net in self.reg_update_nets:
@@ -215,8 +336,54 @@ class Simulation(object):
 
         # finally, if any of the rtl_assert assertions are failing then we should
         # raise the appropriate exceptions
+        self._cycle += 1
         check_rtl_assertions(self)
 
+    def _count_activity(self):
+        values = [self.value[w] for w in self._act_wires]
+        toggles, ones = self._act_toggles, self._act_ones
+        if self._cycle:
+            for i, (v, p) in enumerate(zip(values, self._act_prev)):
+                toggles[i] += _popcount(v ^ p)
+        for i, v in enumerate(values):
+            ones[i] += _popcount(v)
+        self._act_prev = values
+
+    def _count_coverage(self):
+        toggle_wires, mux_nets, state_regs = self._coverage_plan
+        values = [self.value[w] for w in toggle_wires]
+        if self._cycle:
+            rose, fell = self._cov_rose, self._cov_fell
+            for i, (v, p) in enumerate(zip(values, self._cov_prev)):
+                rose[i] |= v & ~p
+                fell[i] |= p & ~v
+        self._cov_prev = values
+        for hits, net in zip(self._cov_muxes, mux_nets):
+            hits[self.value[net.args[0]]] += 1
+        for hits, reg in zip(self._cov_states, state_regs):
+            hits[self.value[reg]] += 1
+
+    def coverage(self):
+        """ Return the Coverage of the cycles simulated so far.
+
+        The simulator must have been created with coverage enabled.
+        """
+        if self._coverage_plan is None:
+            raise PyrtlError('the simulator was not created with coverage enabled')
+        return _make_coverage(self._coverage_plan, self._cycle, self._cov_rose,
+                              self._cov_fell, self._cov_muxes, self._cov_states)
+
+    def activity(self):
+        """ Return the ActivityTable of the cycles simulated so far.
+
+        The simulator must have been created with activity=True.
+        """
+        if self._act_wires is None:
+            raise PyrtlError('the simulator was not created with activity=True')
+        return ActivityTable(self._cycle, {
+            w.name: WireActivity(w.bitwidth, t, o)
+            for w, t, o in zip(self._act_wires, self._act_toggles, self._act_ones)})
+
     def inspect(self, w):
         """ Get the value of a wirevector in the last simulation cycle.
 
@@ -310,7 +477,7 @@ class Simulation(object):
 #
 
 
-class FastSimulation(object):
+class FastSimulation(_PositionalInputs):
     """A class for running JIT implementations of blocks.
     """
 
@@ -326,7 +493,8 @@ class FastSimulation(object):
 
     def __init__(
             self, register_value_map=None, memory_value_map=None,
-            default_value=0, tracer=True, block=None, code_file=None):
+            default_value=0, tracer=True, block=None, code_file=None, activity=False,
+            coverage=False, cache_dir=None):
         """ Instantiates a Fast Simulation instance.
 
         The interface for FastSimulation and Simulation should be almost identical.
@@ -334,12 +502,25 @@ class FastSimulation(object):
 
         :param code_file: The file in which to store a copy of the generated
         python code. Defaults to no code being stored.
+        :param cache_dir: a directory in which to cache the compiled code, keyed by
+        a hash of the block's structure and of the simulator and tracer settings,
+        so that simulating an unchanged design again skips generating and
+        compiling the code. Defaults to the PYRTL_FASTSIM_CACHE environment
+        variable, or no caching if that is not set. The cache is not used when
+        a code_file is given.
+
+        When activity or coverage is enabled the counting is generated into the
+        simulation code.
 
         Look at Simulation.__init__ for descriptions for the other parameters
 
         This builds the Fast Simulation compiled Python code, so all changes
         to the circuit after calling this function will not be reflected in
-        the simulation
+        the simulation. The seconds spent generating (or loading from the cache)
+        and compiling that code are kept in `codegen_time` and `compile_time`,
+        and `cache_hit` tells whether it came from the cache. The seconds spent
+        in the generated code while stepping are summed in `step_time`, and
+        `cycle_time` is their average per cycle.
         """
 
         block = working_block(block)
@@ -355,6 +536,14 @@ class FastSimulation(object):
         self.mems = {}
         self.regs = {}
         self.internal_names = _PythonSanitizer('_fastsim_tmp_')
+        self.internal_names.extra_checks = self._valid_local
+        self._cycle = 0
+        self._activity_enabled = activity
+        self._coverage_plan = _coverage_plan(block, coverage)
+        self.step_time = 0.0
+        if cache_dir is None:
+            cache_dir = os.environ.get('PYRTL_FASTSIM_CACHE')
+        self.cache_dir = cache_dir
         self._initialize(register_value_map, memory_value_map)
 
     def _initialize(self, register_value_map=None, memory_value_map=None, default_value=None):
@@ -363,9 +552,6 @@ class FastSimulation(object):
         if register_value_map is None:
             register_value_map = {}
 
-        for wire in self.block.wirevector_set:
-            self.internal_names.make_valid_string(wire.name)
-
         # set registers to their values
         reg_set = self.block.wirevector_subset(Register)
         for r in reg_set:
@@ -376,16 +562,94 @@ class FastSimulation(object):
 
         self._initialize_mems(memory_value_map)
 
-        s = self._compiled()
-        if self.code_file is not None:
-            with open(self.code_file, 'w') as file:
-                file.write(s)
-
-        context = {}
-        logic_creator = compile(s, '<string>', 'exec')
+        self._act = None
+        if self._activity_enabled:
+            self._act_names = sorted(w.name for w in self.block.wirevector_set
+                                     if not isinstance(w, Const))
+            self._act = tuple([0] * len(self._act_names) for _ in range(3))
+
+        self._cov = None
+        if self._coverage_plan is not None:
+            toggle_wires, mux_nets, state_regs = self._coverage_plan
+            self._cov = tuple([0] * len(toggle_wires) for _ in range(3)) + (
+                [[0, 0] for _ in mux_nets], [[0] * (1 << r.bitwidth) for r in state_regs])
+
+        start = time.time()
+        cache_file = None
+        if self.cache_dir is not None and self.code_file is None:
+            cache_file = os.path.join(self.cache_dir, self._cache_key() + '.fastsim')
+        logic_creator = self._load_cached(cache_file) if cache_file is not None else None
+        self.cache_hit = logic_creator is not None
+        if not self.cache_hit:
+            for wire in self.block.wirevector_set:
+                self.internal_names.make_valid_string(wire.name)
+            s = self._compiled()
+            if self.code_file is not None:
+                with open(self.code_file, 'w') as file:
+                    file.write(s)
+        self.codegen_time = time.time() - start
+
+        context = {'_act': self._act, '_cov': self._cov, '_pc': _popcount}
+        start = time.time()
+        if not self.cache_hit:
+            logic_creator = compile(s, '<string>', 'exec')
+            if cache_file is not None:
+                self._store_cached(cache_file, logic_creator)
         exec(logic_creator, context)
+        self.compile_time = time.time() - start
         self.sim_func = context['sim_func']
 
+    # bump whenever the generated code changes for the same block
+    _cache_format = 1
+
+    def _cache_key(self):
+        """ A hash of everything the generated code depends on. """
+        def op_param(net):
+            if net.op in 'm@':
+                mem = net.op_param[1]
+                return (self._mem_varname(mem), type(mem).__name__, mem.bitwidth, mem.addrwidth)
+            return net.op_param
+
+        wires = (repr((type(w).__name__, w.name, w.bitwidth, getattr(w, 'val', None)))
+                 for w in self.block.wirevector_set)
+        nets = (repr((net.op, op_param(net), [w.name for w in net.args],
+                      [w.name for w in net.dests])) for net in self.block.logic)
+        config = repr((
+            sys.version, self._cache_format, self.default_value,
+            None if self.tracer is None else sorted(self.tracer.trace),
+            self._activity_enabled,
+            None if self._coverage_plan is None else [r.name for r in self._coverage_plan[2]],
+            [w.name for w in self.block.rtl_assert_dict]))
+        digest = hashlib.sha1()
+        for part in itertools.chain(sorted(wires), sorted(nets), [config]):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\n')
+        return digest.hexdigest()
+
+    def _load_cached(self, cache_file):
+        """ Return the code object cached in cache_file (restoring the names it
+        was generated with), or None if there is no usable cache entry. """
+        try:
+            with open(cache_file, 'rb') as f:
+                code, val_map, internal_index = marshal.load(f)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+        self.internal_names.val_map = dict(val_map)
+        self.internal_names.internal_index = internal_index
+        return code
+
+    def _store_cached(self, cache_file, code):
+        tmp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(tmp_file, 'wb') as f:
+                marshal.dump((code, self.internal_names.val_map,
+                              self.internal_names.internal_index), f)
+            os.rename(tmp_file, cache_file)
+        except (IOError, OSError):
+            pass  # the cache is only an optimization
+
     def _initialize_mems(self, memory_value_map):
         if memory_value_map is not None:
             for (mem, mem_map) in memory_value_map.items():
@@ -417,11 +681,25 @@ class FastSimulation(object):
 
         # building the simulation data
         ins = {self._to_name(wire): value for wire, value in provided_inputs.items()}
+        self._step(ins)
+
+    def step_values(self, values):
+        """ Run the simulation for a cycle with values for the bound inputs.
+
+        :param values: a sequence with a value for each input bound by `bind_inputs`
+        """
+        self._check_values(values)
+        self._step(dict(zip(self._bound_names, values)))
+
+    def _step(self, ins):
+        """ Simulate a cycle given ins, a dictionary from input names to values. """
         ins.update(self.regs)
         ins.update(self.mems)
 
         # propagate through logic
-        self.regs, self.outs, mem_writes = self.sim_func(ins)
+        start = time.time()
+        self.regs, self.outs, mem_writes, failed_assert = self.sim_func(ins)
+        self.step_time += time.time() - start
 
         for mem, addr, value in mem_writes:
             self.mems[mem][addr] = value
@@ -432,8 +710,43 @@ class FastSimulation(object):
         if self.tracer is not None:
             self.tracer.add_fast_step(self)
 
-        # check the rtl assertions
-        check_rtl_assertions(self)
+        # the rtl assertions are checked by sim_func
+        if self._act is not None and self._cycle == 0:
+            self._act[0][:] = [0] * len(self._act_names)  # nothing to toggle from
+        if self._cov is not None and self._cycle == 0:
+            for masks in self._cov[:2]:
+                masks[:] = [0] * len(masks)
+        self._cycle += 1
+        if failed_assert is not None:
+            _rtl_assertion_failed(
+                self.block, self.block.wirevector_by_name[failed_assert], self._cycle - 1)
+
+    @property
+    def cycle_time(self):
+        """ The average seconds the generated code took per cycle so far (0 before any). """
+        return self.step_time / self._cycle if self._cycle else 0.0
+
+    def coverage(self):
+        """ Return the Coverage of the cycles simulated so far.
+
+        The simulator must have been created with coverage enabled.
+        """
+        if self._cov is None:
+            raise PyrtlError('the simulator was not created with coverage enabled')
+        rose, fell, _, muxes, states = self._cov
+        return _make_coverage(self._coverage_plan, self._cycle, rose, fell, muxes, states)
+
+    def activity(self):
+        """ Return the ActivityTable of the cycles simulated so far.
+
+        The simulator must have been created with activity=True.
+        """
+        if self._act is None:
+            raise PyrtlError('the simulator was not created with activity=True')
+        toggles, ones, _ = self._act
+        return ActivityTable(self._cycle, {
+            name: WireActivity(self.block.wirevector_by_name[name].bitwidth, t, o)
+            for name, t, o in zip(self._act_names, toggles, ones)})
 
     def inspect(self, w):
         """ Get the value of a wirevector in the last simulation cycle.
@@ -473,6 +786,14 @@ class FastSimulation(object):
             return name.name
         return name
 
+    # names the generated code uses itself, which must not be taken by a wire
+    _reserved_locals = frozenset(
+        'd regs outs mem_ws failed v ch tg on pv ro fa mx st int _act _cov _pc'.split())
+
+    def _valid_local(self, name):
+        return (not keyword.iskeyword(name) and name not in self._reserved_locals and
+                not name.startswith(('_fastsim_tmp_', 'sim_func', 'fs_mem')))
+
     def _varname(self, val):
         """ Converts WireVectors to internal names """
         return self.internal_names[val.name]
@@ -558,7 +879,7 @@ class FastSimulation(object):
             else:
                 return '(%s %s %d)' % (value, direction, shift_amt)
 
-        def make_split():
+        def make_split(source, net, split_start_bit, split_length, split_res_start_bit):
             if split_start_bit == 0:
                 bit = '(%d & %s)' % ((1 << split_length) - 1, source)
             elif len(net.args[0]) - split_start_bit == split_length:
@@ -589,13 +910,15 @@ class FastSimulation(object):
                     if b != split_start_bit + split_length:
                         if split_start_bit >= 0:
                             # create a wire
-                            expr += make_split() + '|'
+                            expr += make_split(source, net, split_start_bit, split_length,
+                                               split_res_start_bit) + '|'
                         split_length = 1
                         split_start_bit = b
                         split_res_start_bit = i
                     else:
                         split_length += 1
-                expr += make_split()
+                expr += make_split(source, net, split_start_bit, split_length,
+                                   split_res_start_bit)
             elif net.op == 'm':
                 read_addr = self._arg_varname(net.args[0])
                 mem = net.op_param[1]
@@ -630,10 +953,252 @@ class FastSimulation(object):
                     v_wire_name = self._varname(wire)
                     prog.append('    outs["%s"] = %s' % (wire_name, v_wire_name))
 
-        prog.append("    return regs, outs, mem_ws")
+        # count the toggles (against the previous cycle) and the one bits
+        if self._act is not None:
+            prog.append('    tg, on, pv = _act')
+            for i, name in enumerate(self._act_names):
+                wire = self.block.wirevector_by_name[name]
+                if isinstance(wire, Output):
+                    v_wire = 'outs[%s]' % repr(name)
+                else:
+                    v_wire = self._arg_varname(wire)
+                prog.append('    v = {}; tg[{i}] += _pc(v ^ pv[{i}]); on[{i}] += _pc(v); '
+                            'pv[{i}] = v'.format(v_wire, i=i))
+
+        # record the bits that rose and fell, the mux arms taken and the states visited
+        if self._cov is not None:
+            toggle_wires, mux_nets, state_regs = self._coverage_plan
+            prog.append('    ro, fa, pv, mx, st = _cov')
+            for i, wire in enumerate(toggle_wires):
+                if isinstance(wire, Output):
+                    v_wire = 'outs[%s]' % repr(wire.name)
+                else:
+                    v_wire = self._arg_varname(wire)
+                prog.append('    v = {}; ch = v ^ pv[{i}]; ro[{i}] |= ch & v; '
+                            'fa[{i}] |= ch & pv[{i}]; pv[{i}] = v'.format(v_wire, i=i))
+            for k, net in enumerate(mux_nets):
+                prog.append('    mx[%d][%s] += 1' % (k, self._arg_varname(net.args[0])))
+            for k, reg in enumerate(state_regs):
+                prog.append('    st[%d][%s] += 1' % (k, self._arg_varname(reg)))
+
+        # check the rtl assertions, returning the name of the first to fail
+        assert_names = [repr(w.name) for w in self.block.rtl_assert_dict]
+        if assert_names:
+            prog.append('    if not (%s):' % ' and '.join('outs[%s]' % n for n in assert_names))
+            prog.append('        failed = [n for n in (%s,) if not outs[n]][0]'
+                        % ', '.join(assert_names))
+            prog.append('        return regs, outs, mem_ws, failed')
+        prog.append("    return regs, outs, mem_ws, None")
+
         return '\n'.join(prog)
 
 
+try:
+    _popcount = int.bit_count
+except AttributeError:  # before Python 3.10
+    def _popcount(x):
+        return bin(x).count('1')
+
+
+WireActivity = collections.namedtuple('WireActivity', ['bitwidth', 'toggles', 'ones'])
+WireActivity.__doc__ = """ The activity of one wire: its bitwidth, the number of bit
+    toggles between consecutive cycles and the number of bit-cycles spent high. """
+
+
+class ActivityTable(collections.Mapping):
+    """ The toggle and one counts gathered by a simulator, keyed by wire name.
+
+    Each entry is a WireActivity.  The counts are summed over all the bits of
+    the wire: *toggles* counts the bits that changed between consecutive
+    cycles and *ones* counts, cycle by cycle, the bits that were high. ::
+
+        sim = FastSimulation(activity=True)
+        ...
+        table = sim.activity()
+        print(table.cycles, table['count'].toggles, table.toggle_rate('count'))
+    """
+
+    def __init__(self, cycles, counts):
+        self.cycles = cycles
+        self._counts = counts
+
+    @classmethod
+    def from_trace(cls, simtrace):
+        """ Count the activity of every wire recorded in a SimulationTrace.
+
+        The values are walked once, change by change, so a DeltaSimulationTrace
+        or a SavedSimulationTrace is counted without building lists of values.
+        """
+        cycles = len(simtrace)
+        counts = {}
+        for name in simtrace.trace:
+            toggles = ones = 0
+            last_cycle, last = 0, None
+            for cycle, value in _trace_changes(simtrace.trace[name]):
+                if last is not None:
+                    toggles += _popcount(value ^ last)
+                    ones += _popcount(last) * (cycle - last_cycle)
+                last_cycle, last = cycle, value
+            if last is not None:
+                ones += _popcount(last) * (cycles - last_cycle)
+            counts[name] = WireActivity(simtrace._wires[name].bitwidth, toggles, ones)
+        return cls(cycles, counts)
+
+    def __getitem__(self, name):
+        return self._counts[name]
+
+    def __iter__(self):
+        return iter(self._counts)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def toggle_rate(self, name):
+        """ The average number of toggles per bit per cycle of the named wire. """
+        bitwidth, toggles, ones = self._counts[name]
+        if self.cycles < 2:
+            return 0.0
+        return toggles / float(bitwidth * (self.cycles - 1))
+
+    def one_rate(self, name):
+        """ The fraction of bit-cycles for which the named wire was high. """
+        bitwidth, toggles, ones = self._counts[name]
+        if self.cycles < 1:
+            return 0.0
+        return ones / float(bitwidth * self.cycles)
+
+    def print_table(self, file=sys.stdout):
+        """ Print the counts and rates of every wire, busiest first. """
+        names = sorted(self._counts, key=lambda n: (-self.toggle_rate(n), n))
+        width = max([len(n) for n in names] + [4])
+        file.write('{} {:>12} {:>12} {:>8} {:>8}\n'.format(
+            'wire'.ljust(width), 'toggles', 'ones', 'toggle/b', 'high/b'))
+        for name in names:
+            bitwidth, toggles, ones = self._counts[name]
+            file.write('{} {:>12} {:>12} {:>8.4f} {:>8.4f}\n'.format(
+                name.ljust(width), toggles, ones, self.toggle_rate(name), self.one_rate(name)))
+        file.flush()
+
+
+# the widest register whose visited values can be covered
+_MAX_STATE_BITS = 16
+
+
+def _coverage_plan(block, coverage):
+    """ Return the (toggle wires, mux nets, state registers) to cover, or None.
+
+    With coverage True the state registers are those of at most 8 bits,
+    otherwise coverage lists the state registers (or their names).
+    """
+    if coverage is False or coverage is None:
+        return None
+    if coverage is True:
+        state_regs = [r for r in block.wirevector_subset(Register) if r.bitwidth <= 8]
+    else:
+        state_regs = [block.get_wirevector_by_name(r, strict=True)
+                      if not isinstance(r, WireVector) else r for r in coverage]
+        for r in state_regs:
+            if not isinstance(r, Register):
+                raise PyrtlError('coverage state register "%s" is not a Register' % r.name)
+            if r.bitwidth > _MAX_STATE_BITS:
+                raise PyrtlError('coverage state register "%s" is wider than %d bits'
+                                 % (r.name, _MAX_STATE_BITS))
+    toggle_wires = sorted((w for w in block.wirevector_set if not isinstance(w, Const)),
+                          key=lambda w: w.name)
+    mux_nets = sorted(block.logic_subset('x'), key=lambda net: net.dests[0].name)
+    return toggle_wires, mux_nets, sorted(state_regs, key=lambda r: r.name)
+
+
+def _make_coverage(plan, cycles, rose, fell, muxes, states):
+    """ Build a Coverage from the raw counters kept by a simulator for plan. """
+    toggle_wires, mux_nets, state_regs = plan
+    return Coverage(
+        cycles,
+        {w.name: (w.bitwidth, r, f) for w, r, f in zip(toggle_wires, rose, fell)},
+        {net.dests[0].name: tuple(hits) for net, hits in zip(mux_nets, muxes)},
+        {reg.name: {v: n for v, n in enumerate(hits) if n}
+         for reg, hits in zip(state_regs, states)})
+
+
+class Coverage(object):
+    """ Functional coverage gathered by a simulator.
+
+    * *toggles* maps each wire name to (bitwidth, rose, fell), where bit i of
+      rose (fell) is set if bit i of the wire ever went from 0 to 1 (1 to 0)
+    * *muxes* maps the name of the wire driven by each mux to the number of
+      cycles on which the select was 0 and was 1
+    * *states* maps each state register name to {value: cycles at that value}
+
+    Coverage objects from separate runs (or from simulations run in other
+    processes, as they pickle) are combined with `merge` or ``+``. ::
+
+        sim = CompiledSimulation(coverage=True)
+        sim.run(stimulus)
+        total = sim.coverage() + other_coverage
+        total.report()
+    """
+
+    def __init__(self, cycles=0, toggles=None, muxes=None, states=None):
+        self.cycles = cycles
+        self.toggles = {} if toggles is None else toggles
+        self.muxes = {} if muxes is None else muxes
+        self.states = {} if states is None else states
+
+    def merge(self, other):
+        """ Return the coverage of both self and other. """
+        toggles = dict(self.toggles)
+        for name, (bitwidth, rose, fell) in other.toggles.items():
+            if name in toggles:
+                _, r, f = toggles[name]
+                rose, fell = rose | r, fell | f
+            toggles[name] = (bitwidth, rose, fell)
+        muxes = dict(self.muxes)
+        for name, (sel0, sel1) in other.muxes.items():
+            a0, a1 = muxes.get(name, (0, 0))
+            muxes[name] = (a0 + sel0, a1 + sel1)
+        states = {name: dict(hits) for name, hits in self.states.items()}
+        for name, hits in other.states.items():
+            merged = states.setdefault(name, {})
+            for value, count in hits.items():
+                merged[value] = merged.get(value, 0) + count
+        return Coverage(self.cycles + other.cycles, toggles, muxes, states)
+
+    __add__ = merge
+
+    def toggle_coverage(self):
+        """ The fraction of wire bits that both rose and fell. """
+        bits = sum(bitwidth for bitwidth, _, _ in self.toggles.values())
+        covered = sum(_popcount(rose & fell) for _, rose, fell in self.toggles.values())
+        return covered / float(bits) if bits else 1.0
+
+    def mux_coverage(self):
+        """ The fraction of mux arms selected at least once. """
+        arms = 2 * len(self.muxes)
+        taken = sum((sel0 > 0) + (sel1 > 0) for sel0, sel1 in self.muxes.values())
+        return taken / float(arms) if arms else 1.0
+
+    def report(self, file=sys.stdout):
+        """ Print a compact summary listing what was not covered. """
+        file.write('coverage over %d cycles\n' % self.cycles)
+        file.write('toggle: %.1f%% of bits\n' % (100 * self.toggle_coverage()))
+        for name in sorted(self.toggles):
+            bitwidth, rose, fell = self.toggles[name]
+            missing = ~(rose & fell) & ((1 << bitwidth) - 1)
+            if missing:
+                file.write('  %s: bits %s never toggled both ways\n' % (
+                    name, ','.join(str(i) for i in range(bitwidth) if missing >> i & 1)))
+        file.write('mux arms: %.1f%%\n' % (100 * self.mux_coverage()))
+        for name in sorted(self.muxes):
+            for sel, hits in enumerate(self.muxes[name]):
+                if not hits:
+                    file.write('  %s: select %d never taken\n' % (name, sel))
+        for name in sorted(self.states):
+            hits = self.states[name]
+            file.write('state %s: %d values visited: %s\n' % (
+                name, len(hits), ', '.join('%d(%d)' % (v, hits[v]) for v in sorted(hits))))
+        file.flush()
+
+
 # ----------------------------------------------------------------
 #    ___  __        __   ___
 #     |  |__)  /\  /  ` |__
@@ -731,8 +1296,11 @@ def _trace_sort_key(w):
 class TraceStorage(collections.Mapping):
     __slots__ = ('__data',)
 
-    def __init__(self, wvs):
-        self.__data = {wv.name: [] for wv in wvs}
+    def __init__(self, wvs, new_trace_list=None):
+        if new_trace_list is None:
+            self.__data = {wv.name: [] for wv in wvs}
+        else:
+            self.__data = {wv.name: new_trace_list(wv) for wv in wvs}
 
     def __len__(self):
         return len(self.__data)
@@ -754,6 +1322,211 @@ class TraceStorage(collections.Mapping):
         return self.__data[key]
 
 
+def _array_typecode(bits):
+    """ Return the smallest array typecode holding an unsigned value of bits (or None). """
+    for code in 'BHILQ':
+        try:
+            if array.array(code).itemsize * 8 >= bits:
+                return code
+        except ValueError:
+            pass  # 'Q' is not supported by Python 2
+    return None
+
+
+class _CompactTraceList(collections.Sequence):
+    """ Base for the list-like stores used by CompactSimulationTrace.
+
+    Subclasses hold the values of a single wire packed according to its
+    bitwidth and implement append and _get.  Indexing and slicing behave like
+    they do on a list of the values, but slices are returned as lists.
+    """
+    __slots__ = ('_data', '_len')
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._get(i) for i in range(*item.indices(self._len))]
+        if item < 0:
+            item += self._len
+        if not 0 <= item < self._len:
+            raise IndexError('trace index out of range')
+        return self._get(item)
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self._get(i)
+
+    def __eq__(self, other):
+        if not isinstance(other, (collections.Sequence, array.array)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def extend(self, values):
+        for v in values:
+            self.append(v)
+
+
+class _BitTraceList(_CompactTraceList):
+    """ Values of a 1-bit wire, stored eight cycles to a byte. """
+    __slots__ = ()
+
+    def __init__(self):
+        self._data = bytearray()
+        self._len = 0
+
+    def append(self, value):
+        byte, bit = divmod(self._len, 8)
+        if bit == 0:
+            self._data.append(value)
+        elif value:
+            self._data[byte] |= 1 << bit
+        self._len += 1
+
+    def _get(self, i):
+        return (self._data[i >> 3] >> (i & 7)) & 1
+
+
+class _ArrayTraceList(_CompactTraceList):
+    """ Values of a wire narrow enough to fit in a single array element. """
+    __slots__ = ()
+
+    def __init__(self, typecode):
+        self._data = array.array(typecode)
+        self._len = 0
+
+    def append(self, value):
+        self._data.append(value)
+        self._len += 1
+
+    def extend(self, values):
+        self._data.extend(values)
+        self._len = len(self._data)
+
+    def _get(self, i):
+        return self._data[i]
+
+
+class _WideTraceList(_CompactTraceList):
+    """ Values of a wide wire, each stored as a run of machine word limbs. """
+    __slots__ = ('_limbs', '_limb_bits', '_limb_mask')
+
+    def __init__(self, bitwidth, typecode):
+        self._data = array.array(typecode)
+        self._len = 0
+        self._limb_bits = self._data.itemsize * 8
+        self._limb_mask = (1 << self._limb_bits) - 1
+        self._limbs = (bitwidth + self._limb_bits - 1) // self._limb_bits
+
+    def append(self, value):
+        for _ in range(self._limbs):
+            self._data.append(value & self._limb_mask)
+            value >>= self._limb_bits
+        self._len += 1
+
+    def _get(self, i):
+        value = 0
+        start = i * self._limbs
+        for limb in reversed(self._data[start:start + self._limbs]):
+            value = (value << self._limb_bits) | limb
+        return value
+
+
+def _compact_trace_list(bitwidth):
+    """ Return an empty list-like store suited to values of the given bitwidth. """
+    if bitwidth == 1:
+        return _BitTraceList()
+    typecode = _array_typecode(bitwidth)
+    if typecode is not None:
+        return _ArrayTraceList(typecode)
+    return _WideTraceList(bitwidth, _array_typecode(64))
+
+
+class _DeltaTraceList(_CompactTraceList):
+    """ Values of a wire stored only at the cycles where they change.
+
+    The cycles of the changes are kept in ascending order so the value at any
+    cycle is found with a binary search for the last change at or before it.
+    """
+    __slots__ = ('_cycles', '_last')
+
+    def __init__(self, bitwidth):
+        self._cycles = array.array(_array_typecode(64))
+        self._data = _compact_trace_list(bitwidth)
+        self._len = 0
+        self._last = None
+
+    def append(self, value):
+        if self._len == 0 or value != self._last:
+            self._cycles.append(self._len)
+            self._data.append(value)
+            self._last = value
+        self._len += 1
+
+    def _get(self, i):
+        return self._data[bisect.bisect_right(self._cycles, i) - 1]
+
+    def __iter__(self):
+        cycles = self._cycles
+        for n, value in enumerate(self._data):
+            end = cycles[n + 1] if n + 1 < len(cycles) else self._len
+            for _ in range(end - cycles[n]):
+                yield value
+
+    def changes(self):
+        """ Yield (cycle, value) for each cycle at which the value changes. """
+        return zip(self._cycles, self._data)
+
+
+def _trace_changes(values):
+    """ Yield (cycle, value) for each cycle at which the traced values change. """
+    if hasattr(values, 'changes'):
+        for change in values.changes():
+            yield change
+        return
+    last = None
+    for cycle, value in enumerate(values):
+        if cycle == 0 or value != last:
+            yield cycle, value
+            last = value
+
+
+def _merged_changes(traces):
+    """ Yield (cycle, [(trace index, value), ...]) for every cycle at which a trace changes. """
+    def tagged(index, values):
+        return ((cycle, index, value) for cycle, value in _trace_changes(values))
+    merged = heapq.merge(*[tagged(i, values) for i, values in enumerate(traces)])
+    for cycle, changes in itertools.groupby(merged, key=lambda change: change[0]):
+        yield cycle, [(index, value) for _, index, value in changes]
+
+
+def _vcd_header(wires, include_clock):
+    """ Return the VCD text up to and including $dumpvars for [(bitwidth, name), ...]. """
+    lines = ['$timescale 1ns $end', '$scope module logic $end']
+    if include_clock:
+        lines.append('$var wire 1 clk clk $end')
+    lines.extend('$var wire {} {} {} $end'.format(bw, name, name) for bw, name in wires)
+    lines.extend(['$upscope $end', '$enddefinitions $end', '$dumpvars', ''])
+    return '\n'.join(lines)
+
+
+def _vcd_timestamp(timestamp, value_strs, include_clock):
+    """ Return the VCD text for one cycle given the already formatted value changes. """
+    lines = ['#{}'.format(timestamp*10)]
+    lines.extend(value_strs)
+    if include_clock:
+        lines.extend(['b1 clk', '', '#{}'.format(timestamp*10+5), 'b0 clk'])
+    lines.extend(['', ''])
+    return '\n'.join(lines)
+
+
 class SimulationTrace(object):
     """ Storage and presentation of simulation waveforms. """
 
@@ -779,10 +1552,18 @@ class SimulationTrace(object):
         if not len(wires_to_track):
             raise PyrtlError("There needs to be at least one named wire "
                              "for simulation to be useful")
+        self._set_wires_to_track(wires_to_track)
+
+    def _set_wires_to_track(self, wires_to_track):
+        """ Set the wires to trace and create their (empty) storage. """
         self.wires_to_track = wires_to_track
-        self.trace = TraceStorage(wires_to_track)
+        self.trace = TraceStorage(wires_to_track, self._new_trace_list)
         self._wires = {wv.name: wv for wv in wires_to_track}
 
+    def _new_trace_list(self, wire):
+        """ Return the empty list-like object in which the values of wire are stored. """
+        return []
+
     def __len__(self):
         """ Return the current length of the trace in cycles. """
         if len(self.trace) == 0:
@@ -812,6 +1593,12 @@ class SimulationTrace(object):
         for wire_name in self.trace:
             self.trace[wire_name].append(fastsim.context[wire_name])
 
+    def add_steps_named(self, values):
+        """ Add several cycles at once, given a map from wire name to the list of its values. """
+        for wire in values:
+            if wire in self.trace:
+                self.trace[wire].extend(values[wire])
+
     def print_trace(self, file=sys.stdout, base=10, compact=False):
         """
         Prints a list of wires and their current values.
@@ -840,14 +1627,18 @@ class SimulationTrace(object):
 
         file.flush()
 
-    def print_vcd(self, file=sys.stdout, include_clock=False):
+    def print_vcd(self, file=sys.stdout, include_clock=False, only_changes=False):
         """ Print the trace out as a VCD File for use in other tools.
 
         :param file: file to open and output vcd dump to.
         :param include_clock: boolean specifying if the implicit clk should be included.
+        :param only_changes: boolean specifying if values should only be dumped when
+          they change (rather than dumping every wire at every timestamp).
 
         Dumps the current trace to file as a "value change dump" file.  The file parameter
-        defaults to _stdout_ and the include_clock defaults to True.
+        defaults to _stdout_ and the include_clock defaults to True.  Dumping only the
+        changes results in a much smaller file that is read the same way by waveform
+        viewers; for a DeltaSimulationTrace the changes come straight out of storage.
 
         Examples ::
 
@@ -861,41 +1652,33 @@ class SimulationTrace(object):
         for wire in self.wires_to_track:
             self.internal_names.make_valid_string(wire.name)
 
-        def _varname(wireName):
-            """ Converts WireVector names to internal names """
-            return self.internal_names[wireName]
-
-        print(' '.join(['$timescale', '1ns', '$end']), file=file)
-        print(' '.join(['$scope', 'module logic', '$end']), file=file)
-
-        def print_trace_strs(time):
-            for wn in sorted(self.trace, key=_trace_sort_key):
-                print(' '.join([str(bin(self.trace[wn][time]))[1:], _varname(wn)]), file=file)
-
-        # dump variables
-        if include_clock:
-            print(' '.join(['$var', 'wire', '1', 'clk', 'clk', '$end']), file=file)
-        for wn in sorted(self.trace, key=_trace_sort_key):
-            print(' '.join(['$var', 'wire', str(self._wires[wn].bitwidth),
-                            _varname(wn), _varname(wn), '$end']), file=file)
-        print(' '.join(['$upscope', '$end']), file=file)
-        print(' '.join(['$enddefinitions', '$end']), file=file)
-        print(' '.join(['$dumpvars']), file=file)
-        print_trace_strs(0)
-        print(' '.join(['$end']), file=file)
+        names = sorted(self.trace, key=_trace_sort_key)
+        varnames = [self.internal_names[wn] for wn in names]
+        file.write(_vcd_header(
+            [(self._wires[wn].bitwidth, vn) for wn, vn in zip(names, varnames)], include_clock))
+        file.write(''.join(
+            'b{:b} {}\n'.format(self.trace[wn][0], vn) for wn, vn in zip(names, varnames)))
+        file.write('$end\n')
 
         # dump values
         endtime = max([len(self.trace[w]) for w in self.trace])
-        for timestamp in range(endtime):
-            print(''.join(['#', str(timestamp*10)]), file=file)
-            print_trace_strs(timestamp)
+        if only_changes:
+            steps = _merged_changes([self.trace[wn] for wn in names])
+        else:
+            steps = ((t, [(i, self.trace[wn][t]) for i, wn in enumerate(names)])
+                     for t in range(endtime))
+        next_timestamp = 0
+        for timestamp, values in steps:
             if include_clock:
-                print('b1 clk', file=file)
-                print('', file=file)
-                print(''.join(['#', str(timestamp*10+5)]), file=file)
-                print('b0 clk', file=file)
-            print('', file=file)
-        print(''.join(['#', str(endtime*10)]), file=file)
+                for quiet in range(next_timestamp, timestamp):
+                    file.write(_vcd_timestamp(quiet, [], include_clock))
+            file.write(_vcd_timestamp(
+                timestamp, ['b{:b} {}'.format(v, varnames[i]) for i, v in values], include_clock))
+            next_timestamp = timestamp + 1
+        if include_clock:
+            for quiet in range(next_timestamp, endtime):
+                file.write(_vcd_timestamp(quiet, [], include_clock))
+        file.write('#{}\n'.format(endtime*10))
         file.flush()
 
     def render_trace(
@@ -988,3 +1771,602 @@ class SimulationTrace(object):
             print(formatted_trace_line(w, self.trace[w]), file=file)
         if extra_line:
             print(file=file)
+
+
+class CompactSimulationTrace(SimulationTrace):
+    """ A SimulationTrace that packs the values of each wire according to its bitwidth.
+
+    The values of a plain SimulationTrace are Python lists of Python ints,
+    which cost dozens of bytes per cycle even for single bit control signals.
+    A CompactSimulationTrace instead stores 1-bit wires eight cycles to a byte,
+    narrow wires in a typed array with the smallest element that holds them,
+    and wider wires as a run of 64-bit limbs per cycle.  The storage grows in
+    amortized chunks, and `trace[name][i]` as well as slices behave as they do
+    on a SimulationTrace, so printing and rendering work unchanged. ::
+
+        tracer = CompactSimulationTrace()
+        sim = FastSimulation(tracer=tracer)
+    """
+
+    def _new_trace_list(self, wire):
+        return _compact_trace_list(wire.bitwidth)
+
+
+class DeltaSimulationTrace(SimulationTrace):
+    """ A SimulationTrace that only stores the values of a wire when they change.
+
+    Most wires of a design hold their value for many cycles (control signals,
+    configuration registers, idle buses), so recording just the cycle and new
+    value of each change makes long traces far smaller than one entry per
+    cycle.  The trace is read exactly like a SimulationTrace (``trace[name][i]``
+    finds the value with a binary search over the changes) and print_vcd with
+    ``only_changes=True`` emits the stored changes directly. ::
+
+        tracer = DeltaSimulationTrace()
+        sim = FastSimulation(tracer=tracer)
+        ...
+        tracer.print_vcd(open('waves.vcd', 'w'), only_changes=True)
+    """
+
+    def _new_trace_list(self, wire):
+        return _DeltaTraceList(wire.bitwidth)
+
+
+class _LatestValue(object):
+    """ Stand-in for the values of a streamed wire; only the length and latest value are kept. """
+    __slots__ = ('_len', '_last')
+
+    def __init__(self):
+        self._len = 0
+        self._last = None
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, item):
+        if self._len and item in (-1, self._len - 1):
+            return self._last
+        raise PyrtlError('only the latest value of a streamed trace is kept')
+
+    def append(self, value):
+        self._last = value
+        self._len += 1
+
+    def extend(self, values):
+        for v in values:
+            self.append(v)
+
+
+class StreamingVCDTrace(SimulationTrace):
+    """ A tracer that writes a VCD file as the simulation runs.
+
+    Rather than storing the values of every wire for every cycle and dumping
+    them at the end (as `SimulationTrace.print_vcd` does), each cycle is written
+    as soon as the simulator hands it over.  Only the wires whose values
+    changed since the previous cycle are written, and the text is collected in
+    a buffer that is written to the file in large blocks.  Only the latest value
+    of each wire is kept in memory, so the length of the simulation is limited
+    by disk space alone.  It works as the tracer of any of the simulators. ::
+
+        with open('waves.vcd', 'w') as f:
+            tracer = StreamingVCDTrace(f)
+            sim = FastSimulation(tracer=tracer)
+            for cycle in range(1000000):
+                sim.step({'a': cycle % 7})
+            tracer.close()
+
+    Because the history is not kept, the trace cannot be printed or rendered
+    afterwards; `inspect` style access to the latest value of a wire still works.
+    """
+
+    def __init__(self, file, wires_to_track=None, block=None, include_clock=False,
+                 buffer_size=1 << 16):
+        """
+        Creates a new Streaming VCD Trace
+
+        :param file: the open file to which the vcd dump is written
+        :param wires_to_track: The wires that the tracer should track
+        :param block:
+        :param include_clock: boolean specifying if the implicit clk should be included
+        :param buffer_size: the number of characters buffered before they are written to file
+        """
+        self.file = file
+        self.include_clock = include_clock
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+        self._cycle = 0
+        self._closed = False
+        super(StreamingVCDTrace, self).__init__(wires_to_track, block)
+
+    def _set_wires_to_track(self, wires_to_track):
+        if self._cycle:
+            raise PyrtlError('cannot change the traced wires once the vcd dump has started')
+        super(StreamingVCDTrace, self)._set_wires_to_track(wires_to_track)
+        sanitizer = _VerilogSanitizer('_vcd_tmp_')
+        for wire in wires_to_track:
+            sanitizer.make_valid_string(wire.name)
+        self._names = sorted(self.trace, key=_trace_sort_key)
+        self._varnames = [sanitizer[name] for name in self._names]
+        self._lists = [self.trace[name] for name in self._names]
+
+    def _new_trace_list(self, wire):
+        return _LatestValue()
+
+    def _write(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def _add_values(self, values):
+        """ Write the changes of one cycle given the values of the wires in sorted order. """
+        if self._closed:
+            raise PyrtlError('cannot add to a StreamingVCDTrace after it is closed')
+        if self._cycle == 0:
+            self._write(_vcd_header(
+                [(self._wires[wn].bitwidth, vn) for wn, vn in zip(self._names, self._varnames)],
+                self.include_clock))
+            self._write(''.join('b{:b} {}\n'.format(v, vn)
+                                for v, vn in zip(values, self._varnames)))
+            self._write('$end\n')
+            changes = ['b{:b} {}'.format(v, vn) for v, vn in zip(values, self._varnames)]
+        else:
+            changes = ['b{:b} {}'.format(v, vn)
+                       for v, vn, vals in zip(values, self._varnames, self._lists)
+                       if v != vals._last]
+        for v, vals in zip(values, self._lists):
+            vals.append(v)
+        if changes or self.include_clock:
+            self._write(_vcd_timestamp(self._cycle, changes, self.include_clock))
+        self._cycle += 1
+
+    def __len__(self):
+        return self._cycle
+
+    def add_step(self, value_map):
+        self._add_values([value_map[self._wires[name]] for name in self._names])
+
+    def add_step_named(self, value_map):
+        self._add_values([value_map[name] for name in self._names])
+
+    def add_fast_step(self, fastsim):
+        self._add_values([fastsim.context[name] for name in self._names])
+
+    def add_steps_named(self, values):
+        columns = [values[name] for name in self._names]
+        for row in zip(*columns):
+            self._add_values(row)
+
+    def flush(self):
+        """ Write out everything buffered so far. """
+        self.file.write(''.join(self._buffer))
+        self.file.flush()
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        """ Finish the vcd dump (the file itself is left open). """
+        if not self._closed:
+            self._write('#{}\n'.format(self._cycle*10))
+            self.flush()
+            self._closed = True
+
+    def print_trace(self, *args, **kwargs):
+        raise PyrtlError('a StreamingVCDTrace does not keep the values to print')
+
+    def print_vcd(self, *args, **kwargs):
+        raise PyrtlError('a StreamingVCDTrace writes its vcd dump while simulating')
+
+    def render_trace(self, *args, **kwargs):
+        raise PyrtlError('a StreamingVCDTrace does not keep the values to render')
+
+
+class _WindowList(_CompactTraceList):
+    """ The values of a wire in a WindowedSimulationTrace.
+
+    Only the last maxlen values are kept, in a ring, so appending and
+    indexing take constant time.
+    """
+    __slots__ = ('maxlen', '_head')
+
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self._data = []
+        self._len = 0
+        self._head = 0  # the index in _data of the oldest value
+
+    def append(self, value):
+        if self._len < self.maxlen:
+            self._data.append(value)
+            self._len += 1
+        else:
+            self._data[self._head] = value
+            self._head = (self._head + 1) % self.maxlen
+
+    def grow(self, maxlen):
+        """ Keep up to maxlen values from now on. """
+        self._data = list(self)
+        self._head = 0
+        self.maxlen = maxlen
+
+    def _get(self, i):
+        return self._data[(self._head + i) % self._len]
+
+
+class WindowedSimulationTrace(SimulationTrace):
+    """ A SimulationTrace that keeps only a bounded window of cycles.
+
+    Without a trigger, the values of the last `window` cycles are kept in a
+    ring buffer, which is all that is usually needed to see what led up to a
+    failing `rtl_assert`, at a fixed memory cost however long the simulation.
+
+    With a trigger the trace behaves like a logic analyzer: it watches the
+    trigger wire and, on the first cycle on which it has trigger_value, keeps
+    the `window` cycles up to and including that cycle plus the following
+    `post_trigger` cycles, after which it stops capturing.  To capture around a
+    failing assertion, use the wire returned by `rtl_assert` as the trigger
+    with a trigger_value of 0. ::
+
+        tracer = WindowedSimulationTrace(1000, trigger='state', trigger_value=5,
+                                         post_trigger=100)
+        sim = FastSimulation(tracer=tracer)
+        ...
+        print(tracer.trigger_cycle, tracer.start_cycle)
+        tracer.render_trace()
+
+    Index 0 of the trace is cycle `start_cycle` of the simulation.
+    """
+
+    def __init__(self, window, wires_to_track=None, block=None, trigger=None,
+                 trigger_value=1, post_trigger=0):
+        """
+        Creates a new Windowed Simulation Trace
+
+        :param window: the number of cycles kept (before and including the trigger, if any)
+        :param wires_to_track: The wires that the tracer should track
+        :param block:
+        :param trigger: the wire (or name of the wire) to watch, or None to keep a
+          ring buffer of the last window cycles
+        :param trigger_value: the value of the trigger wire that starts the capture
+        :param post_trigger: the number of cycles captured after the trigger
+        """
+        if window < 1:
+            raise PyrtlError('the trace window must hold at least one cycle')
+        if post_trigger < 0 or (post_trigger and trigger is None):
+            raise PyrtlError('post_trigger must be a non-negative count used with a trigger')
+        self.window = window
+        self.post_trigger = post_trigger
+        self.trigger_value = trigger_value
+        self.trigger_cycle = None
+        self.done = False
+        self._recorded = 0
+        self._post_remaining = 0
+        self._trigger_wire = None
+        if trigger is not None:
+            self._trigger_wire = (trigger if isinstance(trigger, WireVector) else
+                                  working_block(block).get_wirevector_by_name(trigger, strict=True))
+        super(WindowedSimulationTrace, self).__init__(wires_to_track, block)
+
+    @property
+    def trigger(self):
+        """ The name of the trigger wire (or None). """
+        return None if self._trigger_wire is None else self._trigger_wire.name
+
+    @property
+    def start_cycle(self):
+        """ The cycle of the simulation held at index 0 of the trace. """
+        return self._recorded - len(self)
+
+    def _set_wires_to_track(self, wires_to_track):
+        if (self._trigger_wire is not None and
+                self._trigger_wire.name not in {w.name for w in wires_to_track}):
+            wires_to_track = list(wires_to_track) + [self._trigger_wire]
+        super(WindowedSimulationTrace, self)._set_wires_to_track(wires_to_track)
+        self._names = sorted(self.trace)
+        self._lists = [self.trace[name] for name in self._names]
+        if self._trigger_wire is not None:
+            self._trigger_index = self._names.index(self._trigger_wire.name)
+
+    def _new_trace_list(self, wire):
+        # only the window is kept until the trigger fires
+        return _WindowList(self.window)
+
+    def _add_values(self, values):
+        """ Capture one cycle given the values of the wires in sorted order. """
+        if self.done:
+            return
+        for v, vals in zip(values, self._lists):
+            vals.append(v)
+        self._recorded += 1
+        if self.trigger_cycle is not None:
+            self._post_remaining -= 1
+            if self._post_remaining == 0:
+                self.done = True
+        elif (self._trigger_wire is not None and
+              values[self._trigger_index] == self.trigger_value):
+            self.trigger_cycle = self._recorded - 1
+            self._post_remaining = self.post_trigger
+            self.done = self.post_trigger == 0
+            for vals in self._lists:
+                vals.grow(self.window + self.post_trigger)
+
+    def _skip(self, cycles):
+        """ Count cycles that were captured but have already left the window. """
+        self._recorded += cycles
+
+    def add_step(self, value_map):
+        self._add_values([value_map[self._wires[name]] for name in self._names])
+
+    def add_step_named(self, value_map):
+        self._add_values([value_map[name] for name in self._names])
+
+    def add_fast_step(self, fastsim):
+        self._add_values([fastsim.context[name] for name in self._names])
+
+    def add_steps_named(self, values):
+        columns = [values[name] for name in self._names]
+        for row in zip(*columns):
+            self._add_values(row)
+
+
+_TRACE_FILE_MAGIC = b'PYRTL-TRACE 1\n'
+
+
+class _TracedWire(object):
+    """ Stand-in for a WireVector of a trace reopened from a file (just a name and bitwidth). """
+    __slots__ = ('name', 'bitwidth')
+
+    def __init__(self, name, bitwidth):
+        self.name = name
+        self.bitwidth = bitwidth
+
+    def __len__(self):
+        return self.bitwidth
+
+
+class _TraceFileReader(object):
+    """ Random access to the records of a trace file through a memory map.
+
+    The file holds a magic line, a line of JSON listing the traced wires and
+    their bitwidths, and then one fixed-width record per cycle in which each
+    wire takes ceil(bitwidth/8) big-endian bytes in the order of the listing.
+    The records of a file that is still being written are only mapped when
+    `refresh` is called.
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        if self._file.readline() != _TRACE_FILE_MAGIC:
+            self._file.close()
+            raise PyrtlError('"%s" is not a PyRTL trace file' % filename)
+        self.wires = [_TracedWire(name, bitwidth) for name, bitwidth
+                      in json.loads(self._file.readline().decode('utf-8'))['wires']]
+        self._start = self._file.tell()
+        self._fields = {}
+        self._record_size = 0
+        for wire in self.wires:
+            nbytes = (wire.bitwidth + 7) // 8
+            self._fields[wire.name] = (self._record_size, nbytes)
+            self._record_size += nbytes
+        self._map = None
+        self._len = 0
+        self.refresh()
+
+    def refresh(self):
+        """ Map any records appended to the file since it was last mapped. """
+        size = os.fstat(self._file.fileno()).st_size
+        if self._map is not None and size == len(self._map):
+            return
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._len = (size - self._start) // self._record_size
+
+    def __len__(self):
+        return self._len
+
+    def read(self, name, i):
+        offset, nbytes = self._fields[name]
+        start = self._start + i * self._record_size + offset
+        return int(binascii.hexlify(self._map[start:start + nbytes]), 16)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class _TraceFileColumn(_CompactTraceList):
+    """ The values of one wire of a trace file, read on demand. """
+    __slots__ = ('_trace', '_name')
+
+    def __init__(self, trace, name):
+        self._trace = trace
+        self._name = name
+
+    def __len__(self):
+        return len(self._trace)
+
+    def __getitem__(self, item):
+        self._len = len(self._trace)
+        return super(_TraceFileColumn, self).__getitem__(item)
+
+    def __iter__(self):
+        for i in range(len(self._trace)):
+            yield self._get(i)
+
+    def _get(self, i):
+        return self._trace._read(self._name, i)
+
+    def append(self, value):
+        raise PyrtlError('values are added to a file trace a whole cycle at a time')
+
+
+class FileSimulationTrace(SimulationTrace):
+    """ A SimulationTrace that is stored in a file rather than in memory.
+
+    Each cycle is appended to the file as one fixed-width record holding the
+    values of all the traced wires, so traces can outlive the simulation and
+    grow larger than RAM.  Records are stored a cycle at a time, rather than a
+    column per wire, so that a cycle is a single append to the end of the
+    file and a file cut short by a crash is still readable; the values of one
+    wire are a fixed stride apart, so reading them only touches their bytes.
+    Reads go through a memory map of the file, which makes `trace[name][i]` a
+    constant time lookup whether the trace is being read during the simulation
+    or reopened afterwards with `SavedSimulationTrace`. ::
+
+        tracer = FileSimulationTrace('overnight.trace')
+        sim = FastSimulation(tracer=tracer)
+        ...
+        tracer.close()
+
+        # later, possibly in another process
+        trace = SavedSimulationTrace('overnight.trace')
+        trace.render_trace()
+    """
+
+    def __init__(self, filename, wires_to_track=None, block=None, buffer_size=1 << 20):
+        """
+        Creates a new File Simulation Trace
+
+        :param filename: the file to create (any existing file is overwritten)
+        :param wires_to_track: The wires that the tracer should track
+        :param block:
+        :param buffer_size: the number of bytes buffered before they are written to file
+        """
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self._file = open(filename, 'wb')
+        self._buffer = []
+        self._buffered = 0
+        self._cycle = 0
+        self._reader = None
+        super(FileSimulationTrace, self).__init__(wires_to_track, block)
+
+    def _set_wires_to_track(self, wires_to_track):
+        if self._cycle:
+            raise PyrtlError('cannot change the traced wires once the trace file has started')
+        super(FileSimulationTrace, self)._set_wires_to_track(wires_to_track)
+        self._names = sorted(self.trace, key=_trace_sort_key)
+        self._formats = ['{:0%dx}' % ((self._wires[name].bitwidth + 7) // 8 * 2)
+                         for name in self._names]
+        # write the header now, so that the file can be opened before the first cycle
+        header = {'wires': [[name, self._wires[name].bitwidth] for name in self._names]}
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(_TRACE_FILE_MAGIC)
+        self._file.write((json.dumps(header) + '\n').encode('utf-8'))
+        self._file.flush()
+
+    def _new_trace_list(self, wire):
+        return _TraceFileColumn(self, wire.name)
+
+    def _add_values(self, values):
+        """ Append the record of one cycle given the values of the wires in sorted order. """
+        if self._file is None:
+            raise PyrtlError('cannot add to a FileSimulationTrace after it is closed')
+        record = binascii.unhexlify(''.join(f.format(v) for f, v in zip(self._formats, values)))
+        self._buffer.append(record)
+        self._buffered += len(record)
+        self._cycle += 1
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def __len__(self):
+        return self._cycle
+
+    def add_step(self, value_map):
+        self._add_values([value_map[self._wires[name]] for name in self._names])
+
+    def add_step_named(self, value_map):
+        self._add_values([value_map[name] for name in self._names])
+
+    def add_fast_step(self, fastsim):
+        self._add_values([fastsim.context[name] for name in self._names])
+
+    def add_steps_named(self, values):
+        columns = [values[name] for name in self._names]
+        for row in zip(*columns):
+            self._add_values(row)
+
+    def _read(self, name, i):
+        if self._reader is None or i >= len(self._reader):
+            # the cycle is buffered, or was written since the file was last mapped
+            self.flush()
+            if self._reader is None:
+                self._reader = _TraceFileReader(self.filename)
+            else:
+                self._reader.refresh()
+        return self._reader.read(name, i)
+
+    def flush(self):
+        """ Write out everything buffered so far. """
+        if self._file is not None:
+            self._file.write(b''.join(self._buffer))
+            self._file.flush()
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        """ Write out everything buffered and close the trace file.
+
+        The values remain readable through the trace after it is closed.
+        """
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+class SavedSimulationTrace(SimulationTrace):
+    """ A trace reopened from a file written by a FileSimulationTrace.
+
+    The file is memory mapped, so opening is immediate and only the cycles
+    that are looked at are read from disk.  It has the same `trace[name]`
+    interface as a SimulationTrace, and `print_trace`, `print_vcd`,
+    `render_trace`, `trace_to_html` and `output_verilog_testbench` (given the
+    block that was simulated) all work on it directly. ::
+
+        trace = SavedSimulationTrace('overnight.trace')
+        print(trace.trace['count'][123456789])
+        trace.print_vcd(open('overnight.vcd', 'w'), only_changes=True)
+    """
+
+    def __init__(self, filename):
+        """
+        Opens a saved Simulation Trace
+
+        :param filename: the file written by a FileSimulationTrace
+        """
+        self.filename = filename
+        self._reader = _TraceFileReader(filename)
+        super(SavedSimulationTrace, self).__init__(self._reader.wires)
+        self.block = None  # the block that was simulated is not saved
+
+    def _new_trace_list(self, wire):
+        return _TraceFileColumn(self, wire.name)
+
+    def __len__(self):
+        return len(self._reader)
+
+    def _read(self, name, i):
+        return self._reader.read(name, i)
+
+    def _add_values(self, values):
+        raise PyrtlError('a SavedSimulationTrace cannot be added to')
+
+    def add_step(self, value_map):
+        self._add_values(value_map)
+
+    def add_step_named(self, value_map):
+        self._add_values(value_map)
+
+    def add_fast_step(self, fastsim):
+        self._add_values(fastsim)
+
+    def add_steps_named(self, values):
+        self._add_values(values)
+
+    def close(self):
+        """ Close the trace file. """
+        self._reader.close()
@@ -214,7 +214,9 @@ def _clone_block_and_wires(block_in):
     block_out = block_in.__class__()
     temp_wv_map = {}
     with set_working_block(block_out, no_sanity_check=True):
-        for wirevector in block_in.wirevector_subset():
+        # clone in creation order so the copies keep the relative _creation_index
+        # order that common_subexp_elimination uses to pick which duplicate survives
+        for wirevector in sorted(block_in.wirevector_subset(), key=lambda w: w._creation_index):
             new_wv = clone_wire(wirevector)
             temp_wv_map[wirevector] = new_wv
 
@@ -12,6 +12,7 @@ Types defined in this file include:
 
 from __future__ import print_function, unicode_literals
 
+import itertools
 import numbers
 import six
 import re
@@ -31,6 +32,10 @@ from .core import working_block, LogicNet, _NameIndexer
 _wvIndexer = _NameIndexer("tmp")
 _constIndexer = _NameIndexer("const_")
 
+# gives every wirevector an increasing creation index, which passes use to
+# order wires deterministically (hashes are only unique within one run)
+_creation_counter = itertools.count()
+
 
 def next_tempvar_name(name=""):
     if name == '':  # sadly regex checks are sometimes too slow
@@ -102,6 +107,7 @@ class WireVector(object):
         :return: a wirevector object representing a const wire
         """
         self._name = None
+        self._creation_index = next(_creation_counter)
 
         # used only to verify the one to one relationship of wires and blocks
         self._block = working_block(block)
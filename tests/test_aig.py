@@ -0,0 +1,196 @@
+import unittest
+import random
+
+import pyrtl
+from pyrtl.aig import AIG
+from pyrtl.rtllib import testingutils as utils
+
+
+def _random_aig(num_inputs, num_gates, num_outputs, seed):
+    aig = AIG()
+    rng = random.Random(seed)
+    lits = [aig.add_input() for _ in range(num_inputs)]
+    for _ in range(num_gates):
+        a, b = rng.choice(lits) ^ rng.randint(0, 1), rng.choice(lits) ^ rng.randint(0, 1)
+        lits.append(rng.choice([aig.add_and, aig.add_or, aig.add_xor])(a, b))
+    for lit in lits[-num_outputs:]:
+        aig.add_output(lit)
+    return aig
+
+
+def _exhaustive_outputs(aig):
+    # simulate every input pattern at once, one per bit
+    num_inputs = len(aig.inputs)
+    mask = (1 << (1 << num_inputs)) - 1
+    patterns = [sum(1 << m for m in range(1 << num_inputs) if m >> i & 1)
+                for i in range(num_inputs)]
+    return aig.simulate(patterns, mask)
+
+
+class TestAIG(unittest.TestCase):
+    def test_literals_and_structural_hashing(self):
+        aig = AIG()
+        a, b = aig.add_input(), aig.add_input()
+        self.assertEqual((a, b), (2, 4))
+        ab = aig.add_and(a, b)
+        self.assertEqual(aig.add_and(b, a), ab)
+        self.assertEqual(aig.fanins(ab), (a, b))
+        self.assertIsNone(aig.fanins(a))
+        self.assertEqual(aig.num_ands, 1)
+
+    def test_trivial_simplification(self):
+        aig = AIG()
+        a, b = aig.add_input(), aig.add_input()
+        ab = aig.add_and(a, b)
+        self.assertEqual(aig.add_and(a, 0), 0)
+        self.assertEqual(aig.add_and(1, a), a)
+        self.assertEqual(aig.add_and(a, a), a)
+        self.assertEqual(aig.add_and(a, a ^ 1), 0)
+        self.assertEqual(aig.add_and(a, ab), ab)
+        self.assertEqual(aig.add_and(a ^ 1, ab), 0)
+        self.assertEqual(aig.add_and(a ^ 1, ab ^ 1), a ^ 1)
+        self.assertEqual(aig.num_ands, 1)
+
+    def test_simulate(self):
+        aig = AIG()
+        a, b, s = aig.add_input(), aig.add_input(), aig.add_input()
+        aig.add_output(aig.add_xor(a, b))
+        aig.add_output(aig.add_mux(s, a, b))
+        self.assertEqual(aig.simulate([0b0011, 0b0101, 0b1010], mask=0xf), [0b0110, 0b0111])
+        with self.assertRaises(pyrtl.PyrtlError):
+            aig.simulate([1])
+
+    def test_cleanup_drops_unused_gates(self):
+        aig = AIG()
+        a, b = aig.add_input(), aig.add_input()
+        aig.add_and(a, b ^ 1)
+        aig.add_output(aig.add_or(a, b))
+        self.assertEqual(aig.num_ands, 2)
+        self.assertEqual(aig.cleanup().num_ands, 1)
+
+    def test_balance_chain(self):
+        aig = AIG()
+        inputs = [aig.add_input() for _ in range(16)]
+        lit = inputs[0]
+        for other in inputs[1:]:
+            lit = aig.add_and(lit, other)
+        aig.add_output(lit)
+        self.assertEqual(aig.depth(), 15)
+        balanced = aig.balance()
+        self.assertEqual(balanced.depth(), 4)
+        self.assertEqual(balanced.num_ands, 15)
+        rng = random.Random(0)
+        patterns = [rng.getrandbits(64) | rng.getrandbits(64) for _ in range(16)]
+        mask = (1 << 64) - 1
+        self.assertEqual(aig.simulate(patterns, mask), balanced.simulate(patterns, mask))
+
+    def test_balance_does_not_duplicate_shared_logic(self):
+        aig = AIG()
+        a, b, c, d = [aig.add_input() for _ in range(4)]
+        shared = aig.add_and(aig.add_and(a, b), c)
+        aig.add_output(aig.add_and(shared, d))
+        aig.add_output(shared ^ 1)
+        self.assertEqual(aig.balance().num_ands, 3)
+
+    def test_rewrite_finds_smaller_logic(self):
+        aig = AIG()
+        a, b, c = aig.add_input(), aig.add_input(), aig.add_input()
+        # (a & b) | (a & c) | (a & ~b & ~c) is just a
+        terms = [aig.add_and(a, b), aig.add_and(a, c),
+                 aig.add_and(a, aig.add_and(b ^ 1, c ^ 1))]
+        aig.add_output(aig.add_or(aig.add_or(terms[0], terms[1]), terms[2]))
+        # (a & b) | (a & c) needs two gates as a & (b | c)
+        aig.add_output(aig.add_or(aig.add_and(a, b), aig.add_and(a, c)))
+        rewritten = aig.rewrite()
+        self.assertEqual(rewritten.outputs[0], a)
+        self.assertEqual(rewritten.num_ands, 2)
+        self.assertEqual(_exhaustive_outputs(aig), _exhaustive_outputs(rewritten))
+
+    def test_optimizations_keep_function(self):
+        for seed in range(10):
+            aig = _random_aig(6, 60, 4, seed)
+            expected = _exhaustive_outputs(aig)
+            for optimized in (aig.cleanup(), aig.balance(), aig.rewrite(),
+                              aig.rewrite(cut_size=6, cut_limit=12).balance()):
+                self.assertEqual(_exhaustive_outputs(optimized), expected)
+                self.assertLessEqual(optimized.num_ands, aig.num_ands)
+
+    def test_rewrite_bad_cut_size(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            AIG().rewrite(cut_size=7)
+
+
+class TestAIGBlockConversion(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+
+    def check_same_simulation(self, pre_block, post_block, cycles=32):
+        expected, result = utils.sim_blocks_on_random_inputs([pre_block, post_block], cycles)
+        self.assertEqual(result, expected)
+
+    def test_round_trip(self):
+        a, b = pyrtl.Input(8, 'a'), pyrtl.Input(8, 'b')
+        sel = pyrtl.Input(1, 'sel')
+        acc = pyrtl.Register(8, 'acc')
+        acc.next <<= pyrtl.select(sel, (acc + a)[:8], acc ^ b)
+        out, less = pyrtl.Output(8, 'out'), pyrtl.Output(1, 'less')
+        out <<= acc
+        less <<= a < b
+        pre = pyrtl.working_block()
+        post = pyrtl.synthesize()
+        aig = pyrtl.aig_from_block(post)
+        self.assertEqual(len(aig.inputs), 8 + 8 + 1 + 8)
+        self.assertEqual(len(aig.outputs), 8 + 1 + 8)
+        block = pyrtl.aig_to_block(aig)
+        self.assertIs(pyrtl.working_block(), block)
+        self.assertTrue(set(net.op for net in block.logic) <= set('~&rwcs'))
+        self.assertEqual(set(block.io_map), set(post.io_map))
+        block.sanity_check()
+        self.check_same_simulation(pre, block)
+
+    def test_unsynthesized_bitwise_logic(self):
+        a, b, c = pyrtl.Input(4, 'a'), pyrtl.Input(4, 'b'), pyrtl.Input(1, 'c')
+        out = pyrtl.Output(9, 'out')
+        out <<= pyrtl.concat(pyrtl.select(c, a & b, a | b), ~(a ^ b)[1:], a.nand(b)[0])
+        pre = pyrtl.working_block()
+        block = pyrtl.aig_to_block(pyrtl.aig_from_block(), update_working_block=False)
+        self.assertIs(pyrtl.working_block(), pre)
+        self.check_same_simulation(pre, block)
+
+    def test_arithmetic_not_converted(self):
+        a = pyrtl.Input(4, 'a')
+        out = pyrtl.Output(5, 'out')
+        out <<= a + 1
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.aig_from_block()
+
+    def test_memories(self):
+        waddr, raddr = pyrtl.Input(3, 'waddr'), pyrtl.Input(3, 'raddr')
+        data, we = pyrtl.Input(4, 'data'), pyrtl.Input(1, 'we')
+        mem = pyrtl.MemBlock(4, 3, 'mem')
+        mem[waddr] <<= pyrtl.MemBlock.EnabledWrite(data ^ 5, we)
+        out = pyrtl.Output(4, 'out')
+        out <<= mem[raddr] & data
+        pre = pyrtl.working_block()
+        pyrtl.synthesize()
+        block = pyrtl.aig_optimize()
+        self.assertEqual(len(block.mem_map), 1)
+        self.check_same_simulation(pre, block)
+
+    def test_optimize_makes_smaller_block(self):
+        a, b = pyrtl.Input(6, 'a'), pyrtl.Input(6, 'b')
+        out = pyrtl.Output(7, 'out')
+        out <<= (a + b) | (a & b)
+        pre = pyrtl.working_block()
+        post = pyrtl.synthesize()
+        pyrtl.optimize()
+        pm = pyrtl.PassManager()
+        block = pyrtl.aig_optimize(pass_manager=pm)
+        self.assertEqual([s.name for s in pm.stats], ['aig_optimize'])
+        gates = [net for net in block.logic if net.op == '&']
+        self.assertLess(len(gates), len([n for n in post.logic if n.op in '&|^']) * 3)
+        self.check_same_simulation(pre, block)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 import unittest
+import os
+import shutil
+import tempfile
 import six
 
 import pyrtl
 from pyrtl.corecircuits import _basic_add
+from pyrtl.simulation import _PositionalInputs
 
 # the code below disables testing of CompiledSim on systems where there does
 # not appear to be the right version of gcc.  This is a not an ideal way to check
@@ -399,6 +403,370 @@ b110 o
         self.assertEqual(self.VCD_OUTPUT, test_output.getvalue())
 
 
+class CompactTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(1, 'a')
+        c = pyrtl.Input(100, 'c')
+        r = pyrtl.Register(70, 'r')
+        self.o = pyrtl.Output(70, 'o')
+        self.n = pyrtl.Output(1, 'n')
+        r.next <<= c + r
+        self.o <<= r
+        self.n <<= ~a
+        self.inputs = [{'a': i % 2, 'c': (i * 12345) << 80} for i in range(20)]
+
+    def test_values_match_list_trace(self):
+        traces = []
+        for tracer in (pyrtl.SimulationTrace(), pyrtl.CompactSimulationTrace()):
+            sim = self.sim(tracer=tracer)
+            sim.run(self.inputs)
+            traces.append(tracer)
+        full, compact = traces
+        self.assertEqual(set(compact.trace), {'a', 'c', 'o', 'n', 'r'})
+        for name in full.trace:
+            self.assertEqual(list(compact.trace[name]), full.trace[name])
+        self.assertEqual(sim.inspect(self.o), full.trace['o'][-1])
+
+
+class StreamingVCDTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(1, 'a')
+        r = pyrtl.Register(8, 'r')
+        o = pyrtl.Output(8, 'o')
+        r.next <<= pyrtl.select(a, r + 1, r)
+        o <<= r
+        self.inputs = [{'a': int(i % 5 == 0)} for i in range(20)]
+
+    def test_matches_print_vcd(self):
+        full = pyrtl.SimulationTrace()
+        sim = self.sim(tracer=full)
+        sim.run(self.inputs)
+        expected = six.StringIO()
+        full.print_vcd(expected, include_clock=True, only_changes=True)
+
+        out = six.StringIO()
+        tracer = pyrtl.StreamingVCDTrace(out, include_clock=True)
+        sim = self.sim(tracer=tracer)
+        sim.run(self.inputs[:7])
+        sim.run(self.inputs[7:])
+        tracer.close()
+        self.assertEqual(out.getvalue(), expected.getvalue())
+        self.assertEqual(sim.inspect('o'), full.trace['o'][-1])
+
+
+class FileTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(1, 'a')
+        c = pyrtl.Input(100, 'c')
+        r = pyrtl.Register(70, 'r')
+        self.o = pyrtl.Output(70, 'o')
+        r.next <<= c + r
+        self.o <<= r
+        self.inputs = [{'a': i % 2, 'c': (i * 12345) << 80} for i in range(20)]
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'sim.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_reopened_trace(self):
+        full = pyrtl.SimulationTrace()
+        sim = self.sim(tracer=full)
+        sim.run(self.inputs)
+        stored = pyrtl.FileSimulationTrace(self.filename)
+        sim = self.sim(tracer=stored)
+        sim.run(self.inputs[:5])
+        self.assertEqual(sim.inspect(self.o), full.trace['o'][4])
+        sim.run(self.inputs[5:])
+        stored.close()
+        saved = pyrtl.SavedSimulationTrace(self.filename)
+        self.assertEqual(set(saved.trace), {'a', 'c', 'o', 'r'})
+        for name in saved.trace:
+            self.assertEqual(list(saved.trace[name]), full.trace[name])
+        saved.close()
+
+
+class WindowedTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(4, 'a')
+        self.r = pyrtl.Register(8, 'r')
+        self.o = pyrtl.Output(8, 'o')
+        self.r.next <<= self.r + 1
+        self.o <<= self.r + self.a
+        self.inputs = [{'a': i % 4} for i in range(20)]
+
+    def simulate(self, tracer, steps=20):
+        sim = self.sim(tracer=tracer)
+        sim.run(self.inputs[:steps // 2])
+        sim.run(self.inputs[steps // 2:steps])
+        return tracer
+
+    def check_window(self, tracer, start, stop):
+        full = self.simulate(pyrtl.SimulationTrace())
+        self.assertEqual(tracer.start_cycle, start)
+        self.assertEqual(len(tracer), stop - start)
+        for name in ('a', 'o'):
+            self.assertEqual(list(tracer.trace[name]), full.trace[name][start:stop])
+
+    def test_ring_buffer(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(5))
+        self.check_window(tracer, 15, 20)
+        self.assertIsNone(tracer.trigger_cycle)
+
+    def test_window_larger_than_run(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(50), steps=7)
+        self.assertEqual(tracer.start_cycle, 0)
+        self.assertEqual(len(tracer), 7)
+
+    def test_trigger_pre_and_post(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(
+            3, trigger='o', trigger_value=10, post_trigger=2))
+        self.assertEqual(tracer.trigger_cycle, 7)
+        self.assertTrue(tracer.done)
+        self.check_window(tracer, 5, 10)
+
+    def test_trigger_without_post(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(4, trigger=self.a, trigger_value=3))
+        self.assertEqual(tracer.trigger_cycle, 3)
+        self.check_window(tracer, 0, 4)
+
+    def test_trigger_not_reached(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(
+            3, trigger='o', trigger_value=200, post_trigger=2))
+        self.assertIsNone(tracer.trigger_cycle)
+        self.assertFalse(tracer.done)
+        # only the window is kept until the trigger fires
+        self.check_window(tracer, 17, 20)
+
+    def test_untraceable_trigger(self):
+        t = pyrtl.WireVector(8, 't')
+        t <<= self.r + 2
+        with self.assertRaises(pyrtl.PyrtlError):
+            self.sim(tracer=pyrtl.WindowedSimulationTrace(4, trigger=t))
+
+    def test_bad_window(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.WindowedSimulationTrace(0)
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.WindowedSimulationTrace(5, post_trigger=3)
+
+
+class RtlAssertBase(unittest.TestCase):
+    class RTLSampleException(Exception):
+        pass
+
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.i = pyrtl.Input(1, 'i')
+        self.r = pyrtl.Register(8, 'r')
+        self.r.next <<= self.r + 1
+        self.o = pyrtl.Output(8, 'o')
+        self.o <<= self.r
+        self.check = pyrtl.rtl_assert(self.i, self.RTLSampleException('i low'))
+
+    def test_stops_on_first_failing_cycle(self):
+        sim = self.sim()
+        with self.assertRaises(self.RTLSampleException) as cm:
+            sim.run([{'i': 1}] * 3 + [{'i': 0}] * 2 + [{'i': 1}])
+        self.assertEqual(cm.exception.rtl_assert_cycle, 3)
+        self.assertEqual(cm.exception.rtl_assert_wire, self.check.name)
+        self.assertEqual(sim.tracer.trace['o'], [0, 1, 2, 3])
+        # the simulation can carry on after the failing cycle
+        sim.run([{'i': 1}])
+        self.assertEqual(sim.tracer.trace['o'], [0, 1, 2, 3, 4])
+
+    def test_step(self):
+        sim = self.sim()
+        sim.step({'i': 1})
+        self.assertEqual(sim.inspect(self.check), 1)
+        with self.assertRaises(self.RTLSampleException) as cm:
+            sim.step({'i': 0})
+        self.assertEqual(cm.exception.rtl_assert_cycle, 1)
+
+    def test_windowed_trace(self):
+        tracer = pyrtl.WindowedSimulationTrace(2)
+        sim = self.sim(tracer=tracer)
+        with self.assertRaises(self.RTLSampleException):
+            sim.run([{'i': 1}] * 6 + [{'i': 0}] * 3)
+        self.assertEqual(list(tracer.trace['o']), [5, 6])
+
+
+class ActivityBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(4, 'a')
+        b = pyrtl.Input(70, 'b')
+        r = pyrtl.Register(8, 'r')
+        s = pyrtl.WireVector(71, 's')
+        o = pyrtl.Output(1, 'o')
+        r.next <<= r + a
+        s <<= b + r
+        o <<= s[3]
+        self.inputs = [{'a': i % 5, 'b': (i * 7) << 60} for i in range(30)]
+
+    def test_counts_match_fastsim(self):
+        fast = pyrtl.FastSimulation(tracer=None, activity=True)
+        for inputs in self.inputs:
+            fast.step(inputs)
+        sim = self.sim(activity=True)
+        sim.run(self.inputs[:1])
+        sim.run(self.inputs[1:])
+        table, expected = sim.activity(), fast.activity()
+        self.assertEqual(table.cycles, 30)
+        self.assertEqual(set(table), set(expected))
+        for name in expected:
+            self.assertEqual(table[name], expected[name])
+
+    def test_not_enabled(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.activity()
+
+
+class CoverageBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(3, 'a')
+        b = pyrtl.Input(70, 'b')
+        state = pyrtl.Register(2, 'state')
+        w = pyrtl.Register(70, 'w')
+        o = pyrtl.Output(70, 'o')
+        state.next <<= pyrtl.select(a[0], state + 1, state)
+        w.next <<= b
+        o <<= pyrtl.select(a[1], w, b ^ w)
+        self.inputs = [{'a': (i * 5) % 7, 'b': (i * 37) << 50} for i in range(20)]
+
+    def test_matches_fastsim(self):
+        fast = pyrtl.FastSimulation(tracer=None, coverage=True)
+        for inputs in self.inputs:
+            fast.step(inputs)
+        sim = self.sim(coverage=True)
+        sim.run(self.inputs[:1])
+        sim.run(self.inputs[1:])
+        cov, expected = sim.coverage(), fast.coverage()
+        self.assertEqual(cov.cycles, 20)
+        self.assertEqual(cov.toggles, expected.toggles)
+        self.assertEqual(cov.muxes, expected.muxes)
+        self.assertEqual(cov.states, expected.states)
+
+    def test_not_enabled(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.coverage()
+
+
+class PositionalInputsBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(4, 'a')
+        self.b = pyrtl.Input(70, 'b')
+        r = pyrtl.Register(70, 'r')
+        o = pyrtl.Output(70, 'o')
+        r.next <<= r + self.a
+        o <<= r ^ self.b
+        self.rows = [(i % 16, (i * 7919) << 50) for i in range(12)]
+
+    def expected(self):
+        sim = self.sim()
+        for a, b in self.rows:
+            sim.step({'a': a, 'b': b})
+        return sim.tracer
+
+    def check_trace(self, tracer):
+        expected = self.expected()
+        for name in ('a', 'b', 'o'):
+            self.assertEqual(list(tracer.trace[name]), list(expected.trace[name]))
+
+    def test_step_values(self):
+        sim = self.sim()
+        self.assertEqual(sim.bind_inputs(), ['a', 'b'])
+        for values in self.rows:
+            sim.step_values(values)
+        self.check_trace(sim.tracer)
+
+    def test_generic_step_values(self):
+        # the step_values shared by all simulators, which goes through step
+        sim = self.sim()
+        sim.bind_inputs()
+        for values in self.rows:
+            _PositionalInputs.step_values(sim, values)
+        self.check_trace(sim.tracer)
+
+    def test_run_values(self):
+        sim = self.sim()
+        sim.bind_inputs([self.b, 'a'])
+        sim.run_values([(b, a) for a, b in self.rows[:5]])
+        sim.run_values([(b, a) for a, b in self.rows[5:]])
+        self.check_trace(sim.tracer)
+
+    def test_bad_bindings(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.step_values((1, 2))
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.bind_inputs(['a'])
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.bind_inputs(['a', 'b', 'o'])
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.bind_inputs(['a', 'b', 'a'])
+
+    def test_bad_values(self):
+        sim = self.sim()
+        sim.bind_inputs(['a', 'b'])
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.step_values((1,))
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.step_values((16, 0))
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.run_values([(0, 0), (0, -1)])
+
+
+class WideConcatBase(unittest.TestCase):
+    def test_pieces_across_limbs(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(8, 'a')
+        b = pyrtl.Input(70, 'b')
+        outs = []
+        for low in (57, 60, 62, 64, 66):
+            o = pyrtl.Output(8 + low, 'o%d' % low)
+            o <<= pyrtl.concat(a, b[:low - 8], a)
+            outs.append(o.name)
+            o = pyrtl.Output(78 + low, 'w%d' % low)
+            o <<= pyrtl.concat(a, b, a, pyrtl.Const(0, low - 8), a)
+            outs.append(o.name)
+        inputs = [{'a': 0xa5, 'b': (1 << 70) - 3}, {'a': 0x3c, 'b': 12345 << 40}]
+        fast = pyrtl.FastSimulation()
+        sim = self.sim()
+        for values in inputs:
+            fast.step(values)
+            sim.step(values)
+        for name in outs:
+            self.assertEqual(sim.tracer.trace[name], fast.tracer.trace[name])
+
+
+class NoTracerBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(8, 'a')
+        r = pyrtl.Register(70, 'r')
+        o = pyrtl.Output(70, 'o')
+        r.next <<= r + pyrtl.concat(a, pyrtl.Const(0, 56))
+        o <<= r
+
+    def test_inspect_outputs(self):
+        sim = self.sim(tracer=None)
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.inspect('o')
+        sim.run([{'a': 3}] * 4)
+        self.assertEqual(sim.inspect('o'), 9 << 56)
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.inspect('r')
+
+
 class SimTraceWithMuxBase(unittest.TestCase):
     def setUp(self):
         pyrtl.reset_working_block()
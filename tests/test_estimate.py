@@ -110,6 +110,63 @@ class TestTimingEstimate(unittest.TestCase):
         self.assertEqual(timing.max_freq(), 610.2770657878676)
         self.assertEquals(timing.max_length(), 1255.6000000000001)
 
+
+class TestPowerEstimate(unittest.TestCase):
+
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(8, 'a')
+        self.b = pyrtl.Input(8, 'b')
+        self.r = pyrtl.Register(8, 'r')
+        self.s = pyrtl.Output(9, 's')
+        self.p = pyrtl.Output(16, 'p')
+        self.r.next <<= self.a & self.b
+        self.s <<= self.r + self.b
+        self.p <<= self.a * self.b
+        self.inputs = [{'a': (i * 37) % 256, 'b': i % 3} for i in range(50)]
+
+    def simulate(self, **kwargs):
+        sim = pyrtl.FastSimulation(**kwargs)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        return sim
+
+    def test_counters_and_trace_agree(self):
+        sim = self.simulate(tracer=pyrtl.SimulationTrace(wires_to_track='all'), activity=True)
+        from_counts = estimate.PowerAnalysis(sim.activity(), freq_in_mhz=100)
+        from_trace = estimate.PowerAnalysis(sim.tracer, freq_in_mhz=100)
+        self.assertEqual(from_counts.wire_power, from_trace.wire_power)
+        self.assertEqual(from_counts.unknown_wires, set())
+        self.assertGreater(from_counts.total_power, 0)
+        self.assertAlmostEqual(from_counts.total_power, sum(from_counts.op_power.values()))
+        self.assertGreater(from_counts.op_power['*'], from_counts.op_power['&'])
+        self.assertIn('Input', from_counts.op_power)
+
+    def test_scales_with_frequency(self):
+        activity = self.simulate(tracer=None, activity=True).activity()
+        slow = estimate.PowerAnalysis(activity, freq_in_mhz=100)
+        fast = estimate.PowerAnalysis(activity, freq_in_mhz=200)
+        self.assertAlmostEqual(fast.total_power, 2 * slow.total_power)
+        default = estimate.PowerAnalysis(activity)
+        self.assertEqual(default.freq_in_mhz, estimate.TimingAnalysis().max_freq())
+
+    def test_idle_design(self):
+        self.inputs = [{'a': 5, 'b': 1}] * 10
+        power = estimate.PowerAnalysis(self.simulate(activity=True).activity(), freq_in_mhz=100)
+        self.assertEqual(power.wire_power[self.a], 0)
+        self.assertEqual(power.wire_power[self.p], 0)
+
+    def test_untraced_wires(self):
+        sim = self.simulate()  # default trace leaves out the unnamed wires
+        power = estimate.PowerAnalysis(sim.tracer, freq_in_mhz=100)
+        self.assertTrue(power.unknown_wires)
+        guessed = estimate.PowerAnalysis(sim.tracer, freq_in_mhz=100, default_toggle_rate=0.5)
+        self.assertGreater(guessed.total_power, power.total_power)
+        output = io.StringIO()
+        guessed.print_power(file=output)
+        self.assertIn('By op:', output.getvalue())
+
+
 class TestYosysInterface(unittest.TestCase):
 
     def setUp(self):
@@ -583,6 +583,36 @@ class TestRtlAssert(unittest.TestCase):
         with self.assertRaises(self.RTLSampleException):
             sim.step({i: 0})
 
+    def test_assert_reports_cycle(self):
+        i = pyrtl.Input(1, 'i')
+        o = pyrtl.rtl_assert(i, self.RTLSampleException('test assertion failed'))
+
+        for sim_class in (pyrtl.Simulation, pyrtl.FastSimulation):
+            sim = sim_class()
+            sim.step({i: 1})
+            sim.step({i: 1})
+            with self.assertRaises(self.RTLSampleException) as cm:
+                sim.step({i: 0})
+            self.assertEqual(cm.exception.rtl_assert_cycle, 2)
+            self.assertEqual(cm.exception.rtl_assert_wire, o.name)
+            # each failure raises a new exception
+            with self.assertRaises(self.RTLSampleException) as again:
+                sim.step({i: 0})
+            self.assertIsNot(again.exception, cm.exception)
+            self.assertEqual(again.exception.rtl_assert_cycle, 3)
+            self.assertEqual(cm.exception.rtl_assert_cycle, 2)
+
+    def test_uninspectable_assert_is_an_error(self):
+        i = pyrtl.Input(1, 'i')
+        o = pyrtl.rtl_assert(i, self.RTLSampleException('test assertion failed'))
+
+        sim = pyrtl.Simulation()
+        sim.step({i: 1})
+        del sim.value[o]
+        with self.assertRaises(pyrtl.PyrtlError) as cm:
+            pyrtl.check_rtl_assertions(sim)
+        self.assertIn(o.name, str(cm.exception))
+
 
 class TestLoopDetection(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,132 @@
+import unittest
+import multiprocessing
+
+import pyrtl
+from pyrtl import parallel
+from pyrtl.rtllib import testingutils as utils
+
+
+class TestShardedSimulation(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(4, 'a')
+        self.r = pyrtl.Register(8, 'r')
+        self.o = pyrtl.Output(8, 'o')
+        self.r.next <<= self.r + self.a
+        self.o <<= self.r
+        self.stimuli = [[{'a': i}, {'a': 2*i}, {self.a: 3}] for i in range(6)]
+
+    def serial_trace(self, stimulus, sim_class):
+        tracer = pyrtl.SimulationTrace()
+        sim = sim_class(tracer=tracer)
+        for inputs in stimulus:
+            sim.step(inputs)
+        return tracer.trace
+
+    def check_results(self, results, sim_class=pyrtl.FastSimulation):
+        self.assertEqual(len(results), len(self.stimuli))
+        for stimulus, result in zip(self.stimuli, results):
+            self.assertIsNone(result.error)
+            expected = self.serial_trace(stimulus, sim_class)
+            for name in expected:
+                self.assertEqual(list(result.trace.trace[name]), list(expected[name]))
+
+    def test_in_process(self):
+        results = parallel.sharded_simulation(self.stimuli, processes=1)
+        self.check_results(results)
+
+    def test_process_pool(self):
+        results = parallel.sharded_simulation(self.stimuli, processes=2, chunksize=2)
+        self.check_results(results)
+
+    def test_simulation_class(self):
+        results = parallel.sharded_simulation(
+            self.stimuli, sim_class=pyrtl.Simulation, processes=2)
+        self.check_results(results, pyrtl.Simulation)
+
+    def test_register_value_map(self):
+        results = parallel.sharded_simulation(
+            [[{'a': 0}]], register_value_map={self.r: 7}, processes=1)
+        self.assertEqual(list(results[0].trace.trace['o']), [7])
+
+    def test_assertion_failure_in_order(self):
+        pyrtl.rtl_assert(self.r < 10, ValueError('r too big'))
+        results = parallel.sharded_simulation(self.stimuli, processes=2)
+        for result in results[:4]:
+            self.assertIsNone(result.error)
+        for result in results[4:]:
+            self.assertIsInstance(result.error, ValueError)
+        # the failing cycle is still in the trace
+        self.assertEqual(list(results[4].trace.trace['r']), [0, 4, 12])
+
+
+class TestOptimizePartitions(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        for k in range(3):
+            a, b = pyrtl.Input(4, 'a%d' % k), pyrtl.Input(4, 'b%d' % k)
+            r = pyrtl.Register(4, 'r%d' % k)
+            # the common subexpressions are left for the optimization to find
+            r.next <<= (a & b) ^ (r | (a & b))
+            out = pyrtl.Output(5, 'o%d' % k)
+            out <<= r + (a ^ r)
+        self.pre = pyrtl.copy_block(update_working_block=False)
+
+    def check_same_simulation(self, block, cycles=20):
+        expected, result = utils.sim_blocks_on_random_inputs([self.pre, block], cycles)
+        self.assertEqual(result, expected)
+
+    def test_partitions_are_independent(self):
+        partitions = parallel.logic_partitions()
+        self.assertEqual(len(partitions), 6)
+        self.assertEqual(sorted(len(p) for p in partitions), [3] * 3 + [4] * 3)
+        drivers = {}
+        for i, partition in enumerate(partitions):
+            self.assertFalse(any(net.op in 'rm@' for net in partition))
+            for net in partition:
+                for dest in net.dests:
+                    drivers[dest] = i
+        for i, partition in enumerate(partitions):
+            for net in partition:
+                self.assertTrue(all(drivers.get(arg, i) == i for arg in net.args))
+
+    def check_optimized(self, processes):
+        block = pyrtl.working_block()
+        nets_before = len(block.logic)
+        self.assertTrue(parallel.optimize_partitions(processes=processes))
+        block.sanity_check()
+        self.assertLess(len(block.logic), nets_before)
+        names = [w.name for w in block.wirevector_set]
+        self.assertEqual(len(names), len(set(names)))
+        for k in range(3):
+            self.assertIn('r%d' % k, block.wirevector_by_name)
+        self.check_same_simulation(block)
+
+    def test_in_process(self):
+        self.check_optimized(1)
+
+    def test_process_pool(self):
+        self.check_optimized(2)
+
+    def test_optimize_processes(self):
+        serial = pyrtl.optimize(update_working_block=False)
+        pm = pyrtl.PassManager()
+        block = pyrtl.optimize(processes=2, pass_manager=pm)
+        self.assertIn('optimize_partitions', [s.name for s in pm.stats])
+        self.assertLessEqual(len(block.logic), len(serial.logic))
+        self.check_same_simulation(block)
+
+    def test_one_core_optimizes_in_process(self):
+        cpu_count = multiprocessing.cpu_count
+        multiprocessing.cpu_count = lambda: 1
+        try:
+            pm = pyrtl.PassManager()
+            block = pyrtl.optimize(processes=None, pass_manager=pm)
+        finally:
+            multiprocessing.cpu_count = cpu_count
+        self.assertNotIn('optimize_partitions', [s.name for s in pm.stats])
+        self.check_same_simulation(block)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,6 +7,7 @@ import operator
 import pyrtl
 from pyrtl.wire import Const,  Output
 from pyrtl.analysis import estimate
+from pyrtl.rtllib import testingutils as utils
 
 from .test_transform import NetWireNumTestCases
 
@@ -141,6 +142,72 @@ class TestComparisonSynthesis(unittest.TestCase):
         self.check_op(lambda x, y: x > y)
 
 
+class TestBitBlasting(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+
+    def check_pre_and_post_synthesis(self, cycles=20):
+        pre = pyrtl.copy_block(update_working_block=False)
+        post = pyrtl.synthesize()
+        expected, synthesized = utils.sim_blocks_on_random_inputs([pre, post], cycles)
+        self.assertEqual(synthesized, expected)
+
+    def test_wide_arithmetic(self):
+        # a ripple carry chain this long used to exceed the recursion limit
+        a, b = pyrtl.Input(1200, 'a'), pyrtl.Input(1200, 'b')
+        for name, result in (('sum', a + b), ('difference', a - b), ('greater', a > b)):
+            out = pyrtl.Output(len(result), name)
+            out <<= result
+        self.check_pre_and_post_synthesis(cycles=2)
+
+    def test_wide_basic_circuits(self):
+        a, b = pyrtl.Input(1200, 'a'), pyrtl.Input(1200, 'b')
+        out = pyrtl.Output(1201, 'out')
+        less = pyrtl.Output(1, 'less')
+        out <<= pyrtl.corecircuits._basic_add(a, b)
+        less <<= pyrtl.corecircuits._basic_lt(a, b)
+        sim = pyrtl.Simulation()
+        sim.step({'a': 2 ** 1200 - 1, 'b': 1})
+        self.assertEqual(sim.inspect('out'), 2 ** 1200)
+        self.assertEqual(sim.inspect('less'), 0)
+
+    def test_mixed_logic(self):
+        a, b = pyrtl.Input(6, 'a'), pyrtl.Input(4, 'b')
+        sel = pyrtl.Input(1, 'sel')
+        acc = pyrtl.Register(8, 'acc')
+        acc.next <<= pyrtl.select(sel, (acc * b)[:8], (acc - a)[:8] ^ b)
+        mem = pyrtl.MemBlock(8, 4, 'mem')
+        mem[b] <<= acc
+        out = pyrtl.Output(10, 'out')
+        out <<= pyrtl.concat(mem[a[:4]] | acc, a.nand(a)[0], (a[1:] < b))
+        self.check_pre_and_post_synthesis()
+
+    def test_structural_hashing_and_folding(self):
+        a, b = pyrtl.Input(4, 'a'), pyrtl.Input(4, 'b')
+        out, out2 = pyrtl.Output(4, 'out'), pyrtl.Output(4, 'out2')
+        out <<= (a & b) ^ (b & a)  # the same gates, so always zero
+        out2 <<= ~~(a | Const(0, 4))
+        block = pyrtl.synthesize()
+        ops = [net.op for net in block.logic]
+        self.assertEqual(ops.count('&'), 4)  # made once for both (a & b) and (b & a)
+        self.assertEqual(ops.count('~'), 4)  # and ~~x is x
+        self.assertEqual(ops.count('^') + ops.count('|'), 0)
+        self.check_pre_and_post_synthesis()
+
+    def test_loop_at_word_level_only(self):
+        a = pyrtl.Input(4, 'a')
+        loop = pyrtl.WireVector(1)
+        both = a & pyrtl.concat(loop, a[:3])  # bit 0 of both drives bit 3
+        loop <<= both[0]
+        out = pyrtl.Output(4, 'out')
+        out <<= both
+        block = pyrtl.synthesize()
+        sim = pyrtl.Simulation(block=block)
+        for value in (0b1011, 0b1010, 0b0101):
+            sim.step({'a': value})
+            self.assertEqual(sim.inspect('out'), value & (0b0111 | (value & 1) << 3))
+
+
 class TestOptimization(NetWireNumTestCases):
 
     def test_wire_net_removal_1(self):
@@ -172,6 +239,33 @@ class TestOptimization(NetWireNumTestCases):
         self.assert_num_net(5, block)
         self.assert_num_wires(6, block)
 
+    def test_wire_net_removal_long_chain(self):
+        inwire = pyrtl.Input(bitwidth=3)
+        outwire = pyrtl.Output()
+        temp = inwire
+        for i in range(5000):  # deeper than the recursion limit
+            new_temp = pyrtl.WireVector()
+            new_temp <<= temp
+            temp = new_temp
+        outwire <<= ~temp
+
+        pyrtl.optimize()
+        self.num_net_of_type('~', 1)
+        self.num_net_of_type('w', 1)
+        self.assert_num_net(2)
+        self.assert_num_wires(3)
+
+    def test_producer_list_compresses_paths(self):
+        from pyrtl.passes import _ProducerList
+        wires = [pyrtl.WireVector(1) for i in range(5000)]
+        producers = _ProducerList()
+        for i in reversed(range(1, len(wires))):
+            producers[wires[i]] = wires[i - 1]
+        self.assertIs(producers.find_producer(wires[-1]), wires[0])
+        self.assertTrue(all(p is wires[0] for p in producers.dict.values()))
+        with self.assertRaises(pyrtl.PyrtlError):
+            producers[wires[0]] = wires[10]
+
 
 class TestConstFolding(NetWireNumTestCases):
 
@@ -345,6 +439,278 @@ class TestConstFolding(NetWireNumTestCases):
         self.assert_num_wires(7)
         self.num_wire_of_type(Const, 0)
 
+    def test_long_constant_chain_in_one_call(self):
+        inwire = pyrtl.Input(1)
+        outwire = pyrtl.Output()
+        temp = pyrtl.Const(1)
+        for i in range(2000):
+            temp = ~temp if i % 2 else temp & pyrtl.Const(1)
+        outwire <<= temp ^ inwire
+
+        pyrtl.constant_propagation(pyrtl.working_block(), True)
+        pyrtl.working_block().sanity_check()
+        self.num_net_of_type('~', 1)
+        self.num_net_of_type('w', 1)
+        self.assert_num_net(2)
+
+    def test_unchanged_nets_are_kept(self):
+        ins = [pyrtl.Input(1) for i in range(3)]
+        outwire = pyrtl.Output()
+        temp1 = ins[0] & ins[1]
+        temp2 = temp1 | pyrtl.Const(0)
+        outwire <<= temp2 ^ ins[2]
+        untouched = [net for net in pyrtl.working_block().logic if net.op == '&']
+
+        pyrtl.constant_propagation(pyrtl.working_block(), True)
+        self.num_net_of_type('|', 0)
+        self.assertIs(list(pyrtl.working_block().logic_subset('&'))[0], untouched[0])
+        xor_net = list(pyrtl.working_block().logic_subset('^'))[0]
+        self.assertIs(xor_net.args[0], temp1)
+
+
+class TestWordLevelSimplification(NetWireNumTestCases):
+
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(8, 'a')
+        self.b = pyrtl.Input(8, 'b')
+        self.sel = pyrtl.Input(1, 'sel')
+
+    def check_equivalent(self, outputs):
+        """ Simplify, then check the outputs match the original over random inputs. """
+        block = pyrtl.working_block()
+        for name, wire in outputs.items():
+            out = pyrtl.Output(len(wire), name)
+            out <<= wire
+        pre = pyrtl.copy_block(update_working_block=False)
+        pyrtl.word_level_simplification()
+        block.sanity_check()
+        expected, simplified = utils.sim_blocks_on_random_inputs([pre, block], cycles=40)
+        self.assertEqual(simplified, expected)
+
+    def driver(self, wire):
+        return [net for net in pyrtl.working_block().logic
+                if any(dest is wire for dest in net.dests)][0]
+
+    def driver_of(self, name):
+        return self.driver(pyrtl.working_block().get_wirevector_by_name(name))
+
+    def test_fold_wide_constants(self):
+        self.check_equivalent({
+            'o': (pyrtl.Const(200, 8) + pyrtl.Const(100, 8)) * pyrtl.Const(3, 2),
+            'p': ~pyrtl.Const(5, 8) - pyrtl.Const(7, 8),
+        })
+        self.num_net_of_type('w', 2)
+        self.assert_num_net(2)
+        self.assertEqual(self.driver_of('o').args[0].val, 900)
+
+    def test_identities(self):
+        self.check_equivalent({
+            'and0': self.a & pyrtl.Const(0, 8),
+            'and1': self.a & pyrtl.Const(255, 8),
+            'or0': self.a | pyrtl.Const(0, 8),
+            'add0': self.a + pyrtl.Const(0, 8),
+            'sub0': self.b - pyrtl.Const(0, 8),
+            'mul1': self.a * pyrtl.Const(1, 8),
+            'xorself': self.a ^ self.a,
+        })
+        for op in '&|+-*^':
+            self.num_net_of_type(op, 0)
+        self.assertIs(self.driver_of('and1').args[0], self.a)
+        self.assertIs(self.driver_of('or0').args[0], self.a)
+
+    def test_mux_with_constant_select(self):
+        self.check_equivalent({
+            'o': pyrtl.select(pyrtl.Const(1, 1), self.a, self.b),
+            'p': pyrtl.select(self.sel, self.a, self.b),
+        })
+        self.num_net_of_type('x', 1)
+        self.assertIs(self.driver_of('o').args[0], self.a)
+
+    def test_select_of_concat(self):
+        both = pyrtl.concat(self.a, self.b)
+        self.check_equivalent({'lo': both[2:6], 'hi': both[10:14], 'across': both[6:10]})
+        lo, hi = self.driver_of('lo').args[0], self.driver_of('hi').args[0]
+        # selects fully inside one argument read that argument directly
+        self.assertIs(self.driver(lo).args[0], self.b)
+        self.assertIs(self.driver(hi).args[0], self.a)
+
+    def test_concat_of_selects(self):
+        self.check_equivalent({
+            'same': pyrtl.concat(self.a[4:], self.a[:4]),
+            'swapped': pyrtl.concat(self.a[:4], self.a[4:]),
+            'nested': self.a[1:7][2:4],
+        })
+        self.assertIs(self.driver_of('same').args[0], self.a)
+        swapped = self.driver_of('swapped').args[0]
+        select = self.driver(swapped)
+        self.assertEqual(select.op, 's')
+        self.assertEqual(tuple(select.op_param), (4, 5, 6, 7, 0, 1, 2, 3))
+        nested = self.driver_of('nested').args[0]
+        select = self.driver(nested)
+        self.assertEqual(tuple(select.op_param), (3, 4))
+
+    def test_registers_and_memories_kept(self):
+        r = pyrtl.Register(8, 'r')
+        r.next <<= pyrtl.Const(3, 8)
+        mem = pyrtl.MemBlock(8, 2, 'mem')
+        mem[pyrtl.Const(1, 2)] <<= self.a
+        self.check_equivalent({'o': r + mem[pyrtl.Const(1, 2)]})
+        self.num_net_of_type('r', 1)
+        self.num_net_of_type('m', 1)
+        self.num_net_of_type('@', 1)
+
+
+def _build_unused_logic(a):
+    return (a + 1) & a
+
+
+class TestDeadLogicElimination(NetWireNumTestCases):
+
+    def test_long_unused_pipeline(self):
+        a = pyrtl.Input(4, 'a')
+        used = a
+        for i in range(50):
+            unused = pyrtl.Register(4)
+            unused.next <<= used ^ a
+            r = pyrtl.Register(4)
+            r.next <<= used
+            used = r
+        out = pyrtl.Output(4, 'out')
+        out <<= used
+
+        removed = pyrtl.dead_logic_elimination()
+        pyrtl.working_block().sanity_check()
+        self.num_net_of_type('r', 50)
+        self.num_net_of_type('^', 0)
+        self.assert_num_net(51)
+        self.assertEqual(sum(len(nets) for nets in removed.values()), 100)
+        self.assertEqual(list(removed), ['unknown'])
+
+    def test_roots_are_kept(self):
+        a = pyrtl.Input(4, 'a')
+        mem = pyrtl.MemBlock(4, 2)
+        mem[a[:2]] <<= (a + 1)[:4]
+        pyrtl.rtl_assert(a != 3, ValueError('a is 3'))
+        dead = a - 1
+
+        removed = pyrtl.dead_logic_elimination()
+        pyrtl.working_block().sanity_check()
+        self.num_net_of_type('@', 1)
+        self.num_net_of_type('+', 1)
+        self.num_net_of_type('-', 0)
+        self.assertEqual(len(pyrtl.working_block().rtl_assert_dict), 1)
+        self.assertEqual([net.op for net in removed['unknown'] if net.op == '-'], ['-'])
+
+    def test_report_groups_by_call_site(self):
+        pyrtl.set_debug_mode(True)
+        try:
+            a = pyrtl.Input(4, 'a')
+            out = pyrtl.Output(4, 'out')
+            out <<= a
+            _build_unused_logic(a)
+            _build_unused_logic(a)
+            removed = pyrtl.dead_logic_elimination()
+        finally:
+            pyrtl.set_debug_mode(False)
+        sites = [site for site in removed if '_build_unused_logic' in site]
+        self.assertEqual(len(sites), 1)
+        self.assertIn('test_passes.py', sites[0])
+        self.assertEqual(len(removed[sites[0]]), 12)  # 6 nets from each call
+
+
+class TestBitwidthNarrowing(NetWireNumTestCases):
+
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(4, 'a')
+        self.b = pyrtl.Input(4, 'b')
+
+    def check_equivalent(self, register_value_map=None):
+        """ Narrow, then check the outputs match the original over random inputs. """
+        block = pyrtl.working_block()
+        pre = pyrtl.copy_block(update_working_block=False)
+        narrowed = pyrtl.narrow_bitwidths(register_value_map=register_value_map)
+        block.sanity_check()
+        reg_map = {r.name: v for r, v in (register_value_map or {}).items()}
+        expected, result = utils.sim_blocks_on_random_inputs(
+            [pre, block], cycles=40, register_value_map=reg_map)
+        self.assertEqual(result, expected)
+        return narrowed
+
+    def test_ranges(self):
+        total = self.a + self.b
+        product = self.a * self.b
+        diff = total - self.a
+        wrapped = self.a - self.b
+        high = pyrtl.concat(total, self.a)[4:]
+        less = self.a < pyrtl.Const(0, 4)
+        ranges = pyrtl.value_ranges()
+        self.assertEqual(ranges[total], (0, 30))
+        self.assertEqual(ranges[product], (0, 225))
+        self.assertEqual(ranges[diff], (0, 63))  # as the difference can wrap around
+        self.assertEqual(ranges[wrapped], (0, 31))
+        self.assertEqual(ranges[high], (0, 30))
+        self.assertEqual(ranges[less], (0, 0))
+
+    def test_register_loop_ranges(self):
+        r = pyrtl.Register(16, 'r')
+        r.next <<= r | self.a
+        s = pyrtl.Register(16, 's')
+        s.next <<= s + 1
+        ranges = pyrtl.value_ranges()
+        self.assertEqual(ranges[r], (0, 15))
+        self.assertEqual(ranges[s], (0, 2**16 - 1))
+        self.assertEqual(pyrtl.value_ranges(register_value_map={r: 16})[r], (16, 31))
+
+    def test_narrow_over_provisioned_logic(self):
+        out = pyrtl.Output(32, 'out')
+        out <<= (pyrtl.concat(pyrtl.Const(0, 20), self.a) * self.b) + 1
+        narrowed = self.check_equivalent()
+        widths = {net.op: len(net.args[0]) for net in pyrtl.working_block().logic}
+        self.assertEqual((widths['*'], widths['+']), (4, 8))
+        self.assertGreater(sum(old - new for old, new in narrowed.values()), 40)
+        self.assertEqual(len(out), 32)
+
+    def test_narrow_register_loop(self):
+        acc = pyrtl.Register(32, 'acc')
+        acc.next <<= (acc & 0xff) | self.a
+        out = pyrtl.Output(32, 'out')
+        out <<= acc + self.b
+        narrowed = self.check_equivalent(register_value_map={acc: 0x80})
+        self.assertEqual(narrowed['acc'], (32, 8))
+        self.assertIsInstance(pyrtl.working_block().get_wirevector_by_name('acc'),
+                              pyrtl.Register)
+
+    def test_known_constants(self):
+        zero = (self.a & pyrtl.Const(0, 4)) + pyrtl.Const(3, 4)
+        out, less = pyrtl.Output(8, 'out'), pyrtl.Output(1, 'less')
+        out <<= self.b + zero
+        less <<= self.a < pyrtl.Const(0, 4)
+        narrowed = self.check_equivalent()
+        self.assertEqual(narrowed[zero.name], (5, 0))
+        self.num_net_of_type('&', 0)
+        self.num_net_of_type('<', 0)
+
+    def test_wrapping_subtraction_kept(self):
+        out = pyrtl.Output(9, 'out')
+        out <<= pyrtl.concat(pyrtl.Const(0, 4), self.a) - self.b
+        self.check_equivalent()
+        self.assertEqual([len(net.dests[0]) for net in pyrtl.working_block().logic
+                          if net.op == '-'], [9])
+
+    def test_interfaces_kept(self):
+        mem = pyrtl.MemBlock(8, 4, 'mem')
+        mem[self.a] <<= pyrtl.concat(pyrtl.Const(0, 4), self.b)
+        pyrtl.rtl_assert((self.a + 1) != 0, ValueError('a + 1 is 0'))
+        out = pyrtl.Output(8, 'out')
+        out <<= mem[self.b] & 7
+        self.check_equivalent()
+        block = pyrtl.working_block()
+        self.assertEqual(len(block.get_wirevector_by_name('a')), 4)
+        self.assertEqual([len(net.dests[0]) for net in block.logic if net.op == 'm'], [8])
+        self.assertEqual(len(block.rtl_assert_dict), 1)
+
 
 class TestSubexpElimination(NetWireNumTestCases):
 
@@ -486,6 +852,57 @@ class TestSubexpElimination(NetWireNumTestCases):
         self.num_net_of_type('&', 1)
         pyrtl.working_block().sanity_check()
 
+    def test_deep_duplicate_chains_in_one_call(self):
+        ins = [pyrtl.Input(4) for i in range(2)]
+        outs = [pyrtl.Output(4) for i in range(2)]
+        for out in outs:
+            w = ins[0]
+            for i in range(40):
+                w = (w ^ ins[1]) if i % 2 else (ins[1] & w)
+            out <<= w
+
+        pyrtl.common_subexp_elimination(abs_thresh=1000)
+        self.num_net_of_type('^', 20)
+        self.num_net_of_type('&', 20)
+        self.num_net_of_type('w', 2)
+        pyrtl.working_block().sanity_check()
+
+    def test_deterministic_choice(self):
+        kept = set()
+        for i in range(10):  # the set orders change as the wires are reallocated
+            pyrtl.reset_working_block()
+            a, b = pyrtl.Input(4, 'a'), pyrtl.Input(4, 'b')
+            first = pyrtl.WireVector(4, 'first')
+            second = pyrtl.WireVector(4, 'second')
+            first <<= a & b
+            second <<= b & a
+            out = pyrtl.Output(8, 'out')
+            out <<= pyrtl.concat(second, first)
+
+            pyrtl.common_subexp_elimination()
+            self.num_net_of_type('&', 1)
+            names = set(w.name for w in pyrtl.working_block().wirevector_set)
+            kept.add(tuple(sorted(names & {'first', 'second'})))
+        self.assertEqual(kept, {('first',)})
+
+    def test_deterministic_choice_after_copy(self):
+        kept = set()
+        for i in range(10):
+            pyrtl.reset_working_block()
+            a, b = pyrtl.Input(4, 'a'), pyrtl.Input(4, 'b')
+            wires = [pyrtl.WireVector(4, 'w%d' % j) for j in range(8)]
+            for w in wires:
+                w <<= a & b
+            out = pyrtl.Output(32, 'out')
+            out <<= pyrtl.concat_list(wires)
+
+            pyrtl.copy_block()
+            pyrtl.common_subexp_elimination()
+            self.num_net_of_type('&', 1)
+            names = set(w.name for w in pyrtl.working_block().wirevector_set)
+            kept.add(tuple(sorted(names & {w.name for w in wires})))
+        self.assertEqual(kept, {('w0',)})
+
 
 class TestSynthOptTiming(NetWireNumTestCases):
     def setUp(self):
@@ -0,0 +1,135 @@
+import unittest
+import io
+
+import pyrtl
+from pyrtl.passmanager import PassManager, Pass
+
+
+class TestPassManager(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a, b = pyrtl.Input(4, 'a'), pyrtl.Input(4, 'b')
+        out = pyrtl.Output(5, 'out')
+        out <<= a + b
+        self.computed = []
+        self.analyses = dict(PassManager.analyses)
+
+        def counting_connectivity(block, pass_manager):
+            self.computed.append('connectivity')
+            return block.net_connections()
+        PassManager.analyses['connectivity'] = counting_connectivity
+
+    def tearDown(self):
+        PassManager.analyses.clear()
+        PassManager.analyses.update(self.analyses)
+
+    def looking_pass(self, name, changed, preserves=()):
+        def look(block, pass_manager):
+            pass_manager.analysis('connectivity')
+            return changed
+        return Pass(look, name, requires=('connectivity',), preserves=preserves)
+
+    def test_analysis_shared_until_change(self):
+        pm = PassManager()
+        pm.run([self.looking_pass('first', False), self.looking_pass('second', False),
+                self.looking_pass('third', True), self.looking_pass('fourth', False)])
+        self.assertEqual(self.computed, ['connectivity', 'connectivity'])
+        self.assertEqual([s.name for s in pm.stats],
+                         ['analysis:connectivity', 'first', 'second', 'third',
+                          'analysis:connectivity', 'fourth'])
+
+    def test_preserved_analysis_kept(self):
+        pm = PassManager()
+        pm.run([self.looking_pass('first', True, preserves=('connectivity',)),
+                self.looking_pass('second', True)])
+        self.assertEqual(self.computed, ['connectivity'])
+
+    def test_none_counts_as_changed(self):
+        pm = PassManager()
+        pm.run([self.looking_pass('first', None), self.looking_pass('second', False)])
+        self.assertEqual(len(self.computed), 2)
+        self.assertTrue(pm.stats[1].changed)
+
+    def test_cache_dropped_between_runs(self):
+        pm = PassManager()
+        pm.run(self.looking_pass('first', False))
+        pm.run(self.looking_pass('second', False))
+        self.assertEqual(len(self.computed), 2)
+
+    def test_pass_returning_block(self):
+        new_block = pyrtl.Block()
+        pm = PassManager()
+        result = pm.run([Pass(lambda block, pass_manager: new_block, 'swap'),
+                         self.looking_pass('after', False)])
+        self.assertIs(result, new_block)
+        self.assertEqual(pm.stats[0].nets_after, 0)
+
+    def test_unknown_analysis(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            Pass(lambda block, pass_manager: False, requires=('nothing',))
+        with self.assertRaises(pyrtl.PyrtlError):
+            PassManager().analysis('nothing')
+
+    def test_analyses_given_as_lists(self):
+        a_pass = Pass(lambda block, pass_manager: False, requires=['connectivity'],
+                      preserves=['connectivity'])
+        self.assertEqual((a_pass.requires, a_pass.preserves), (('connectivity',),) * 2)
+        with self.assertRaises(pyrtl.PyrtlError):
+            Pass(lambda block, pass_manager: False, requires=['nothing'])
+
+    def test_fanout_and_timing(self):
+        pm = PassManager()
+        fanout = pm.analysis('fanout')
+        a = pyrtl.working_block().get_wirevector_by_name('a')
+        self.assertEqual(fanout[a], 1)
+        self.assertGreater(pm.analysis('timing').max_length(), 0)
+
+
+class TestRebuiltPasses(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a, b = pyrtl.Input(4, 'a'), pyrtl.Input(4, 'b')
+        out = pyrtl.Output(5, 'out')
+        out <<= (a + b) ^ pyrtl.Const(0, 5)
+
+    def test_synthesize_and_optimize_stats(self):
+        pm = PassManager()
+        block = pyrtl.synthesize(pass_manager=pm)
+        self.assertIsInstance(block, pyrtl.PostSynthBlock)
+        names = [s.name for s in pm.stats]
+        self.assertEqual(names, ['sanity_check', 'analysis:topological_order', 'bit_blast'])
+        self.assertFalse(pm.stats[0].changed)
+        self.assertTrue(pm.stats[2].changed)
+
+        pm = PassManager()
+        pyrtl.optimize(pass_manager=pm)
+        names = [s.name for s in pm.stats if not s.name.startswith('analysis:')]
+        self.assertEqual(names, ['sanity_check', 'remove_wire_nets', 'constant_propagation',
+                                 'dead_logic_elimination', 'common_subexp_elimination',
+                                 'sanity_check'])
+        # synthesis already folds the xor with zero, so there is nothing left to remove
+        self.assertEqual(pm.stats[-1].nets_after, pm.stats[0].nets_before)
+
+        output = io.StringIO()
+        pm.report(output)
+        self.assertIn('common_subexp_elimination', output.getvalue())
+
+    def test_gate_synthesis(self):
+        pyrtl.synthesize()
+        pm = PassManager()
+        pyrtl.nand_synth(pass_manager=pm)
+        self.assertEqual([s.name for s in pm.stats], ['nand_synth'])
+        self.assertEqual(set(net.op for net in pyrtl.working_block().logic) - set('~nrwcsm@'),
+                         set())
+
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(1, 'a')
+        out = pyrtl.Output(1, 'out')
+        out <<= a ^ pyrtl.Input(1, 'b')
+        block = pyrtl.working_block()
+        pyrtl.and_inverter_synth(block=block)
+        self.assertEqual(set(net.op for net in block.logic) - set('~&rwcsm@'), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
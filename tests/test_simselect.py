@@ -0,0 +1,82 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+import pyrtl
+from pyrtl import simselect
+
+
+class TestSimulatorSelection(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(8, 'a')
+        self.r = pyrtl.Register(8, 'r')
+        self.o = pyrtl.Output(8, 'o')
+        self.r.next <<= self.r + self.a
+        self.o <<= self.r
+        self.cache_dir = tempfile.mkdtemp()
+        self.old_cache_dir = os.environ.get('PYRTL_CACHE_DIR')
+        os.environ['PYRTL_CACHE_DIR'] = self.cache_dir
+        self.old_calibration = simselect._calibration
+        # cheap but slow, moderate, and expensive but fast
+        simselect._calibration = {
+            'Simulation': {'setup': (0.0, 0.0), 'cycle': (1e-4, 0.0), 'traced': 0.0},
+            'FastSimulation': {'setup': (0.01, 0.0), 'cycle': (1e-5, 0.0), 'traced': 0.0},
+            'CompiledSimulation': {'setup': (1.0, 0.0), 'cycle': (1e-7, 0.0), 'traced': 0.0},
+        }
+
+    def tearDown(self):
+        simselect._calibration = self.old_calibration
+        if self.old_cache_dir is None:
+            del os.environ['PYRTL_CACHE_DIR']
+        else:
+            os.environ['PYRTL_CACHE_DIR'] = self.old_cache_dir
+        shutil.rmtree(self.cache_dir)
+
+    def test_choice_depends_on_cycles(self):
+        self.assertIsInstance(pyrtl.simulate(10, tracer=None), pyrtl.Simulation)
+        self.assertIsInstance(pyrtl.simulate(10000, tracer=None), pyrtl.FastSimulation)
+        if simselect._compiler_available():
+            self.assertIsInstance(pyrtl.simulate(10**7, tracer=None), pyrtl.CompiledSimulation)
+
+    def test_estimates(self):
+        estimates = simselect.estimate_simulation_times(100, tracer=None)
+        setup, total = estimates[pyrtl.FastSimulation]
+        self.assertAlmostEqual(setup, 0.01)
+        self.assertAlmostEqual(total, 0.01 + 100 * 1e-5)
+
+    def test_untraceable_wires_rule_out_compiled(self):
+        w = pyrtl.WireVector(8, 'w')
+        w <<= self.a + 1
+        tracer = pyrtl.SimulationTrace(wires_to_track=[self.a, w])
+        self.assertNotIn(pyrtl.CompiledSimulation,
+                         simselect.estimate_simulation_times(10**7, tracer=tracer))
+        sim = pyrtl.simulate(10**7, tracer=tracer)
+        self.assertIsInstance(sim, pyrtl.FastSimulation)
+        sim.step({'a': 3})
+        self.assertEqual(sim.tracer.trace['w'], [4])
+
+    def test_passes_arguments(self):
+        sim = pyrtl.simulate(10, register_value_map={self.r: 5})
+        sim.step({'a': 1})
+        self.assertEqual(sim.tracer.trace['o'], [5])
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.simulate(10, code_file='x.py')
+
+    def test_calibration_cached(self):
+        model = simselect.calibrate()
+        self.assertEqual(set(model) - {'CompiledSimulation'}, {'Simulation', 'FastSimulation'})
+        simselect._calibration = None
+        self.assertEqual(simselect._load_calibration(), model)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, 'simselect.json')))
+
+    def test_defaults_until_calibrated(self):
+        simselect._calibration = None
+        self.assertIs(simselect._load_calibration(), simselect._default_calibration)
+        self.assertIsInstance(pyrtl.simulate(10, tracer=None), pyrtl.Simulation)
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'simselect.json')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,7 @@
 import unittest
+import os
+import shutil
+import tempfile
 import six
 
 import pyrtl
@@ -409,6 +412,621 @@ b110 r
         self.assertEqual(self.VCD_OUTPUT, test_output.getvalue())
 
 
+class CompactTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(1, 'a')
+        self.b = pyrtl.Input(12, 'b')
+        self.c = pyrtl.Input(100, 'c')
+        self.r = pyrtl.Register(70, 'r')
+        self.o = pyrtl.Output(1, 'o')
+        self.r.next <<= self.c + self.r
+        self.o <<= ~self.a
+        self.inputs = [{'a': int(i % 3 == 0), 'b': i * 211, 'c': (i * 12345) << 80}
+                       for i in range(20)]
+
+    def traces(self):
+        traces = []
+        for tracer in (pyrtl.SimulationTrace(), pyrtl.CompactSimulationTrace()):
+            sim = self.sim(tracer=tracer)
+            for inputs in self.inputs:
+                sim.step(inputs)
+            traces.append(tracer)
+        return traces
+
+    def test_values_match_list_trace(self):
+        full, compact = self.traces()
+        for name in full.trace:
+            self.assertEqual(list(compact.trace[name]), full.trace[name])
+            self.assertEqual(compact.trace[name][3:11], full.trace[name][3:11])
+            self.assertEqual(compact.trace[name][-1], full.trace[name][-1])
+        self.assertEqual(len(compact), 20)
+
+    def test_output_matches_list_trace(self):
+        full, compact = self.traces()
+        for method in ('print_trace', 'print_vcd'):
+            full_out, compact_out = six.StringIO(), six.StringIO()
+            getattr(full, method)(full_out)
+            getattr(compact, method)(compact_out)
+            self.assertEqual(full_out.getvalue(), compact_out.getvalue())
+        self.assertEqual(pyrtl.trace_to_html(full), pyrtl.trace_to_html(compact))
+
+    def test_index_error(self):
+        full, compact = self.traces()
+        with self.assertRaises(IndexError):
+            compact.trace['a'][20]
+
+
+class DeltaTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.en = pyrtl.Input(1, 'en')
+        self.d = pyrtl.Input(8, 'd')
+        self.q = pyrtl.Register(8, 'q')
+        self.o = pyrtl.Output(8, 'o')
+        self.q.next <<= pyrtl.select(self.en, self.d, self.q)
+        self.o <<= self.q
+        self.inputs = [{'en': int(i in (2, 3, 7)), 'd': i * 10} for i in range(12)]
+
+    def traces(self):
+        traces = []
+        for tracer in (pyrtl.SimulationTrace(), pyrtl.DeltaSimulationTrace()):
+            sim = self.sim(tracer=tracer)
+            for inputs in self.inputs:
+                sim.step(inputs)
+            traces.append(tracer)
+        return traces
+
+    def test_values_match_list_trace(self):
+        full, delta = self.traces()
+        for name in full.trace:
+            self.assertEqual(list(delta.trace[name]), full.trace[name])
+            self.assertEqual(delta.trace[name][4:9], full.trace[name][4:9])
+            self.assertEqual(delta.trace[name][-1], full.trace[name][-1])
+            self.assertEqual([delta.trace[name][i] for i in range(12)], full.trace[name])
+        self.assertEqual(len(delta), 12)
+
+    def test_only_changes_stored(self):
+        full, delta = self.traces()
+        self.assertEqual(list(delta.trace['q'].changes()), [(0, 0), (3, 20), (4, 30), (8, 70)])
+
+    def test_output_matches_list_trace(self):
+        full, delta = self.traces()
+        for method in ('print_trace', 'print_vcd'):
+            full_out, delta_out = six.StringIO(), six.StringIO()
+            getattr(full, method)(full_out)
+            getattr(delta, method)(delta_out)
+            self.assertEqual(full_out.getvalue(), delta_out.getvalue())
+
+    def test_vcd_only_changes(self):
+        full, delta = self.traces()
+        for include_clock in (False, True):
+            full_out, delta_out = six.StringIO(), six.StringIO()
+            full.print_vcd(full_out, include_clock=include_clock, only_changes=True)
+            delta.print_vcd(delta_out, include_clock=include_clock, only_changes=True)
+            self.assertEqual(full_out.getvalue(), delta_out.getvalue())
+        vcd = delta_out.getvalue()
+        self.assertIn('#30\nb11110 d\nb10100 o\nb10100 q\nb1 clk\n', vcd)
+        self.assertIn('#50\nb110010 d\nb1 clk\n', vcd)
+        self.assertTrue(vcd.endswith('#120\n'))
+        full_out = six.StringIO()
+        full.print_vcd(full_out, include_clock=True)
+        self.assertLess(len(vcd), len(full_out.getvalue()))
+
+
+class StreamingVCDTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.en = pyrtl.Input(1, 'en')
+        self.d = pyrtl.Input(8, 'd')
+        self.q = pyrtl.Register(8, 'q')
+        self.o = pyrtl.Output(8, 'o')
+        self.q.next <<= pyrtl.select(self.en, self.d, self.q)
+        self.o <<= self.q
+        self.inputs = [{'en': int(i in (2, 3, 7)), 'd': i // 4} for i in range(12)]
+
+    def stream(self, include_clock, buffer_size=1 << 16):
+        out = six.StringIO()
+        tracer = pyrtl.StreamingVCDTrace(
+            out, include_clock=include_clock, buffer_size=buffer_size)
+        sim = self.sim(tracer=tracer)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        tracer.close()
+        return tracer, out.getvalue()
+
+    def test_matches_print_vcd(self):
+        full = pyrtl.SimulationTrace()
+        sim = self.sim(tracer=full)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        for include_clock in (False, True):
+            expected = six.StringIO()
+            full.print_vcd(expected, include_clock=include_clock, only_changes=True)
+            tracer, vcd = self.stream(include_clock)
+            self.assertEqual(vcd, expected.getvalue())
+            tracer, vcd = self.stream(include_clock, buffer_size=1)
+            self.assertEqual(vcd, expected.getvalue())
+
+    def test_only_latest_value_kept(self):
+        tracer, vcd = self.stream(False)
+        self.assertEqual(len(tracer), 12)
+        self.assertEqual(tracer.trace['q'][-1], 1)
+        self.assertIn('#40\nb1 d\nb0 en\n\n', vcd)
+        with self.assertRaises(pyrtl.PyrtlError):
+            tracer.trace['q'][0]
+        with self.assertRaises(pyrtl.PyrtlError):
+            tracer.print_trace()
+
+    def test_closed(self):
+        tracer, vcd = self.stream(False)
+        self.assertTrue(vcd.endswith('#120\n'))
+        with self.assertRaises(pyrtl.PyrtlError):
+            tracer.add_step_named({'en': 0, 'd': 0, 'o': 0, 'q': 0})
+
+
+class FileTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(1, 'a')
+        self.b = pyrtl.Input(12, 'b')
+        self.c = pyrtl.Input(100, 'c')
+        self.r = pyrtl.Register(70, 'r')
+        self.o = pyrtl.Output(1, 'o')
+        self.r.next <<= self.c + self.r
+        self.o <<= ~self.a
+        self.inputs = [{'a': int(i % 3 == 0), 'b': i * 211, 'c': (i * 12345) << 80}
+                       for i in range(20)]
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'sim.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def traces(self):
+        full = pyrtl.SimulationTrace()
+        stored = pyrtl.FileSimulationTrace(self.filename, buffer_size=100)
+        for tracer in (full, stored):
+            sim = self.sim(tracer=tracer)
+            for inputs in self.inputs:
+                sim.step(inputs)
+        return full, stored
+
+    def test_values_readable_while_writing(self):
+        full, stored = self.traces()
+        self.assertEqual(len(stored), 20)
+        for name in full.trace:
+            self.assertEqual(list(stored.trace[name]), full.trace[name])
+            self.assertEqual(stored.trace[name][-1], full.trace[name][-1])
+        stored.close()
+        self.assertEqual(stored.trace['r'][5], full.trace['r'][5])
+
+    def test_reopened_trace(self):
+        full, stored = self.traces()
+        stored.close()
+        saved = pyrtl.SavedSimulationTrace(self.filename)
+        self.assertEqual(len(saved), 20)
+        self.assertEqual(set(saved.trace), set(full.trace))
+        for name in full.trace:
+            self.assertEqual(list(saved.trace[name]), full.trace[name])
+            self.assertEqual(saved.trace[name][7:12], full.trace[name][7:12])
+        with self.assertRaises(IndexError):
+            saved.trace['a'][20]
+        with self.assertRaises(pyrtl.PyrtlError):
+            saved.add_step_named({'a': 0})
+        saved.close()
+
+    def test_reopened_output_matches(self):
+        full, stored = self.traces()
+        stored.close()
+        saved = pyrtl.SavedSimulationTrace(self.filename)
+        for method in ('print_trace', 'print_vcd', 'render_trace'):
+            full_out, saved_out = six.StringIO(), six.StringIO()
+            getattr(full, method)(file=full_out)
+            getattr(saved, method)(file=saved_out)
+            self.assertEqual(full_out.getvalue(), saved_out.getvalue())
+        full_out, saved_out = six.StringIO(), six.StringIO()
+        pyrtl.output_verilog_testbench(full_out, full)
+        pyrtl.output_verilog_testbench(saved_out, saved)
+        self.assertEqual(full_out.getvalue(), saved_out.getvalue())
+        saved.close()
+
+    def test_open_before_first_cycle(self):
+        stored = pyrtl.FileSimulationTrace(self.filename)
+        saved = pyrtl.SavedSimulationTrace(self.filename)
+        self.assertEqual(len(saved), 0)
+        self.assertEqual(set(saved.trace), set(stored.trace))
+        self.assertEqual(list(saved.trace['r']), [])
+        saved.close()
+        stored.close()
+
+    def test_file_mapped_only_when_read_past_end(self):
+        full, stored = self.traces()
+        refresh = pyrtl.simulation._TraceFileReader.refresh
+        calls = []
+
+        def counting_refresh(reader):
+            calls.append(len(reader))
+            refresh(reader)
+        pyrtl.simulation._TraceFileReader.refresh = counting_refresh
+        try:
+            stored.trace['b'][19]
+            for name in full.trace:
+                self.assertEqual(list(stored.trace[name]), full.trace[name])
+        finally:
+            pyrtl.simulation._TraceFileReader.refresh = refresh
+        self.assertLessEqual(len(calls), 1)
+        stored.close()
+
+    def test_not_a_trace_file(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'hello\n')
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.SavedSimulationTrace(self.filename)
+
+
+class WindowedTraceBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(4, 'a')
+        self.r = pyrtl.Register(8, 'r')
+        self.o = pyrtl.Output(8, 'o')
+        self.r.next <<= self.r + 1
+        self.o <<= self.r + self.a
+        self.inputs = [{'a': i % 4} for i in range(20)]
+
+    def simulate(self, tracer, steps=20):
+        sim = self.sim(tracer=tracer)
+        for inputs in self.inputs[:steps]:
+            sim.step(inputs)
+        return tracer
+
+    def check_window(self, tracer, start, stop):
+        full = self.simulate(pyrtl.SimulationTrace())
+        self.assertEqual(tracer.start_cycle, start)
+        self.assertEqual(len(tracer), stop - start)
+        for name in ('a', 'o'):
+            self.assertEqual(list(tracer.trace[name]), full.trace[name][start:stop])
+
+    def test_ring_buffer(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(5))
+        self.check_window(tracer, 15, 20)
+        self.assertIsNone(tracer.trigger_cycle)
+
+    def test_indexing(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(5))
+        full = self.simulate(pyrtl.SimulationTrace())
+        values = tracer.trace['o']
+        self.assertEqual(values[1:4], full.trace['o'][16:19])
+        self.assertEqual(values[::-2], full.trace['o'][19:14:-2])
+        self.assertEqual((values[0], values[-1]), (full.trace['o'][15], full.trace['o'][19]))
+        self.assertEqual(values, full.trace['o'][15:])
+        with self.assertRaises(IndexError):
+            values[5]
+
+    def test_window_larger_than_run(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(50), steps=7)
+        self.assertEqual(tracer.start_cycle, 0)
+        self.assertEqual(len(tracer), 7)
+
+    def test_trigger_pre_and_post(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(
+            3, trigger='o', trigger_value=10, post_trigger=2))
+        self.assertEqual(tracer.trigger_cycle, 7)
+        self.assertTrue(tracer.done)
+        self.check_window(tracer, 5, 10)
+
+    def test_trigger_without_post(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(4, trigger=self.a, trigger_value=3))
+        self.assertEqual(tracer.trigger_cycle, 3)
+        self.check_window(tracer, 0, 4)
+
+    def test_trigger_not_reached(self):
+        tracer = self.simulate(pyrtl.WindowedSimulationTrace(
+            3, trigger='o', trigger_value=200, post_trigger=2))
+        self.assertIsNone(tracer.trigger_cycle)
+        self.assertFalse(tracer.done)
+        # only the window is kept until the trigger fires
+        self.check_window(tracer, 17, 20)
+
+    def test_trigger_on_assertion(self):
+        check = pyrtl.rtl_assert(self.r < 12, ValueError('r too big'))
+        tracer = pyrtl.WindowedSimulationTrace(4, trigger=check, trigger_value=0)
+        with self.assertRaises(ValueError):
+            self.simulate(tracer)
+        self.assertEqual(tracer.trigger_cycle, 12)
+        self.assertEqual(list(tracer.trace['o']), [10, 12, 14, 12])
+
+    def test_bad_window(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.WindowedSimulationTrace(0)
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.WindowedSimulationTrace(5, post_trigger=3)
+
+
+class ActivityBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(4, 'a')
+        self.b = pyrtl.Input(70, 'b')
+        self.r = pyrtl.Register(8, 'r')
+        self.s = pyrtl.WireVector(71, 's')
+        self.o = pyrtl.Output(1, 'o')
+        self.r.next <<= self.r + self.a
+        self.s <<= self.b + self.r
+        self.o <<= self.s[3]
+        self.inputs = [{'a': i % 5, 'b': (i * 7) << 60} for i in range(30)]
+
+    def expected(self, name):
+        tracer = pyrtl.SimulationTrace(wires_to_track='all')
+        sim = pyrtl.Simulation(tracer=tracer)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        values = tracer.trace[name]
+        toggles = sum(bin(x ^ y).count('1') for x, y in zip(values, values[1:]))
+        ones = sum(bin(x).count('1') for x in values)
+        return toggles, ones
+
+    def test_counts_match_trace(self):
+        sim = self.sim(tracer=None, activity=True)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        table = sim.activity()
+        self.assertEqual(table.cycles, 30)
+        for name in ('a', 'b', 'r', 's', 'o'):
+            self.assertEqual((table[name].toggles, table[name].ones), self.expected(name))
+        self.assertEqual(table['b'].bitwidth, 70)
+        toggles, ones = self.expected('r')
+        self.assertAlmostEqual(table.toggle_rate('r'), toggles / (8.0 * 29))
+        self.assertAlmostEqual(table.one_rate('r'), ones / (8.0 * 30))
+        out = six.StringIO()
+        table.print_table(out)
+        self.assertEqual(len(out.getvalue().splitlines()), len(table) + 1)
+
+    def test_not_enabled(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.activity()
+
+
+class CoverageBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(3, 'a')
+        self.b = pyrtl.Input(70, 'b')
+        self.state = pyrtl.Register(2, 'state')
+        self.w = pyrtl.Register(70, 'w')
+        o = pyrtl.Output(70, 'o')
+        self.state.next <<= pyrtl.select(self.a[0], self.state + 1, self.state)
+        self.w.next <<= self.b
+        m = pyrtl.WireVector(70, 'm')
+        m <<= pyrtl.select(self.a[1], self.w, self.b ^ self.w)
+        o <<= m
+        self.mux = [net.dests[0].name for net in pyrtl.working_block().logic_subset('x')
+                    if net.dests[0].bitwidth == 70][0]
+        self.inputs = [{'a': (i * 5) % 7, 'b': (i * 37) << 50} for i in range(20)]
+
+    def expected_toggles(self, name):
+        tracer = pyrtl.SimulationTrace(wires_to_track='all')
+        sim = pyrtl.Simulation(tracer=tracer)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        values = tracer.trace[name]
+        rose = fell = 0
+        for x, y in zip(values, values[1:]):
+            rose |= y & ~x
+            fell |= x & ~y
+        return rose, fell, values
+
+    def test_matches_trace(self):
+        sim = self.sim(tracer=None, coverage=True)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        cov = sim.coverage()
+        self.assertEqual(cov.cycles, 20)
+        for name in ('a', 'b', 'w', 'm', 'o', 'state'):
+            rose, fell, _ = self.expected_toggles(name)
+            self.assertEqual(cov.toggles[name][1:], (rose, fell))
+        _, _, sel = self.expected_toggles('a')
+        self.assertEqual(cov.muxes[self.mux], (sum(1 for x in sel if not x & 2),
+                                          sum(1 for x in sel if x & 2)))
+        _, _, states = self.expected_toggles('state')
+        self.assertEqual(cov.states, {'state': {v: states.count(v) for v in set(states)}})
+
+    def test_state_registers(self):
+        sim = self.sim(tracer=None, coverage=['state'])
+        sim.step({'a': 1, 'b': 0})
+        self.assertEqual(sim.coverage().states, {'state': {0: 1}})
+        with self.assertRaises(pyrtl.PyrtlError):
+            self.sim(coverage=[self.w])
+        with self.assertRaises(pyrtl.PyrtlError):
+            self.sim(coverage=[self.a])
+
+    def test_merge(self):
+        sim = self.sim(tracer=None, coverage=True)
+        for inputs in self.inputs[:10]:
+            sim.step(inputs)
+        first = sim.coverage()
+        sim = self.sim(tracer=None, coverage=True)
+        for inputs in self.inputs[10:]:
+            sim.step(inputs)
+        total = pyrtl.Coverage() + first + sim.coverage()
+        self.assertEqual(total.cycles, 20)
+        self.assertEqual(total.muxes[self.mux], tuple(
+            x + y for x, y in zip(first.muxes[self.mux], sim.coverage().muxes[self.mux])))
+        self.assertEqual(sum(total.states['state'].values()), 20)
+        self.assertGreaterEqual(total.toggle_coverage(), first.toggle_coverage())
+        self.assertEqual(total.mux_coverage(), 1.0)
+        out = six.StringIO()
+        total.report(out)
+        self.assertIn('coverage over 20 cycles', out.getvalue())
+
+    def test_not_enabled(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.coverage()
+
+
+class GeneratedProgramBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(8, 'a')
+        r = pyrtl.Register(8, 'r')
+        mem = pyrtl.MemBlock(8, 2, 'mem')
+        t = pyrtl.WireVector(8, 't')
+        o = pyrtl.Output(8, 'o')
+        t <<= (a ^ r) + mem[r[:2]]
+        mem[a[:2]] <<= t
+        r.next <<= pyrtl.select(a[0], t, r + 1)
+        o <<= t & r
+        self.traced = [a, r, t, o]
+        self.inputs = [{'a': (i * 29) % 256} for i in range(25)]
+
+    def run_trace(self, sim_class, **kwargs):
+        tracer = pyrtl.SimulationTrace(wires_to_track=self.traced)
+        sim = sim_class(tracer=tracer, **kwargs)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        return tracer
+
+    def test_wire_names_used_by_generated_code(self):
+        pyrtl.reset_working_block()
+        d = pyrtl.Input(4, 'd')
+        v = pyrtl.WireVector(4, 'v')
+        ints = pyrtl.WireVector(1, 'int')
+        outs = pyrtl.Output(4, 'outs')
+        v <<= d + 1
+        ints <<= v < d
+        outs <<= pyrtl.select(ints, v, d)
+        self.traced = [d, v, ints, outs]
+        self.inputs = [{'d': i} for i in range(16)]
+        expected = self.run_trace(self.sim)
+        generated = self.run_trace(pyrtl.FastSimulation, activity=True, coverage=True)
+        for name in ('d', 'v', 'int', 'outs'):
+            self.assertEqual(list(generated.trace[name]), list(expected.trace[name]))
+
+    def test_times_recorded(self):
+        sim = pyrtl.FastSimulation()
+        self.assertGreaterEqual(sim.codegen_time, 0)
+        self.assertGreaterEqual(sim.compile_time, 0)
+        self.assertEqual(sim.cycle_time, 0)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        self.assertGreaterEqual(sim.step_time, 0)
+        self.assertAlmostEqual(sim.cycle_time, sim.step_time / len(self.inputs))
+
+
+class CodeCacheBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(8, 'a')
+        r = pyrtl.Register(8, 'r')
+        mem = pyrtl.MemBlock(8, 2, 'mem')
+        o = pyrtl.Output(8, 'o')
+        mem[self.a[:2]] <<= r
+        r.next <<= r + self.a
+        o <<= r ^ mem[self.a[2:4]]
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def run_sim(self, **kwargs):
+        sim = pyrtl.FastSimulation(cache_dir=self.cache_dir, **kwargs)
+        for i in range(10):
+            sim.step({'a': i * 13})
+        return sim
+
+    def test_reuses_code(self):
+        first = self.run_sim()
+        self.assertFalse(first.cache_hit)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        second = self.run_sim()
+        self.assertTrue(second.cache_hit)
+        self.assertEqual(second.internal_names.val_map, first.internal_names.val_map)
+        for name in ('a', 'r', 'o'):
+            self.assertEqual(list(second.tracer.trace[name]), list(first.tracer.trace[name]))
+
+    def test_settings_in_key(self):
+        self.run_sim()
+        self.assertFalse(self.run_sim(tracer=None).cache_hit)
+        self.assertFalse(self.run_sim(activity=True).cache_hit)
+        self.assertFalse(self.run_sim(default_value=1).cache_hit)
+        self.assertTrue(self.run_sim(activity=True).cache_hit)
+
+    def test_structure_in_key(self):
+        self.run_sim()
+        x = pyrtl.Output(8, 'x')
+        x <<= self.a
+        self.assertFalse(self.run_sim().cache_hit)
+
+    def test_unreadable_entry(self):
+        self.run_sim()
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'wb') as f:
+                f.write(b'junk')
+        self.assertFalse(self.run_sim().cache_hit)
+        self.assertTrue(self.run_sim().cache_hit)
+
+
+class PositionalInputsBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a = pyrtl.Input(4, 'a')
+        self.b = pyrtl.Input(70, 'b')
+        r = pyrtl.Register(70, 'r')
+        o = pyrtl.Output(70, 'o')
+        r.next <<= r + self.a
+        o <<= r ^ self.b
+        self.rows = [(i % 16, (i * 7919) << 50) for i in range(12)]
+
+    def expected(self):
+        sim = self.sim()
+        for a, b in self.rows:
+            sim.step({'a': a, 'b': b})
+        return sim.tracer
+
+    def check_trace(self, tracer):
+        expected = self.expected()
+        for name in ('a', 'b', 'r', 'o'):
+            self.assertEqual(list(tracer.trace[name]), list(expected.trace[name]))
+
+    def test_step_values(self):
+        sim = self.sim()
+        self.assertEqual(sim.bind_inputs(), ['a', 'b'])
+        for values in self.rows:
+            sim.step_values(values)
+        self.check_trace(sim.tracer)
+
+    def test_run_values(self):
+        sim = self.sim()
+        sim.bind_inputs([self.b, 'a'])
+        sim.run_values([(b, a) for a, b in self.rows[:5]])
+        sim.run_values([(b, a) for a, b in self.rows[5:]])
+        self.check_trace(sim.tracer)
+
+    def test_bad_bindings(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.step_values((1, 2))
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.bind_inputs(['a'])
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.bind_inputs(['a', 'b', 'o'])
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.bind_inputs(['a', 'b', 'a'])
+
+    def test_bad_values(self):
+        sim = self.sim()
+        sim.bind_inputs(['a', 'b'])
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.step_values((1,))
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.step_values((16, 0))
+        with self.assertRaises(pyrtl.PyrtlError):
+            sim.run_values([(0, 0), (0, -1)])
+
+
 class SimTraceWithMuxBase(unittest.TestCase):
     def setUp(self):
         pyrtl.reset_working_block()